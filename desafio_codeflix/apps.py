@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DesafioCodeflixConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'desafio_codeflix'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,341 @@
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from django.conf import settings
+from django.db import connections
+from .models import CastMember
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'\w+')
+
+
+def fold(text):
+    """
+    Lowercase text without accents, so 'José' and 'jose' index the same.
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text):
+    return _WORD.findall(fold(text))
+
+
+class PrefixIndex:
+    """
+    Names searchable by word prefix, ranked by a count.
+
+    Every word of every name is one entry of a sorted list of words with a
+    parallel array of member slots, so the entries starting with a prefix are
+    one contiguous range found by bisection. Ranges too large to rank on every
+    query (short prefixes) keep their top results cached; a count that rises is
+    merged into the cached tops, anything else drops the tops it could change.
+
+    Not thread-safe; AutocompleteIndex serializes access.
+
+    Args:
+        top_size (int): Results cached per large range, the largest limit served.
+        scan_limit (int): Entries above which a range's top results are cached.
+    """
+
+    def __init__(self, top_size=50, scan_limit=1000):
+        self.top_size = top_size
+        self.scan_limit = scan_limit
+        self._slots = {}
+        self._ids = []
+        self._names = []
+        self._folded = []
+        self._counts = array('q')
+        self._words = []
+        self._word_slots = array('I')
+        self._tops = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    @classmethod
+    def build(cls, rows, **kwargs):
+        """
+        Args:
+            rows: Iterable of (id, name, count).
+        """
+        index = cls(**kwargs)
+        entries = []
+        for pk, name, count in rows:
+            slot = index._new_slot(pk, name, count)
+            entries.extend((word, slot) for word in set(index._folded[slot].split()))
+        entries.sort()
+        # Equal words share one string object
+        words = {}
+        index._words = [words.setdefault(word, word) for word, _ in entries]
+        index._word_slots = array('I', (slot for _, slot in entries))
+        return index
+
+    def _new_slot(self, pk, name, count):
+        slot = len(self._ids)
+        self._slots[pk] = slot
+        self._ids.append(pk)
+        self._names.append(name)
+        self._folded.append(self._fold_words(name))
+        self._counts.append(count)
+        return slot
+
+    @staticmethod
+    def _fold_words(name):
+        # ' word word', so a word prefix is found with "' ' + prefix in"
+        return ''.join(' ' + word for word in tokenize(name))
+
+    def _rank(self, slot):
+        return (-self._counts[slot], self._names[slot], slot)
+
+    def _range(self, prefix):
+        return bisect_left(self._words, prefix), bisect_left(self._words, prefix + '\U0010ffff')
+
+    def upsert(self, pk, name=None, count=None):
+        """
+        Add a member or change its name and/or count.
+        """
+        slot = self._slots.get(pk)
+        if slot is None:
+            if name is None:
+                return
+            slot = self._new_slot(pk, name, count or 0)
+            words = set(tokenize(name))
+            self._insert_words(slot, words)
+            self._raised(slot, words)
+            return
+        words = set(tokenize(self._names[slot]))
+        if name is not None and name != self._names[slot]:
+            self._dropped(slot, words, always=True)
+            self._remove_words(slot, words)
+            self._names[slot] = name
+            self._folded[slot] = self._fold_words(name)
+            words = set(tokenize(name))
+            self._insert_words(slot, words)
+            self._dropped(slot, words, always=True)
+        if count is not None and count != self._counts[slot]:
+            lower = count < self._counts[slot]
+            self._counts[slot] = count
+            if lower:
+                self._dropped(slot, words)
+            else:
+                self._raised(slot, words)
+
+    def remove(self, pk):
+        slot = self._slots.pop(pk, None)
+        if slot is None:
+            return
+        words = set(tokenize(self._names[slot]))
+        self._dropped(slot, words)
+        self._remove_words(slot, words)
+        # The slot stays allocated but is no longer reachable
+        self._ids[slot] = None
+        self._names[slot] = self._folded[slot] = ''
+
+    def _position(self, word, slot):
+        # Entries of the same word are ordered by slot
+        return bisect_left(self._word_slots, slot, bisect_left(self._words, word), bisect_right(self._words, word))
+
+    def _insert_words(self, slot, words):
+        for word in words:
+            position = self._position(word, slot)
+            self._words.insert(position, word)
+            self._word_slots.insert(position, slot)
+
+    def _remove_words(self, slot, words):
+        for word in words:
+            position = self._position(word, slot)
+            if position < len(self._words) and self._words[position] == word and self._word_slots[position] == slot:
+                del self._words[position]
+                del self._word_slots[position]
+
+    def _cached_prefixes(self, words):
+        return {word[:end] for word in words for end in range(1, len(word) + 1)} & self._tops.keys()
+
+    def _raised(self, slot, words):
+        # A member that ranks higher can only enter the cached tops
+        for prefix in self._cached_prefixes(words):
+            top = self._tops[prefix]
+            if slot not in top:
+                top.append(slot)
+            top.sort(key=self._rank)
+            del top[self.top_size:]
+
+    def _dropped(self, slot, words, always=False):
+        # The entry that would replace it in a top is unknown, so the top goes
+        for prefix in self._cached_prefixes(words):
+            if always or slot in self._tops[prefix]:
+                del self._tops[prefix]
+
+    def search(self, query, limit=10):
+        """
+        Members whose name has a word starting with each word of the query,
+        most counted first.
+
+        Returns:
+            list: (id, name, count) tuples.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        ranges = {word: self._range(word) for word in words}
+        narrowest = min(ranges, key=lambda word: ranges[word][1] - ranges[word][0])
+        lo, hi = ranges[narrowest]
+        if len(ranges) == 1 and hi - lo > self.scan_limit and limit <= self.top_size:
+            top = self._tops.get(narrowest)
+            if top is None:
+                top = self._tops[narrowest] = self._best(set(self._word_slots[lo:hi]), self.top_size)
+            slots = top[:limit]
+        else:
+            candidates = set(self._word_slots[lo:hi])
+            # The other words are checked on the names of the narrowest word's matches
+            others = [' ' + word for word in ranges if word != narrowest]
+            if others:
+                folded = self._folded
+                candidates = [slot for slot in candidates if all(word in folded[slot] for word in others)]
+            slots = self._best(candidates, limit)
+        return [(self._ids[slot], self._names[slot], self._counts[slot]) for slot in slots]
+
+    def _best(self, slots, limit):
+        return heapq.nsmallest(limit, slots, key=self._rank)
+
+
+def video_counts(pks):
+    """
+    Videos per cast member (their maintained videos_count) for the given ones.
+    """
+    return dict(CastMember.objects.filter(pk__in=pks).values_list('pk', 'videos_count').order_by())
+
+
+class AutocompleteIndex:
+    """
+    The cast member name index of this process.
+
+    It is built in a background thread from one streaming query (started with
+    the server, or by the first search) and rebuilt every
+    AUTOCOMPLETE_REBUILD_INTERVAL seconds to pick up writes made by other
+    processes or without model signals (imports, bulk deletes). Changes made
+    through the models in this process are applied by the signals as soon as
+    they commit, including to an index being rebuilt. Until the first build
+    finishes, search() returns None and callers query the database.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._built_at = None
+        self._building = False
+        self._journal = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self._index is not None or self._building
+
+    def start(self):
+        """
+        Build the index in the background unless it is disabled or already building.
+        """
+        if not getattr(settings, 'AUTOCOMPLETE_ENABLED', True):
+            return
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self._journal = []
+        threading.Thread(target=self._build_in_thread, name='autocomplete-index', daemon=True).start()
+
+    def build(self):
+        """
+        Build the index in this thread.
+        """
+        with self._lock:
+            self._building = True
+            self._journal = []
+        self._build()
+
+    def _build_in_thread(self):
+        try:
+            self._build()
+        finally:
+            connections.close_all()
+
+    def _build(self):
+        started = time.perf_counter()
+        try:
+            rows = CastMember.objects.values_list('pk', 'name', 'videos_count').order_by().iterator(chunk_size=10000)
+            index = PrefixIndex.build(
+                rows,
+                top_size=getattr(settings, 'AUTOCOMPLETE_MAX_LIMIT', 50),
+                scan_limit=getattr(settings, 'AUTOCOMPLETE_SCAN_LIMIT', 1000),
+            )
+        except Exception:
+            logger.exception('Failed to build the cast member autocomplete index')
+            with self._lock:
+                self._building = False
+                self._journal = None
+            return
+        with self._lock:
+            # Changes committed while the rows were read
+            for method, args in self._journal:
+                getattr(index, method)(*args)
+            self._index = index
+            self._built_at = time.monotonic()
+            self._building = False
+            self._journal = None
+        logger.info(f"Built the autocomplete index of {len(index)} cast members in {time.perf_counter() - started:.2f}s")
+
+    def search(self, query, limit=10):
+        """
+        Returns:
+            list: (id, name, videos count) tuples, or None when the index is not built yet.
+        """
+        index = self._index
+        if index is None or self._stale():
+            self.start()
+        if index is None:
+            return None
+        with self._lock:
+            return index.search(query, limit)
+
+    def _stale(self):
+        interval = getattr(settings, 'AUTOCOMPLETE_REBUILD_INTERVAL', 300)
+        return self._built_at is not None and time.monotonic() - self._built_at > interval
+
+    def _apply(self, method, *args):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((method, args))
+            if self._index is not None:
+                getattr(self._index, method)(*args)
+
+    def member_saved(self, pk, name):
+        self._apply('upsert', pk, name)
+
+    def member_deleted(self, pk):
+        self._apply('remove', pk)
+
+    def counts_changed(self, pks):
+        """
+        Reload the video counts of the given cast members.
+        """
+        if not pks or not self.active:
+            return
+        counts = video_counts(pks)
+        for pk in pks:
+            self._apply('upsert', pk, None, counts.get(pk, 0))
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._built_at = None
+            self._journal = None
+            self._building = False
+
+
+cast_member_autocomplete = AutocompleteIndex()
@@ -1,12 +1,199 @@
-from rest_framework import viewsets, serializers
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.http import Http404, HttpResponse
+from rest_framework import status, viewsets, serializers
+from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField, PKOnlyObject, PrimaryKeyRelatedField
 from rest_framework.response import Response
+from .cache import api_cache, can_cache, response_cache_key
+from .changes import InvalidCursor, change_feed, decode_cursor, parse_since
+from .compression import compressed_variants, encode
+from .deletion import BulkDeleter
+from .export import EXPORT_FORMATS, export_response
+from .loaders import RelatedLoader, parse_include
+from .middleware import current_timings
 from .pagination import CustomPagination
+from .snapshot import catalog_snapshot
+
+class BulkManyRelatedField(ManyRelatedField):
+    """
+    Many-to-many pk list validated with one pk__in query instead of one get() per id.
+
+    Relations to tables kept in the in-process snapshot are validated and
+    represented from it, without a query unless some ids are missing from it.
+    """
+
+    def get_attribute(self, instance):
+        ids = catalog_snapshot.related_ids(instance, self.source)
+        if ids is not None:
+            return [PKOnlyObject(pk) for pk in ids]
+        return super().get_attribute(instance)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pks = []
+        for item in data:
+            if child.pk_field is not None:
+                item = child.pk_field.to_internal_value(item)
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                pks.append(queryset.model._meta.pk.to_python(item))
+            except (TypeError, ValueError, DjangoValidationError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+        table = None if queryset.query.has_filters() else catalog_snapshot.get(queryset.model)
+        found = {} if table is None else {pk: table.by_pk[pk].to_instance() for pk in pks if pk in table.by_pk}
+        missing = [pk for pk in pks if pk not in found]
+        if missing:
+            # Created by another process since the snapshot was last checked
+            found.update((obj.pk, obj) for obj in queryset.filter(pk__in=missing))
+        for pk in pks:
+            if pk not in found:
+                child.fail('does_not_exist', pk_value=pk)
+        return [found[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
 
 class BaseSerializer(serializers.ModelSerializer):
     """
     Base serializer with common functionality for all domain serializers.
     """
-    pass
+    serializer_related_field = BulkPrimaryKeyRelatedField
+
+    def update(self, instance, validated_data):
+        """
+        Write only what differs from the instance.
+
+        Changed columns are saved with update_fields (plus the auto_now
+        timestamps), nothing is written when no column changed, and
+        many-to-many fields only add the missing links and remove the dropped
+        ones, after reading the current ids once from the through table.
+        """
+        relations = {}
+        changed = []
+        for name, value in validated_data.items():
+            field = instance._meta.get_field(name)
+            if field.many_to_many:
+                relations[field] = value
+                continue
+            if field.is_relation:
+                current, new = getattr(instance, field.attname), getattr(value, 'pk', value)
+            else:
+                current, new = getattr(instance, name), value
+            if current != new:
+                setattr(instance, name, value)
+                changed.append(name)
+
+        with transaction.atomic():
+            if changed:
+                changed.extend(
+                    field.name for field in instance._meta.concrete_fields
+                    if getattr(field, 'auto_now', False) and field.name not in changed
+                )
+                instance.save(update_fields=changed)
+            for field, objects in relations.items():
+                self._apply_delta(instance, field, [obj.pk for obj in objects])
+        return instance
+
+    def _apply_delta(self, instance, field, pks):
+        through = field.remote_field.through
+        current = set(
+            through.objects
+            .filter(**{field.m2m_field_name(): instance.pk})
+            .values_list(field.m2m_reverse_field_name(), flat=True)
+        )
+        wanted = set(pks)
+        manager = getattr(instance, field.name)
+        if current - wanted:
+            manager.remove(*(current - wanted))
+        if wanted - current:
+            manager.add(*[pk for pk in dict.fromkeys(pks) if pk not in current])
+
+    def to_representation(self, instance):
+        timings = current_timings()
+        if timings is None:
+            return self._represent(instance)
+        with timings.serializing():
+            return self._represent(instance)
+
+    def _represent(self, instance):
+        data = super().to_representation(instance)
+        embedded = self._embedded()
+        if not embedded:
+            return data
+        loader = self.context['loader']
+        return {
+            name: loader.get(name, instance) if name in embedded else data[name]
+            for name, field in self.fields.items() if not field.write_only
+        }
+
+    def _embedded(self):
+        """
+        Relations replaced by objects from the ?include= loader in the context.
+        """
+        loader = self.context.get('loader')
+        if loader is None or loader.model is not getattr(getattr(self, 'Meta', None), 'model', None):
+            return ()
+        return loader.include
+
+    @property
+    def _readable_fields(self):
+        # Included relations are not read from the instance, the loader has them
+        embedded = self._embedded()
+        for field in super()._readable_fields:
+            if field.field_name not in embedded:
+                yield field
+
+    def is_valid(self, *args, **kwargs):
+        timings = current_timings()
+        if timings is None:
+            return super().is_valid(*args, **kwargs)
+        with timings.serializing():
+            return super().is_valid(*args, **kwargs)
+
+class BatchGetSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+
+    def validate_ids(self, value):
+        limit = settings.BATCH_GET_MAX_IDS
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} ids can be fetched at once")
+        # Keep the first occurrence of each id
+        return list(dict.fromkeys(value))
+
+class RelationChangeSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+
+    def validate_ids(self, value):
+        limit = settings.RELATION_CHANGE_MAX_IDS
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} ids can be changed at once")
+        return list(dict.fromkeys(value))
+
+class BulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+
+    def validate_ids(self, value):
+        limit = settings.BULK_DELETE_MAX_IDS
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} ids can be deleted at once")
+        return list(dict.fromkeys(value))
 
 class BaseViewSet(viewsets.ModelViewSet):
     """
@@ -15,10 +202,247 @@ class BaseViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPagination
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        return self._cached(request, lambda: self._list(request))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(request, lambda: super(BaseViewSet, self).retrieve(request, *args, **kwargs))
+
+    def _cached(self, request, view):
+        """
+        Serve the rendered JSON of a read from the API cache (see cache.py).
+
+        Concurrent misses of one key are computed once; the key changes with the
+        version of every model the serializer reads, which writes replace. Each
+        entry is compressed when it is stored and sent in the encoding the
+        client accepts.
+        """
+        model = self.get_queryset().model
+        if type(request.accepted_renderer) is not JSONRenderer or not can_cache(model):
+            return view()
+        key = response_cache_key(request, f'{self.basename}:{self.action}', self._cache_models())
+
+        def render():
+            response = view()
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            content = response.rendered_content
+            return response.status_code, content, response['Content-Type'], compressed_variants(content)
+
+        status_code, content, content_type, variants = api_cache.get_or_compute(
+            key, render, getattr(settings, 'API_CACHE_TTL', 30)
+        )
+        response = HttpResponse(content, status=status_code, content_type=content_type)
+        return encode(response, variants, request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+    def _cache_models(self):
+        # The model and every related model its serializer shows
+        model = self.get_queryset().model
+        fields = {field.name: field for field in model._meta.get_fields() if field.is_relation}
+        related = {
+            fields[field.source].related_model
+            for field in self.get_serializer_class()().fields.values()
+            if not field.write_only and field.source in fields
+        }
+        return sorted({model} | related, key=lambda m: m._meta.label_lower)
+
+    def _list(self, request):
+        if 'ids' in request.query_params:
+            return self._batch_get(request.query_params['ids'].split(','))
+        queryset = self._list_source()
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
+            self._prime_includes(serializer, page)
             return self.get_paginated_response(serializer.data)
+        queryset = list(queryset)
         serializer = self.get_serializer(queryset, many=True)
-        return Response({"data": serializer.data})
\ No newline at end of file
+        self._prime_includes(serializer, queryset)
+        return Response({"data": serializer.data})
+
+    def _list_source(self):
+        """
+        Rows to list: the in-process snapshot (see snapshot.py) when the resource
+        has one and nothing narrows the queryset, otherwise the queryset.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.query.has_filters():
+            rows = catalog_snapshot.rows(queryset.model)
+            if rows is not None:
+                return rows
+        return queryset
+
+    @action(detail=False, methods=['post'], url_path='batch-get', url_name='batch-get')
+    def batch_get(self, request):
+        """
+        Fetch several objects by id, like GET ?ids=a,b,c with the ids in the body.
+        """
+        return self._batch_get(request.data.get('ids') if isinstance(request.data, dict) else None)
+
+    def _batch_get(self, ids):
+        """
+        Objects in the requested order, with the ids that do not exist in meta.missing.
+
+        Everything is loaded with one id__in query plus one query per many-to-many
+        relation, instead of one retrieve per id.
+        """
+        batch = BatchGetSerializer(data={'ids': ids})
+        batch.is_valid(raise_exception=True)
+        ids = batch.validated_data['ids']
+
+        serializer_class = self.get_serializer_class()
+        queryset = self._optimize_for(self.filter_queryset(self.get_queryset()), serializer_class)
+        found = {obj.pk: obj for obj in queryset.filter(pk__in=ids)}
+        instances = [found[pk] for pk in ids if pk in found]
+
+        serializer = self.get_serializer(instances, many=True)
+        self._prime_includes(serializer, instances)
+        return Response({
+            'data': serializer.data,
+            'meta': {'missing': [str(pk) for pk in ids if pk not in found]},
+        })
+
+    def _optimize_for(self, queryset, serializer_class):
+        """
+        Join the nested objects and prefetch the pk lists the serializer reads.
+        """
+        model = queryset.model
+        serializer = serializer_class(context=self.get_serializer_context())
+        relations = [
+            model._meta.get_field(field.source)
+            for field in serializer._readable_fields
+            if field.source in {f.name for f in model._meta.get_fields() if f.is_relation}
+        ]
+        select = [field.name for field in relations if field.many_to_one or field.one_to_one]
+        prefetch = [field.name for field in relations if field.many_to_many]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        serializer_class = self.get_serializer_class()
+        includable = getattr(getattr(serializer_class, 'Meta', None), 'includable', {})
+        if self.request is not None and 'include' in self.request.query_params:
+            include = parse_include(self.request.query_params['include'], includable)
+            if include:
+                context['loader'] = RelatedLoader(
+                    serializer_class.Meta.model, {name: includable[name] for name in include}
+                )
+        return context
+
+    def _prime_includes(self, serializer, instances):
+        # Load the included relations of the whole page at once
+        loader = serializer.context.get('loader')
+        if loader is not None:
+            loader.prime(instances)
+
+    @action(detail=False, methods=['get'], url_path='export', url_name='export')
+    def export(self, request):
+        """
+        Stream every row as NDJSON (default) or CSV, chosen with ?output=.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'detail': f"Unsupported output '{output}', expected one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(request, queryset, self.get_serializer_class(), output, self.basename)
+
+    @action(detail=False, methods=['get'], url_path='changes', url_name='changes')
+    def changes(self, request):
+        """
+        Rows updated and deleted since a point in time, oldest first.
+
+        Start from the beginning, or from ?updated_since=<ISO 8601 datetime>, and
+        continue with ?cursor= set to the cursor of the previous page until
+        has_more is false. The last cursor is where to resume later.
+        """
+        try:
+            limit = min(
+                int(request.query_params.get('limit', settings.CHANGE_FEED_PAGE_SIZE)),
+                settings.CHANGE_FEED_MAX_PAGE_SIZE,
+            )
+            if limit < 1:
+                raise ValueError()
+        except ValueError:
+            return Response({'detail': 'limit must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            if 'cursor' in request.query_params:
+                position = decode_cursor(request.query_params['cursor'])
+            elif 'updated_since' in request.query_params:
+                position = parse_since(request.query_params['updated_since'])
+            else:
+                position = (None, None)
+        except InvalidCursor as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        changes, cursor, has_more = change_feed(
+            self.filter_queryset(self.get_queryset()), self.get_serializer_class(), self.basename,
+            *position, limit=limit,
+        )
+        return Response({'data': changes, 'meta': {'cursor': cursor, 'has_more': has_more}})
+
+    @action(detail=True, methods=['post'], url_path=r'(?P<relation>[a-z_]+)/(?P<operation>add|remove)',
+            url_name='relation')
+    def relation(self, request, pk=None, relation=None, operation=None):
+        """
+        Add or remove links of a many-to-many field, e.g. POST
+        /api/videos/<id>/cast_members/add/ with {"ids": [...]}, without sending
+        (or rewriting) the whole list.
+        """
+        field = self._writable_relation(relation)
+        instance = self.get_object()
+        body = RelationChangeSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        ids = body.validated_data['ids']
+
+        manager = getattr(instance, field.name)
+        if operation == 'add':
+            found = set(field.related_model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            missing = [str(pk) for pk in ids if pk not in found]
+            if missing:
+                return Response({'ids': [f"Unknown {field.related_model.__name__} ids: {', '.join(missing)}"]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            manager.add(*ids)
+        else:
+            manager.remove(*ids)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def _writable_relation(self, name):
+        serializer_class = getattr(self, 'serializer_class', None)
+        fields = serializer_class().fields if serializer_class is not None else {}
+        field = fields.get(name)
+        if not isinstance(field, ManyRelatedField) or field.read_only:
+            raise Http404(f"No many-to-many relation '{name}'")
+        return self.get_queryset().model._meta.get_field(field.source)
+
+    @action(detail=False, methods=['post'], url_path='bulk-delete', url_name='bulk-delete')
+    def bulk_delete(self, request):
+        """
+        Delete several objects by id, removing their many-to-many links in chunks
+        of BULK_DELETE_CHUNK_SIZE instead of all in one transaction.
+        """
+        body = BulkDeleteSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        ids = body.validated_data['ids']
+        allowed = set(self.filter_queryset(self.get_queryset()).filter(pk__in=ids).values_list('pk', flat=True))
+        result = BulkDeleter(self.get_queryset().model).delete([pk for pk in ids if pk in allowed])
+        return Response({
+            'data': {'deleted': result['deleted'], 'links': result['links']},
+            'meta': {'missing': [str(pk) for pk in ids if pk not in allowed]},
+        })
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timings = current_timings()
+        if timings is not None and hasattr(response, 'add_post_render_callback'):
+            # The response is rendered by Django once the view returns
+            timings.mark_view_finished()
+            response.add_post_render_callback(timings.mark_rendered)
+        return response
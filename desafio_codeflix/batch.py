@@ -0,0 +1,155 @@
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections, transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve, reverse
+from .permissions import get_token_payload
+
+logger = logging.getLogger(__name__)
+
+NOT_EXECUTED = {'status': 424, 'body': {'detail': 'Not executed, an earlier operation failed'}}
+
+
+class BatchRunner:
+    """
+    Run API operations of one batch request through the existing views.
+
+    Every operation becomes a request that reuses the outer request's headers,
+    session and decoded token, and is dispatched to the view its path resolves
+    to. In atomic mode all operations share one transaction; the first failing
+    operation rolls it back and the rest are not executed. Otherwise each
+    operation commits on its own, and under ASGI consecutive GETs run
+    concurrently in threads (each with its own connection), since a sync view
+    would otherwise hold the worker's only sync thread for all of them.
+
+    Args:
+        request: The outer DRF request.
+        atomic (bool): Run all operations in one transaction.
+    """
+
+    def __init__(self, request, atomic=True):
+        self.request = request
+        self.atomic = atomic
+        # Decoded once and shared with every operation
+        get_token_payload(request)
+
+    def run(self, operations):
+        """
+        Returns:
+            tuple: (results, committed) with one {'status', 'body'} per operation.
+        """
+        if self.atomic:
+            return self._run_atomic(operations)
+        results = []
+        index = 0
+        while index < len(operations):
+            reads = []
+            while index + len(reads) < len(operations) and operations[index + len(reads)]['method'] == 'GET':
+                reads.append(operations[index + len(reads)])
+            if len(reads) > 1 and self._concurrent_reads():
+                results.extend(self._run_concurrently(reads))
+                index += len(reads)
+                continue
+            with transaction.atomic():
+                result = self._execute(operations[index])
+                if result['status'] >= 400:
+                    transaction.set_rollback(True)
+            results.append(result)
+            index += 1
+        return results, all(result['status'] < 400 for result in results)
+
+    def _run_atomic(self, operations):
+        results = []
+        with transaction.atomic():
+            for operation in operations:
+                result = self._execute(operation)
+                results.append(result)
+                if result['status'] >= 400:
+                    transaction.set_rollback(True)
+                    results.extend(NOT_EXECUTED for _ in operations[len(results):])
+                    return results, False
+        return results, True
+
+    def _concurrent_reads(self):
+        return (
+            isinstance(self.request._request, ASGIRequest)
+            and getattr(settings, 'BATCH_READ_CONCURRENCY', 1) > 1
+        )
+
+    def _run_concurrently(self, operations):
+        def execute(operation):
+            try:
+                return self._execute(operation)
+            finally:
+                connections.close_all()
+
+        workers = min(settings.BATCH_READ_CONCURRENCY, len(operations))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(execute, operations))
+
+    def _execute(self, operation):
+        # 'categories/<id>' and '/api/categories/<id>/' name the same resource
+        root = reverse('api-root')
+        path = '/' + operation['resource'].strip('/') + '/'
+        if not path.startswith(root):
+            path = root + path.lstrip('/')
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return {'status': 404, 'body': {'detail': f"No API resource at '{operation['resource']}'"}}
+        if match.url_name == 'batch':
+            return {'status': 400, 'body': {'detail': 'Batches cannot be nested'}}
+
+        subrequest = self._subrequest(operation, path)
+        subrequest.resolver_match = match
+        try:
+            response = match.func(subrequest, *match.args, **match.kwargs)
+        except Exception as e:
+            logger.exception(f"Batch operation {operation['method']} {path} failed")
+            return {'status': 500, 'body': {'detail': str(e)}}
+        if getattr(response, 'streaming', False):
+            return {'status': 400, 'body': {'detail': 'Streaming responses are not available in batches'}}
+        if hasattr(response, 'data'):
+            body = response.data
+        elif response.get('Content-Type', '').startswith('application/json'):
+            # Rendered responses served from the API cache
+            body = json.loads(response.content)
+        else:
+            body = response.content.decode('utf-8', errors='replace') or None
+        return {'status': response.status_code, 'body': body}
+
+    def _subrequest(self, operation, path):
+        outer = self.request._request
+        body = b''
+        if operation.get('body') is not None:
+            body = json.dumps(operation['body']).encode('utf-8')
+        query = urlencode(operation.get('params') or {}, doseq=True)
+
+        subrequest = HttpRequest()
+        subrequest.method = operation['method']
+        subrequest.path = subrequest.path_info = path
+        subrequest.META = {
+            **outer.META,
+            'REQUEST_METHOD': operation['method'],
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+        }
+        # Bodies are embedded in the batch response, which is compressed as a whole
+        subrequest.META.pop('HTTP_ACCEPT_ENCODING', None)
+        subrequest.GET = QueryDict(query)
+        subrequest._stream = io.BytesIO(body)
+        subrequest._read_started = False
+        subrequest.token_payload = outer.token_payload
+        for attribute in ('session', 'user'):
+            if hasattr(outer, attribute):
+                setattr(subrequest, attribute, getattr(outer, attribute))
+        # The batch request itself already passed the CSRF check
+        subrequest._dont_enforce_csrf_checks = True
+        return subrequest
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, router, transaction
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def _version_key(model):
+    return f'api-version:{model._meta.label_lower}'
+
+
+def model_versions(models):
+    """
+    Current cache version of each model, as one string for cache keys.
+
+    Versions are random tokens rather than counters, so a version evicted from
+    the cache can never come back as a value that older entries were stored under.
+    """
+    cache = _cache()
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_versions(*models):
+    """
+    Invalidate cached responses that depend on the given models, once the
+    current transaction commits (a response computed before the commit could
+    otherwise be stored under the new version).
+    """
+    def bump():
+        _cache().set_many({_version_key(model): uuid.uuid4().hex for model in models}, None)
+    transaction.on_commit(bump)
+
+
+class SingleFlightCache:
+    """
+    Cache in which a missing or expiring key is computed by one caller at a time.
+
+    Entries are stored as (value, compute seconds, expiry) and kept
+    API_CACHE_STALE_TTL seconds past their expiry. On a miss, concurrent callers
+    in this process wait on a per-key lock for the first one, and the first
+    caller of each process takes a lock in the cache backend (cache.add), so with
+    a shared backend only one process computes while the others poll for the
+    result. An entry is refreshed before it expires with probability growing as
+    expiry nears and with its compute time (XFetch), by one caller that gets
+    both locks while everyone else keeps getting the current value; expired
+    entries are served stale the same way until the refresh lands.
+
+    Args:
+        name (str): Label of the cache_requests metric.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get_or_compute(self, key, compute, ttl):
+        cache = _cache()
+        entry = cache.get(key)
+        if entry is not None:
+            value, delta, expires = entry
+            if not self._should_refresh(delta, expires):
+                self._count('hit')
+                return value
+            with self._leader(key, wait=False) as leader:
+                if leader:
+                    self._count('refresh')
+                    return self._fill(cache, key, compute, ttl)
+            self._count('stale')
+            return value
+
+        with self._leader(key, wait=True) as leader:
+            entry = cache.get(key)
+            if entry is not None:
+                self._count('coalesced')
+                return entry[0]
+            if not leader:
+                entry = self._wait(cache, key)
+                if entry is not None:
+                    self._count('coalesced')
+                    return entry[0]
+            self._count('miss')
+            return self._fill(cache, key, compute, ttl)
+
+    def _should_refresh(self, delta, expires):
+        beta = getattr(settings, 'API_CACHE_EARLY_REFRESH_BETA', 1.0)
+        return time.time() - delta * beta * math.log(random.random() or 1e-12) >= expires
+
+    def _fill(self, cache, key, compute, ttl):
+        started = time.perf_counter()
+        value = compute()
+        delta = time.perf_counter() - started
+        stale_ttl = getattr(settings, 'API_CACHE_STALE_TTL', 300)
+        cache.set(key, (value, delta, time.time() + ttl), ttl + stale_ttl)
+        return value
+
+    def _wait(self, cache, key):
+        # Another process is computing the key
+        deadline = time.monotonic() + getattr(settings, 'API_CACHE_LOCK_TIMEOUT', 10)
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+    @contextmanager
+    def _leader(self, key, wait):
+        """
+        Yields whether this caller holds both the process and the backend lock
+        of the key. With wait, callers queue on the process lock instead of
+        giving up.
+        """
+        with self._guard:
+            lock, users = self._locks.get(key, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self._locks[key] = (lock, users + 1)
+        locked = lock.acquire(blocking=wait)
+        shared = False
+        try:
+            if locked:
+                timeout = getattr(settings, 'API_CACHE_LOCK_TIMEOUT', 10)
+                shared = _cache().add(f'{key}:lock', 1, timeout)
+            yield locked and shared
+        finally:
+            if shared:
+                _cache().delete(f'{key}:lock')
+            if locked:
+                lock.release()
+            with self._guard:
+                lock, users = self._locks[key]
+                if users == 1:
+                    del self._locks[key]
+                else:
+                    self._locks[key] = (lock, users - 1)
+
+    def _count(self, result):
+        metrics.cache_requests.inc(cache=self.name, result=result)
+
+
+def response_cache_key(request, prefix, models):
+    """
+    Key of a response: the path with its query string, the negotiated media
+    type and the versions of the models it is built from.
+    """
+    vary = f"{request.get_full_path()}|{request.accepted_media_type}"
+    digest = hashlib.sha1(vary.encode('utf-8')).hexdigest()
+    return f'api:{prefix}:{model_versions(models)}:{digest}'
+
+
+def can_cache(model):
+    """
+    Responses read inside a transaction may see its uncommitted writes, so they
+    are neither served from nor stored in the cache.
+    """
+    if not getattr(settings, 'API_CACHE_ENABLED', True):
+        return False
+    return not connections[router.db_for_read(model)].in_atomic_block
+
+
+api_cache = SingleFlightCache('api')
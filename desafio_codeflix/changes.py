@@ -0,0 +1,122 @@
+import base64
+import json
+import uuid
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .export import CatalogExporter
+from .models import Tombstone
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(changed_at, object_id):
+    payload = json.dumps({'t': changed_at.isoformat(), 'id': str(object_id)})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (changed_at, object_id) of the last change already returned.
+
+    Raises:
+        InvalidCursor: If the cursor was not produced by encode_cursor.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        changed_at = parse_datetime(payload['t'])
+        object_id = uuid.UUID(payload['id'])
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(f"Invalid cursor '{cursor}'")
+    if changed_at is None:
+        raise InvalidCursor(f"Invalid cursor '{cursor}'")
+    return changed_at, object_id
+
+
+def parse_since(value):
+    """
+    Parse the updated_since parameter; naive datetimes are taken as UTC.
+
+    Returns:
+        tuple: A position that includes the changes made at that time.
+
+    Raises:
+        InvalidCursor: If the value is not an ISO 8601 datetime.
+    """
+    since = parse_datetime(value)
+    if since is None:
+        raise InvalidCursor(f"Invalid updated_since '{value}'")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, dt_timezone.utc)
+    # No id sorts before the nil UUID
+    return since, uuid.UUID(int=0)
+
+
+def _after(time_field, id_field, changed_at, object_id):
+    return Q(**{f'{time_field}__gt': changed_at}) | Q(**{time_field: changed_at, f'{id_field}__gt': object_id})
+
+
+def change_feed(queryset, serializer_class, resource, changed_at=None, object_id=None, limit=500):
+    """
+    One page of the change feed of a resource.
+
+    Updated rows and tombstones are read with keyset queries on (updated_at, id)
+    and (deleted_at, object_id), merged in that order and cut at limit, so the
+    position of the last change is the only state a client needs to continue.
+    Changes younger than CHANGE_FEED_SAFETY_LAG are held back: a transaction that
+    commits late may still write an older updated_at than the last one served.
+
+    Args:
+        queryset: Rows of the resource.
+        serializer_class: Serializer used to represent updated rows.
+        resource (str): Tombstone resource name.
+        changed_at (datetime): Position to continue after, or None for the start.
+        object_id (UUID): Id of the change at that position.
+        limit (int): Maximum changes returned.
+
+    Returns:
+        tuple: (changes, cursor, has_more) where cursor continues after the last
+            change, or repeats the given position when there was none (None
+            when the feed is empty).
+    """
+    until = timezone.now() - timedelta(seconds=getattr(settings, 'CHANGE_FEED_SAFETY_LAG', 5))
+    rows = queryset.filter(updated_at__lt=until).order_by('updated_at', 'id')
+    tombstones = Tombstone.objects.filter(resource=resource, deleted_at__lt=until).order_by('deleted_at', 'object_id')
+    if changed_at is not None:
+        rows = rows.filter(_after('updated_at', 'id', changed_at, object_id))
+        tombstones = tombstones.filter(_after('deleted_at', 'object_id', changed_at, object_id))
+
+    exporter = CatalogExporter(queryset, serializer_class)
+    updated = [
+        (row['updated_at'], row['id'], row)
+        for row in exporter.values(rows)[:limit + 1]
+    ]
+    deleted = [
+        (changed, deleted_id, None)
+        for changed, deleted_id in tombstones.values_list('deleted_at', 'object_id')[:limit + 1]
+    ]
+    merged = sorted(updated + deleted, key=lambda change: change[:2])
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+
+    represented = iter(exporter.represent([row for _, _, row in merged if row is not None]))
+    changes = []
+    for changed, change_id, row in merged:
+        if row is None:
+            changes.append({'type': 'deleted', 'id': str(change_id), 'changed_at': changed.isoformat()})
+        else:
+            changes.append({'type': 'updated', 'id': str(change_id), 'changed_at': changed.isoformat(),
+                            'data': next(represented)})
+
+    if merged:
+        cursor = encode_cursor(*merged[-1][:2])
+    elif changed_at is not None:
+        cursor = encode_cursor(changed_at, object_id)
+    else:
+        cursor = None
+    return changes, cursor, has_more
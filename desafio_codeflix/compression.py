@@ -0,0 +1,105 @@
+import gzip
+import re
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_CODING = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+
+
+def encodings():
+    """
+    Content codings this process can produce, preferred first.
+    """
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    return gzip.compress(content, compresslevel=getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+
+
+def compressed_variants(content):
+    """
+    Every encoding of a body worth sending instead of it.
+
+    Returns:
+        dict: Encoded bodies by content coding; empty for bodies shorter than
+        COMPRESSION_MIN_LENGTH and without the codings that do not shrink them.
+    """
+    if len(content) < getattr(settings, 'COMPRESSION_MIN_LENGTH', 512):
+        return {}
+    variants = {}
+    for encoding in encodings():
+        encoded = compress(content, encoding)
+        if len(encoded) < len(content):
+            variants[encoding] = encoded
+    return variants
+
+
+def negotiate(accept_encoding, available):
+    """
+    Pick the content coding to send.
+
+    Args:
+        accept_encoding (str): The request's Accept-Encoding header.
+        available: Codings the body exists in, preferred first.
+
+    Returns:
+        str: The highest-weighted acceptable coding (ties go to the preferred
+        one), or None for the identity body.
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        match = _CODING.match(item)
+        if match is None:
+            continue
+        try:
+            weights[match.group(1).lower()] = float(match.group(2) or 1)
+        except ValueError:
+            continue
+    best, best_weight = None, 0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get('*', 0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def encode(response, variants, accept_encoding):
+    """
+    Swap a response's body for its negotiated encoding from variants.
+    """
+    if not variants:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = negotiate(accept_encoding, [encoding for encoding in encodings() if encoding in variants])
+    if encoding is not None:
+        _set_body(response, variants[encoding], encoding)
+    return response
+
+
+def compress_response(response, accept_encoding):
+    """
+    Compress a response's body in the negotiated coding only.
+    """
+    if len(response.content) < getattr(settings, 'COMPRESSION_MIN_LENGTH', 512):
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = negotiate(accept_encoding, encodings())
+    if encoding is not None:
+        encoded = compress(response.content, encoding)
+        if len(encoded) < len(response.content):
+            _set_body(response, encoded, encoding)
+    return response
+
+
+def _set_body(response, content, encoding):
+    response.content = content
+    response['Content-Encoding'] = encoding
+    response['Content-Length'] = str(len(content))
@@ -0,0 +1,236 @@
+import heapq
+import logging
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from . import metrics
+from .cache import bump_versions
+from .counters import move_media_status, set_media_status
+from .events import publish_media_status
+from .models import AudioVideoMedia, MediaStatus
+from .rabbitmq import publish_event
+from .signals import touch_media_videos
+
+logger = logging.getLogger(__name__)
+
+conversion_jobs = metrics.Counter(
+    'conversion_jobs', 'Conversion jobs by outcome (converted, reused or failed).', ['outcome'])
+conversion_duration = metrics.Histogram(
+    'conversion_duration_seconds', 'Time spent encoding one media.', ['encoder'],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+
+class StubEncoder:
+    """
+    Deterministic encoder that copies the master file; used in tests and on nodes without ffmpeg.
+    """
+    name = 'stub'
+
+    def encode(self, source, destination):
+        shutil.copyfile(source, destination)
+
+
+class FFmpegEncoder:
+    """
+    H.264/AAC MP4 encoder backed by the ffmpeg binary.
+    """
+    name = 'ffmpeg'
+
+    def encode(self, source, destination):
+        subprocess.run(
+            [
+                'ffmpeg', '-nostdin', '-loglevel', 'error', '-y', '-i', str(source),
+                '-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac',
+                '-movflags', '+faststart', str(destination),
+            ],
+            check=True,
+            capture_output=True,
+        )
+
+
+ENCODERS = {
+    StubEncoder.name: StubEncoder,
+    FFmpegEncoder.name: FFmpegEncoder,
+}
+
+
+def get_encoder_name(name='auto'):
+    """
+    Resolve 'auto' to ffmpeg when the binary is on PATH, the stub encoder otherwise.
+    """
+    if name == 'auto':
+        return FFmpegEncoder.name if shutil.which('ffmpeg') else StubEncoder.name
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown encoder '{name}'")
+    return name
+
+
+def encode(encoder_name, source, destination):
+    """
+    Run an encoder in a worker process.
+
+    The file is written next to its destination and renamed once complete, so a
+    crashed job never leaves a truncated output behind.
+
+    Returns:
+        float: Seconds spent encoding.
+    """
+    started = time.perf_counter()
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f'.{destination.name}.tmp')
+    ENCODERS[encoder_name]().encode(source, tmp_path)
+    tmp_path.replace(destination)
+    return time.perf_counter() - started
+
+
+def output_path(media):
+    name = media.asset_id or str(media.id)
+    return Path(settings.MEDIA_ROOT) / 'encoded' / f'{name}.mp4'
+
+
+class ConversionService:
+    """
+    Pick up PENDING media, encode it in a process pool and publish videos.converted.
+
+    Media is claimed by flipping it from PENDING to PROCESSING with a conditional
+    UPDATE, so several nodes can share the table. Claimed jobs wait in a priority
+    queue (highest AudioVideoMedia.priority, then oldest first) until a worker is
+    free. A node never holds more than workers + max_pending claimed jobs, which
+    leaves the rest of the backlog to other nodes.
+    """
+
+    def __init__(self, workers=2, max_pending=4, encoder='auto', executor=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.encoder_name = get_encoder_name(encoder)
+        self.executor = executor or ProcessPoolExecutor(max_workers=workers)
+        self._queue = []
+        self._running = {}
+
+    @property
+    def capacity(self):
+        return self.workers + self.max_pending - len(self._queue) - len(self._running)
+
+    def run_once(self):
+        """
+        Collect finished jobs, claim new media and keep the workers busy.
+
+        Returns:
+            int: Number of jobs finished during this pass.
+        """
+        finished = self._collect()
+        self._claim()
+        self._dispatch()
+        return finished
+
+    def run_forever(self, poll_interval=2.0, retry_delay=5.0):
+        """
+        Run passes until interrupted. A pass that fails, for example on a lost
+        database or broker connection, is logged and retried after retry_delay.
+        """
+        while True:
+            try:
+                close_old_connections()
+                self.run_once()
+            except Exception:
+                logger.exception('Conversion pass failed, retrying')
+                time.sleep(retry_delay)
+                continue
+            time.sleep(poll_interval)
+
+    def drain(self, poll_interval=0.05):
+        """
+        Run until no claimed or running job is left.
+        """
+        finished = self.run_once()
+        while self._queue or self._running:
+            time.sleep(poll_interval)
+            finished += self.run_once()
+        return finished
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def _claim(self):
+        capacity = self.capacity
+        if capacity <= 0:
+            return
+        busy_assets = AudioVideoMedia.objects.filter(
+            status=MediaStatus.PROCESSING, asset__isnull=False
+        ).values('asset_id')
+        candidates = (
+            AudioVideoMedia.objects
+            .filter(status=MediaStatus.PENDING, video__isnull=False)
+            .exclude(asset_id__in=busy_assets)
+            .select_related('asset', 'video')
+            .order_by('-priority', 'created_at')[:capacity]
+        )
+        # One encode per master file: the consumer copies its result to the
+        # other media sharing it, and two encodes would write one output path
+        claimed_assets = {
+            media.asset_id for media in [*self._running.values(), *(entry[-1] for entry in self._queue)]
+            if media.asset_id is not None
+        }
+        for media in candidates:
+            encoding = media.asset is None or not media.asset.encoded_path
+            if encoding and media.asset_id is not None and media.asset_id in claimed_assets:
+                continue
+            with transaction.atomic():
+                claimed = AudioVideoMedia.objects.filter(id=media.id, status=MediaStatus.PENDING).update(
+                    status=MediaStatus.PROCESSING, attempts=F('attempts') + 1, updated_at=timezone.now()
+                )
+                move_media_status(MediaStatus.PENDING, MediaStatus.PROCESSING, claimed)
+                if claimed:
+                    touch_media_videos([media.id])
+            if not claimed:
+                continue
+            bump_versions(AudioVideoMedia)
+            publish_media_status(media.video.id, media.id, MediaStatus.PROCESSING)
+            if media.asset is not None and media.asset.encoded_path:
+                # Same master file was encoded before
+                self._publish(media, media.asset.encoded_path)
+                conversion_jobs.inc(outcome='reused')
+                continue
+            if media.asset_id is not None:
+                claimed_assets.add(media.asset_id)
+            heapq.heappush(self._queue, (-media.priority, media.created_at, str(media.id), media))
+
+    def _dispatch(self):
+        while self._queue and len(self._running) < self.workers:
+            media = heapq.heappop(self._queue)[-1]
+            future = self.executor.submit(encode, self.encoder_name, media.file_path, str(output_path(media)))
+            self._running[future] = media
+
+    def _collect(self):
+        done = [future for future in self._running if future.done()]
+        for future in done:
+            media = self._running.pop(future)
+            try:
+                elapsed = future.result()
+            except Exception as e:
+                logger.error(f"Failed to encode media {media.id}: {e}")
+                with transaction.atomic():
+                    set_media_status(
+                        AudioVideoMedia.objects.filter(id=media.id), MediaStatus.FAILED, updated_at=timezone.now()
+                    )
+                    touch_media_videos([media.id])
+                bump_versions(AudioVideoMedia)
+                publish_media_status(media.video.id, media.id, MediaStatus.FAILED)
+                conversion_jobs.inc(outcome='failed')
+                continue
+            conversion_duration.observe(elapsed, encoder=self.encoder_name)
+            conversion_jobs.inc(outcome='converted')
+            self._publish(media, str(output_path(media)))
+        return len(done)
+
+    def _publish(self, media, encoded_path):
+        # The media stays PROCESSING until startconsumer applies the event
+        if not publish_event('videos.converted', {'video_id': str(media.video.id), 'encoded_path': encoded_path}):
+            logger.error(f"Could not publish videos.converted for media {media.id}")
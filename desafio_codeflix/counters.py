@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from .models import AudioVideoMedia, MediaStatus, MediaStatusCount, Video
+
+# Many-to-many fields of Video whose targets keep a videos_count
+COUNTED_RELATIONS = [Video.categories, Video.genres, Video.cast_members]
+
+
+def counted_relation(through):
+    """
+    The counted many-to-many field of a through model, or None.
+    """
+    return next((relation.field for relation in COUNTED_RELATIONS if relation.through is through), None)
+
+
+def adjust_videos_count(model, changes):
+    """
+    Add to the videos_count of rows with F() updates, one per distinct change.
+
+    Args:
+        model: Category, Genre or CastMember.
+        changes (dict): Change of the count by primary key.
+    """
+    by_change = {}
+    for pk, change in changes.items():
+        if change:
+            by_change.setdefault(change, []).append(pk)
+    for change, pks in by_change.items():
+        model.objects.filter(pk__in=pks).update(videos_count=Greatest(F('videos_count') + change, 0))
+
+
+def recount_videos(model=None, pks=None):
+    """
+    Set videos_count from the through tables, for all counted models or one,
+    and all rows or the given ones. Used after writes that insert or delete
+    links without model signals, and to repair counts.
+    """
+    for relation in COUNTED_RELATIONS:
+        field = relation.field
+        if model is not None and field.related_model is not model:
+            continue
+        target = field.m2m_reverse_field_name()
+        counts = (
+            relation.through.objects.filter(**{target: OuterRef('pk')})
+            .order_by().values(target).annotate(count=Count('pk')).values('count')
+        )
+        rows = field.related_model.objects.all()
+        if pks is not None:
+            rows = rows.filter(pk__in=pks)
+        rows.update(videos_count=Coalesce(Subquery(counts), 0))
+
+
+def move_media_status(old, new, count=1):
+    """
+    Move count media from status old to new, None standing for media created
+    or deleted.
+    """
+    if not count or old == new:
+        return
+    for status, change in ((old, -count), (new, count)):
+        if status is None:
+            continue
+        if not MediaStatusCount.objects.filter(status=status).update(count=F('count') + change):
+            MediaStatusCount.objects.get_or_create(status=status)
+            MediaStatusCount.objects.filter(status=status).update(count=F('count') + change)
+
+
+def set_media_status(queryset, status, **fields):
+    """
+    queryset.update(status=status, **fields) for the rows in another status,
+    moving the status counters by the rows that left each status.
+
+    Returns:
+        int: Rows updated.
+    """
+    updated = 0
+    with transaction.atomic():
+        for old in MediaStatus:
+            if old == status:
+                continue
+            moved = queryset.filter(status=old).update(status=status, **fields)
+            move_media_status(old, status, moved)
+            updated += moved
+    return updated
+
+
+def media_status_counts():
+    """
+    Number of media in each status, read from the counters.
+    """
+    counts = {status.value: 0 for status in MediaStatus}
+    counts.update(MediaStatusCount.objects.values_list('status', 'count'))
+    return counts
+
+
+def recount_media_statuses():
+    """
+    Set the status counters with one grouped query over the status index.
+    """
+    counts = {status.value: 0 for status in MediaStatus}
+    with transaction.atomic():
+        for row in AudioVideoMedia.objects.order_by().values('status').annotate(count=Count('id')):
+            counts[row['status']] = row['count']
+        for status, count in counts.items():
+            MediaStatusCount.objects.update_or_create(status=status, defaults={'count': count})
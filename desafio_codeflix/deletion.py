@@ -0,0 +1,111 @@
+import logging
+from django.conf import settings
+from django.db import connections, router, transaction
+from .counters import adjust_videos_count, counted_relation
+from .signals import TRACKED_RELATIONS, touch
+
+logger = logging.getLogger(__name__)
+
+
+class BulkDeleter:
+    """
+    Delete rows whose many-to-many links are too many to delete in one go.
+
+    Model.delete() collects every through-table row of the object in Python and
+    deletes them in the same transaction as the object. Here the links of each
+    object are removed first, chunk_size at a time: every chunk is one
+    transaction that touches the owners losing the link (so the change feed sees
+    them) and then runs a raw DELETE bounded by the through-table id, without
+    loading the links or the related objects. The object itself is deleted last,
+    together with its tombstone, once only its own row is left.
+
+    Args:
+        model: Model of the rows to delete.
+        chunk_size (int): Links deleted per transaction.
+        progress (callable): Called as progress(pk, relation, deleted) after every chunk.
+    """
+
+    def __init__(self, model, chunk_size=None, progress=None):
+        self.model = model
+        self.chunk_size = chunk_size or getattr(settings, 'BULK_DELETE_CHUNK_SIZE', 5000)
+        self.progress = progress
+
+    def delete(self, pks):
+        """
+        Returns:
+            dict: Objects deleted, links deleted and the ids that did not exist.
+        """
+        existing = set(self.model.objects.filter(pk__in=pks).values_list('pk', flat=True))
+        result = {'deleted': 0, 'links': 0, 'missing': [pk for pk in pks if pk not in existing]}
+        for pk in dict.fromkeys(pk for pk in pks if pk in existing):
+            for relation in self._relations():
+                result['links'] += self._unlink(pk, *relation)
+            with transaction.atomic():
+                instance = self.model.objects.filter(pk=pk).first()
+                if instance is None:
+                    continue
+                # Its tombstone is recorded by the post_delete signal
+                instance.delete()
+            result['deleted'] += 1
+        return result
+
+    def _relations(self):
+        """
+        (through model, column of this model, column of the other side, owner
+        model to touch or None) for every many-to-many table referencing the model.
+        """
+        relations = []
+        for field in self.model._meta.many_to_many:
+            through = field.remote_field.through
+            relations.append((
+                through,
+                through._meta.get_field(field.m2m_field_name()),
+                through._meta.get_field(field.m2m_reverse_field_name()),
+                None,
+            ))
+        for relation in TRACKED_RELATIONS:
+            field = relation.field
+            if field.related_model is self.model:
+                through = field.remote_field.through
+                relations.append((
+                    through,
+                    through._meta.get_field(field.m2m_reverse_field_name()),
+                    through._meta.get_field(field.m2m_field_name()),
+                    field.model,
+                ))
+        return relations
+
+    def _unlink(self, pk, through, source, target, owner):
+        db = connections[router.db_for_write(through)]
+        ops = db.ops
+        table = ops.quote_name(through._meta.db_table)
+        pk_column = ops.quote_name(through._meta.pk.column)
+        links = through.objects.using(db.alias).filter(**{source.attname: pk}).order_by('pk')
+        prepared = source.target_field.get_db_prep_value(pk, db)
+        deleted = 0
+        while True:
+            with transaction.atomic(using=db.alias):
+                bound = list(links.values_list('pk', flat=True)[self.chunk_size - 1:self.chunk_size])
+                chunk = links.filter(pk__lte=bound[0]) if bound else links
+                if owner is not None:
+                    touch(owner, chunk.values(target.attname))
+                elif counted_relation(through) is not None:
+                    # The video's categories, genres and cast members lose one video each
+                    adjust_videos_count(target.related_model, dict.fromkeys(
+                        chunk.values_list(target.attname, flat=True), -1
+                    ))
+                sql = f'DELETE FROM {table} WHERE {ops.quote_name(source.column)} = %s'
+                params = [prepared]
+                if bound:
+                    sql += f' AND {pk_column} <= %s'
+                    params.append(bound[0])
+                with db.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    deleted += cursor.rowcount
+            if self.progress is not None:
+                self.progress(pk, through._meta.db_table, deleted)
+            if not bound:
+                break
+        if deleted:
+            logger.info(f"Deleted {deleted} links of {self.model.__name__} {pk} from {through._meta.db_table}")
+        return deleted
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import threading
+import pika
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Events of one channel delivered to one asyncio consumer.
+
+    Events published while the queue is full are dropped for this subscriber
+    only, so a stalled client never slows publishers down.
+    """
+
+    def __init__(self, backend, channel, loop, maxsize=100):
+        self.backend = backend
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning(f"Dropping event for slow subscriber of {self.channel}")
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class LocalEventBackend:
+    """
+    In-process pub/sub. Publishing is thread-safe and never blocks.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channel, loop=None):
+        subscription = Subscription(self, channel, loop or asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event):
+        self.dispatch(channel, event)
+
+    def dispatch(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+
+class RabbitMQEventBackend(LocalEventBackend):
+    """
+    Cross-process pub/sub over a RabbitMQ fanout exchange.
+
+    Every process that has subscribers binds an exclusive queue to the exchange
+    from a background thread and dispatches what it receives to its local
+    subscribers, so events published by the consumer or the converters reach
+    the ASGI workers holding the client connections.
+    """
+    exchange = 'media.events'
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, channel, loop=None):
+        subscription = super().subscribe(channel, loop)
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='media-events', daemon=True)
+                self._listener.start()
+        return subscription
+
+    def publish(self, channel, event):
+        try:
+            connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
+            try:
+                ch = connection.channel()
+                ch.exchange_declare(exchange=self.exchange, exchange_type='fanout')
+                ch.basic_publish(
+                    exchange=self.exchange,
+                    routing_key='',
+                    body=json.dumps({'channel': channel, 'event': event}),
+                )
+            finally:
+                connection.close()
+        except Exception as e:
+            logger.error(f"Failed to publish media event to {channel}: {e}")
+
+    def _listen(self):
+        while True:
+            try:
+                connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
+                ch = connection.channel()
+                ch.exchange_declare(exchange=self.exchange, exchange_type='fanout')
+                queue = ch.queue_declare(queue='', exclusive=True).method.queue
+                ch.queue_bind(exchange=self.exchange, queue=queue)
+
+                def callback(ch, method, properties, body):
+                    message = json.loads(body)
+                    self.dispatch(message['channel'], message['event'])
+
+                ch.basic_consume(queue=queue, on_message_callback=callback, auto_ack=True)
+                ch.start_consuming()
+            except Exception as e:
+                logger.error(f"Media event listener disconnected: {e}")
+                threading.Event().wait(5)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    The process-wide event backend configured by MEDIA_EVENTS_BACKEND.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(
+                    getattr(settings, 'MEDIA_EVENTS_BACKEND', 'desafio_codeflix.events.LocalEventBackend')
+                )()
+    return _backend
+
+
+def video_channel(video_id):
+    return f'video:{video_id}'
+
+
+def publish_media_status(video_id, media_id, status, encoded_path=None):
+    """
+    Announce a media status transition to the clients watching the video.
+    """
+    if video_id is None:
+        return
+    get_backend().publish(video_channel(video_id), {
+        'video_id': str(video_id),
+        'media_id': str(media_id),
+        'status': str(status),
+        'encoded_path': encoded_path,
+    })
@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import re
+import zlib
+from itertools import islice
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class CatalogExporter:
+    """
+    Stream every row of a queryset in the shape of its API serializer.
+
+    Rows are read with a single values() query through iterator(chunk_size), so
+    only one chunk is held in memory at a time. Many-to-many ids are loaded with
+    one query on the through table per relation and chunk, and nested serializers
+    (Video.video) are joined into the main query instead of being fetched per row.
+
+    Args:
+        queryset: Rows to export.
+        serializer_class: Serializer whose readable fields define the columns.
+        chunk_size (int): Rows fetched from the database per round trip.
+    """
+
+    def __init__(self, queryset, serializer_class, chunk_size=None):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+        self.names = []
+        self.columns = []
+        self.many = []
+        self.nested = {}
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            self.names.append(name)
+            if isinstance(field, ManyRelatedField):
+                self.many.append((name, self.model._meta.get_field(field.source)))
+            elif isinstance(field, serializers.BaseSerializer):
+                subfields = [(sub, subfield) for sub, subfield in field.fields.items() if not subfield.write_only]
+                self.nested[name] = subfields
+                self.columns.extend((f'{name}__{sub}', subfield) for sub, subfield in subfields)
+            else:
+                self.columns.append((field.source, field))
+
+    def values(self, queryset):
+        """
+        The queryset narrowed to the columns read by represent().
+        """
+        return queryset.values(*[column for column, _ in self.columns])
+
+    def represent(self, rows):
+        """
+        Turn rows from values() into dicts with the same keys and values as the API.
+        """
+        ids = [row['id'] for row in rows]
+        related = {name: self._related_ids(field, ids) for name, field in self.many}
+        return [self._represent(row, related) for row in rows]
+
+    def chunks(self):
+        """
+        Yield lists of up to chunk_size represented rows, in primary key order.
+        """
+        values = self.values(self.queryset.order_by('pk')).iterator(chunk_size=self.chunk_size)
+        while True:
+            chunk = list(islice(values, self.chunk_size))
+            if not chunk:
+                return
+            yield self.represent(chunk)
+
+    def _related_ids(self, field, ids):
+        through = field.remote_field.through
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        related = {}
+        pairs = through.objects.filter(**{f'{source}__in': ids}).values_list(source, target)
+        for source_id, target_id in pairs:
+            related.setdefault(source_id, []).append(str(target_id))
+        return related
+
+    def _represent(self, row, related):
+        item = {}
+        for column, field in self.columns:
+            if '__' in column:
+                continue
+            item[column] = self._value(field, row[column])
+        for name, subfields in self.nested.items():
+            if row[f'{name}__id'] is None:
+                item[name] = None
+            else:
+                item[name] = {sub: self._value(subfield, row[f'{name}__{sub}']) for sub, subfield in subfields}
+        for name, _ in self.many:
+            item[name] = related[name].get(row['id'], [])
+        return {name: item[name] for name in self.names}
+
+    def _value(self, field, value):
+        if value is None:
+            return None
+        if isinstance(field, RelatedField):
+            return str(value)
+        return field.to_representation(value)
+
+    def ndjson(self):
+        for rows in self.chunks():
+            yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+
+    def csv(self):
+        header = []
+        for name in self.names:
+            nested = self.nested.get(name)
+            header.extend([f'{name}.{sub}' for sub, _ in nested] if nested else [name])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for rows in self.chunks():
+            for row in rows:
+                writer.writerow(self._flatten(row))
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    def _flatten(self, row):
+        cells = []
+        for name in self.names:
+            value = row[name]
+            nested = self.nested.get(name)
+            if nested:
+                cells.extend((value or {}).get(sub) for sub, _ in nested)
+            elif isinstance(value, list):
+                cells.append('|'.join(value))
+            else:
+                cells.append(value)
+        return cells
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Compress a byte stream on the fly, emitting output as each chunk is compressed.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(request, queryset, serializer_class, output, filename):
+    """
+    Build the streaming export response.
+
+    Args:
+        request: The request, whose Accept-Encoding decides on gzip.
+        queryset: Rows to export.
+        serializer_class: Serializer defining the exported fields.
+        output (str): 'ndjson' or 'csv'.
+        filename (str): Download name without extension.
+
+    Returns:
+        StreamingHttpResponse: The export, gzip-encoded when the client accepts it.
+    """
+    exporter = CatalogExporter(queryset, serializer_class)
+    content = exporter.csv() if output == 'csv' else exporter.ndjson()
+    gzipped = bool(_ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    if gzipped:
+        content = gzip_stream(content, getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6))
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
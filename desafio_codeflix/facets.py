@@ -0,0 +1,70 @@
+import uuid
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast
+from .models import Category, Genre, Video
+
+# Facets of the video list: name, group field of the video query and, for
+# relations, the model whose videos_count answers the unfiltered case
+FIELDS = [
+    ('rating', 'rating', None),
+    ('year_launched', 'year_launched', None),
+    ('categories', 'categories', Category),
+    ('genres', 'genres', Genre),
+]
+
+
+def _grouped(queryset, name, field, count):
+    return (
+        queryset.order_by()
+        .annotate(facet=Value(name, output_field=CharField()), key=Cast(field, CharField()))
+        .values('facet', 'key').annotate(count=count).values_list('facet', 'key', 'count')
+    )
+
+
+def video_facets(queryset):
+    """
+    Number of videos per rating, launch year, category and genre, among the
+    videos of queryset, in one UNION ALL query.
+
+    Without filters the category and genre counts are read from their
+    videos_count columns instead of grouping the link tables.
+
+    Returns:
+        dict: {'data': {facet: [{'value' or 'id', 'count'}]}, 'meta': {'total'}},
+        each facet ordered by count, highest first.
+    """
+    filtered = queryset.query.has_filters()
+    parts = [
+        queryset.order_by().annotate(facet=Value('total', output_field=CharField()), key=Value('', output_field=CharField()))
+        .values('facet', 'key').annotate(count=Count('pk')).values_list('facet', 'key', 'count')
+    ]
+    for name, field, model in FIELDS:
+        if model is None:
+            parts.append(_grouped(queryset, name, field, Count('pk')))
+        elif filtered:
+            link = Video._meta.get_field(field).remote_field.through
+            target = Video._meta.get_field(field).m2m_reverse_field_name()
+            parts.append(_grouped(link.objects.filter(video__in=queryset.values('pk')), name, target, Count('pk')))
+        else:
+            parts.append(
+                model.objects.filter(videos_count__gt=0).order_by()
+                .annotate(facet=Value(name, output_field=CharField()), key=Cast('pk', CharField()),
+                          count=F('videos_count'))
+                .values_list('facet', 'key', 'count')
+            )
+
+    facets = {name: [] for name, _, _ in FIELDS}
+    total = 0
+    for name, key, count in parts[0].union(*parts[1:], all=True):
+        if name == 'total':
+            total = count
+        elif name == 'year_launched':
+            facets[name].append({'value': int(key), 'count': count})
+        elif name in ('categories', 'genres'):
+            # SQLite stores UUIDs as plain hex
+            facets[name].append({'id': str(uuid.UUID(key)), 'count': count})
+        else:
+            facets[name].append({'value': key, 'count': count})
+    for name, values in facets.items():
+        values.sort(key=lambda item: (-item['count'], str(item.get('value', item.get('id')))))
+    return {'data': facets, 'meta': {'total': total}}
@@ -0,0 +1,380 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models.constants import OnConflict
+from .models import CastMember, Category, Genre, Video
+from .cache import bump_versions
+from .counters import counted_relation, recount_videos
+from .snapshot import bump
+
+logger = logging.getLogger(__name__)
+
+# Import order: every resource only references the ones before it
+RESOURCES = {
+    'categories': Category,
+    'cast_members': CastMember,
+    'genres': Genre,
+    'videos': Video,
+}
+
+NATURAL_KEYS = {
+    Category: 'name',
+    CastMember: 'name',
+    Genre: 'name',
+    Video: 'title',
+}
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+def read_rows(path):
+    """
+    Yield (line number, dict) from an NDJSON or CSV file, optionally gzipped.
+
+    CSV files use the layout of the export endpoint: many-to-many cells hold
+    '|'-separated references and nested 'video.*' columns are ignored.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        if name.endswith('.csv'):
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                yield line, {key: value for key, value in row.items() if '.' not in key}
+        else:
+            for line, text in enumerate(f, start=1):
+                if text.strip():
+                    yield line, json.loads(text)
+
+
+def _import_fields(model):
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field.editable and not field.primary_key and not field.is_relation
+    ]
+    return fields, list(model._meta.many_to_many)
+
+
+def validate_chunk(resource, rows):
+    """
+    Clean a chunk of rows with the model fields. Runs in the validation pool, so
+    it must not touch the database.
+
+    Returns:
+        tuple: (valid, errors) where valid is a list of dicts with 'line', 'id',
+            'values' and 'refs', and errors a list of (line, message).
+    """
+    model = RESOURCES[resource]
+    fields, many = _import_fields(model)
+    valid = []
+    errors = []
+    for line, row in rows:
+        try:
+            valid.append(_clean_row(model, fields, many, line, row))
+        except ValidationError as e:
+            errors.append((line, '; '.join(e.messages)))
+        except (TypeError, ValueError, AttributeError) as e:
+            errors.append((line, str(e)))
+    return valid, errors
+
+
+def _clean_row(model, fields, many, line, row):
+    values = {}
+    for field in fields:
+        if field.name not in row:
+            if not field.has_default() and not field.null:
+                raise ValidationError(f"{field.name}: This field is required.")
+            continue
+        value = row[field.name]
+        if value == '' and field.null:
+            value = None
+        try:
+            values[field.name] = field.clean(value, None)
+        except ValidationError as e:
+            raise ValidationError(f"{field.name}: {'; '.join(e.messages)}")
+    refs = {}
+    for field in many:
+        value = row.get(field.name, row.get(f'{field.name}_id'))
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = [ref for ref in value.split('|') if ref]
+        refs[field.name] = [str(ref) for ref in value]
+    row_id = row.get('id') or None
+    return {
+        'line': line,
+        'id': str(uuid.UUID(str(row_id))) if row_id else None,
+        'values': values,
+        'refs': refs,
+    }
+
+
+class IdMap:
+    """
+    Ids of one model, loaded once and kept current while importing, so references
+    by id or by natural key are resolved without per-row queries.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.key = NATURAL_KEYS[model]
+        self._by_key = None
+        self._ids = None
+
+    def _load(self):
+        self._by_key = {}
+        self._ids = set()
+        for pk, key in self.model.objects.values_list('pk', self.key).iterator(chunk_size=10000):
+            self._remember(pk, key)
+
+    def _remember(self, pk, key):
+        self._ids.add(pk)
+        # Natural keys that are not unique cannot be used as references
+        self._by_key[key] = pk if self._by_key.get(key, pk) == pk else None
+
+    def add(self, pk, key):
+        if self._ids is not None:
+            self._remember(pk, key)
+
+    def has(self, pk):
+        if self._ids is None:
+            self._load()
+        return pk in self._ids
+
+    def lookup(self, key):
+        if self._by_key is None:
+            self._load()
+        return self._by_key.get(key)
+
+    def resolve(self, ref):
+        """
+        Resolve a reference given as id or natural key.
+
+        Raises:
+            CatalogImportError: If the reference is unknown or ambiguous.
+        """
+        try:
+            # Skip parsing what cannot be a UUID, most references are names
+            pk = uuid.UUID(ref) if len(ref) in (32, 36) else None
+        except ValueError:
+            pk = None
+        if pk is None:
+            pk = self.lookup(ref)
+            if pk is None:
+                raise CatalogImportError(f"Unknown or ambiguous {self.model.__name__} '{ref}'")
+            return pk
+        if not self.has(pk):
+            raise CatalogImportError(f"Unknown {self.model.__name__} '{ref}'")
+        return pk
+
+
+class Checkpoint:
+    """
+    Lines already imported per file, saved atomically after every committed chunk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def position(self, source):
+        entry = self.state.get(os.path.abspath(source))
+        if entry is None:
+            return 0
+        if entry['size'] != os.path.getsize(source):
+            logger.warning(f"{source} changed since the checkpoint was written, importing it from the start")
+            return 0
+        return entry['line']
+
+    def save(self, source, line):
+        if not self.path:
+            return
+        self.state[os.path.abspath(source)] = {'line': line, 'size': os.path.getsize(source)}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+class CatalogImporter:
+    """
+    Stream catalog files into the database.
+
+    Rows are read in chunks of batch_size and cleaned in a process pool (at most
+    2 * workers chunks in flight, so memory does not grow with the file). Each
+    cleaned chunk is written in one transaction: an upsert with
+    bulk_create(update_conflicts=True) keyed on the id, then the chunk's
+    many-to-many links are replaced with bulk inserts on the through tables.
+    Rows without an id update the existing row with the same natural key (name,
+    or title for videos) or are created with a new id. The videos_count of
+    the categories, genres and cast members whose links a chunk inserted or
+    deleted is recounted in the chunk's transaction.
+
+    Args:
+        batch_size (int): Rows per chunk and per INSERT statement.
+        workers (int): Validation processes; 0 validates in this process.
+        checkpoint (str): File recording the imported lines of each file, used to
+            resume an interrupted import.
+    """
+
+    def __init__(self, batch_size=2000, workers=None, checkpoint=None):
+        self.batch_size = batch_size
+        self.workers = os.cpu_count() if workers is None else workers
+        self.checkpoint = Checkpoint(checkpoint)
+        self.id_maps = {model: IdMap(model) for model in NATURAL_KEYS}
+        self.errors = []
+
+    def import_file(self, resource, path):
+        """
+        Import one file of the given resource.
+
+        Returns:
+            dict: Rows imported, skipped on resume and rejected, and the elapsed seconds.
+        """
+        if resource not in RESOURCES:
+            raise CatalogImportError(f"Unknown resource '{resource}'")
+        started = time.perf_counter()
+        skip = self.checkpoint.position(path)
+        rows = ((line, row) for line, row in read_rows(path) if line > skip)
+        chunks = iter(lambda: list(islice(rows, self.batch_size)), [])
+        result = {'imported': 0, 'skipped': skip, 'rejected': 0}
+        for chunk, (valid, errors) in self._validate(resource, chunks):
+            write_errors = self._write(RESOURCES[resource], valid)
+            errors = errors + write_errors
+            result['imported'] += len(valid) - len(write_errors)
+            result['rejected'] += len(errors)
+            self.errors.extend((path, line, message) for line, message in errors)
+            self.checkpoint.save(path, chunk[-1][0])
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        return result
+
+    def _validate(self, resource, chunks):
+        if not self.workers:
+            for chunk in chunks:
+                yield chunk, validate_chunk(resource, chunk)
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            for chunk in chunks:
+                pending.append((chunk, executor.submit(validate_chunk, resource, chunk)))
+                if len(pending) >= 2 * self.workers:
+                    chunk, future = pending.pop(0)
+                    yield chunk, future.result()
+            for chunk, future in pending:
+                yield chunk, future.result()
+
+    def _write(self, model, rows):
+        """
+        Upsert a chunk of cleaned rows and replace their many-to-many links.
+
+        Returns:
+            list: (line, message) of the rows rejected because of unresolved references.
+        """
+        id_map = self.id_maps[model]
+        _, many = _import_fields(model)
+        objects = {}
+        created = set()
+        links = {field.name: {} for field in many}
+        errors = []
+        for row in rows:
+            try:
+                refs = {
+                    field.name: [self.id_maps[field.related_model].resolve(ref) for ref in row['refs'][field.name]]
+                    for field in many if field.name in row['refs']
+                }
+            except CatalogImportError as e:
+                errors.append((row['line'], str(e)))
+                continue
+            key = row['values'].get(id_map.key)
+            pk = uuid.UUID(row['id']) if row['id'] else id_map.lookup(key)
+            if pk is None:
+                pk = uuid.uuid4()
+                created.add(pk)
+            id_map.add(pk, key)
+            # A later row for the same id wins, one upsert cannot touch a row twice
+            objects[pk] = model(pk=pk, **row['values'])
+            for name, targets in refs.items():
+                links[name][pk] = targets
+
+        update_fields = [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key and not field.is_relation and field.name not in ('created_at', 'videos_count')
+        ]
+        with transaction.atomic():
+            model.objects.bulk_create(
+                list(objects.values()),
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=update_fields,
+            )
+            for field in many:
+                changed = self._replace_links(field, links[field.name], created)
+                if changed:
+                    # Links were written without model signals
+                    recount_videos(field.related_model, changed)
+            bump(model)
+            bump_versions(model)
+        return errors
+
+    def _replace_links(self, field, links, created):
+        """
+        Replace the links of the given rows. Rows created by this chunk have none
+        to delete, and the inserts go through executemany instead of model
+        instances, which dominate the import time otherwise.
+
+        Returns:
+            set: For counted relations, the targets of the links deleted or
+                inserted, whose videos_count must be recounted.
+        """
+        if not links:
+            return set()
+        through = field.remote_field.through
+        source = through._meta.get_field(field.m2m_field_name())
+        target = through._meta.get_field(field.m2m_reverse_field_name())
+        counted = counted_relation(through) is not None
+        changed = set()
+        existing = [pk for pk in links if pk not in created]
+        if existing:
+            old_links = through.objects.filter(**{f'{source.name}__in': existing})
+            if counted:
+                changed.update(old_links.values_list(target.attname, flat=True))
+            old_links.delete()
+
+        db = connections[router.db_for_write(through)]
+        ops = db.ops
+        sql = (
+            f'{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {ops.quote_name(through._meta.db_table)} '
+            f'({ops.quote_name(source.column)}, {ops.quote_name(target.column)}) VALUES (%s, %s) '
+            f'{ops.on_conflict_suffix_sql([source, target], OnConflict.IGNORE, None, None)}'
+        )
+        prepared = {}
+
+        def prepare(field, pk):
+            if pk not in prepared:
+                prepared[pk] = field.target_field.get_db_prep_value(pk, db)
+            return prepared[pk]
+
+        params = [
+            (prepare(source, pk), prepare(target, target_id))
+            for pk, targets in links.items()
+            for target_id in dict.fromkeys(targets)
+        ]
+        with db.cursor() as cursor:
+            for start in range(0, len(params), self.batch_size):
+                cursor.executemany(sql, params[start:start + self.batch_size])
+        if counted:
+            changed.update(target_id for targets in links.values() for target_id in targets)
+        return changed
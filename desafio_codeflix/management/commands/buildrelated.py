@@ -0,0 +1,33 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from desafio_codeflix.models import Video
+from desafio_codeflix.related import RelatedVideosBuilder, RelatedVideosUnavailable
+
+
+class Command(BaseCommand):
+    help = 'Compute the related videos served by /api/videos/<id>/related/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, help='Related videos kept per video (default: RELATED_VIDEOS_K)')
+        parser.add_argument('--block-cells', type=int,
+                            help='Similarity scores computed at once (default: RELATED_VIDEOS_BLOCK_CELLS)')
+        parser.add_argument('--updated-within', type=int,
+                            help='Only recompute videos updated in the last N seconds and the videos listing them')
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f'{done}/{total} videos')
+
+        try:
+            builder = RelatedVideosBuilder(k=options['k'], block_cells=options['block_cells'], progress=progress)
+        except RelatedVideosUnavailable as e:
+            raise CommandError(str(e))
+        pks = None
+        if options['updated_within'] is not None:
+            since = timezone.now() - timedelta(seconds=options['updated_within'])
+            pks = list(Video.objects.filter(updated_at__gte=since).values_list('pk', flat=True))
+        result = builder.build(pks)
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed the related videos of {result['videos']} videos ({result['rows']} rows)"
+        ))
@@ -0,0 +1,31 @@
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from desafio_codeflix.deletion import BulkDeleter
+from desafio_codeflix.importer import RESOURCES
+
+
+class Command(BaseCommand):
+    help = 'Delete catalog rows, removing their many-to-many links in bounded transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=list(RESOURCES))
+        parser.add_argument('ids', nargs='+', metavar='ID')
+        parser.add_argument('--chunk-size', type=int,
+                            help='Links deleted per transaction (default: BULK_DELETE_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            ids = [uuid.UUID(value) for value in options['ids']]
+        except ValueError as e:
+            raise CommandError(f'Invalid id: {e}')
+
+        def progress(pk, table, deleted):
+            self.stdout.write(f'{pk}: {deleted} links deleted from {table}')
+
+        deleter = BulkDeleter(RESOURCES[options['resource']], chunk_size=options['chunk_size'], progress=progress)
+        result = deleter.delete(ids)
+        for pk in result['missing']:
+            self.stderr.write(f'{pk} does not exist')
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {result['deleted']} {options['resource'].replace('_', ' ')} and {result['links']} links"
+        ))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from desafio_codeflix.importer import RESOURCES, CatalogImporter, CatalogImportError
+
+
+class Command(BaseCommand):
+    help = 'Import categories, cast members, genres and videos from NDJSON or CSV files'
+
+    def add_arguments(self, parser):
+        for resource in RESOURCES:
+            parser.add_argument(f"--{resource.replace('_', '-')}", dest=resource, metavar='PATH',
+                                help=f'NDJSON or CSV file (optionally .gz) of {resource.replace("_", " ")}')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows validated, upserted and committed together')
+        parser.add_argument('--workers', type=int,
+                            help='Validation processes (default: one per CPU, 0 validates inline)')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint file; an interrupted import run again with it resumes '
+                                 'after the last committed batch')
+        parser.add_argument('--max-errors', type=int, default=20,
+                            help='Rejected rows to print')
+
+    def handle(self, *args, **options):
+        files = [(resource, options[resource]) for resource in RESOURCES if options[resource]]
+        if not files:
+            raise CommandError('Nothing to import, pass at least one of: ' + ', '.join(
+                f"--{resource.replace('_', '-')}" for resource in RESOURCES
+            ))
+
+        importer = CatalogImporter(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            checkpoint=options['checkpoint'],
+        )
+        for resource, path in files:
+            try:
+                result = importer.import_file(resource, path)
+            except (CatalogImportError, OSError, ValueError) as e:
+                raise CommandError(f'Failed to import {path}: {e}')
+            rate = result['imported'] / result['seconds'] if result['seconds'] else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {result['imported']} {resource.replace('_', ' ')} from {path} "
+                f"in {result['seconds']}s ({rate:.0f} rows/s), "
+                f"skipped {result['skipped']} lines already imported, rejected {result['rejected']}"
+            ))
+
+        for path, line, message in importer.errors[:options['max_errors']]:
+            self.stderr.write(f'{path}:{line}: {message}')
+        if len(importer.errors) > options['max_errors']:
+            self.stderr.write(f'... and {len(importer.errors) - options["max_errors"]} more rejected rows')
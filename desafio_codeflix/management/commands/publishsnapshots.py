@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from desafio_codeflix.publishing import SnapshotPublisher
+
+
+class Command(BaseCommand):
+    help = 'Write the first list pages and every video detail as static, precompressed JSON files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', help='Directory to publish into (default: PUBLISHED_SNAPSHOTS_ROOT)')
+        parser.add_argument('--pages', type=int,
+                            help='List pages published per resource (default: PUBLISHED_SNAPSHOTS_PAGES)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Videos loaded per query')
+
+    def handle(self, *args, **options):
+        publisher = SnapshotPublisher(root=options['root'], pages=options['pages'])
+
+        def progress(published):
+            self.stdout.write(f'{published} videos published')
+
+        result = publisher.publish_all(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {result['pages']} list pages and {result['videos']} videos "
+            f"to {publisher.root}, removed {result['removed']} stale ones"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from desafio_codeflix.counters import recount_media_statuses, recount_videos
+
+
+class Command(BaseCommand):
+    help = 'Recompute the videos_count columns and the media status counters'
+
+    def handle(self, *args, **options):
+        recount_videos()
+        recount_media_statuses()
+        self.stdout.write(self.style.SUCCESS('Recounted videos per category, genre and cast member and media per status'))
@@ -3,14 +3,27 @@ import json
 import logging
 import time
 from django.core.management.base import BaseCommand
-from desafio_codeflix.models import Video, AudioVideoMedia, MediaStatus
+from django.db import transaction
+from desafio_codeflix.models import Video, AudioVideoMedia, MediaAsset, MediaStatus
+from desafio_codeflix.profiling import consumer_profiler
+from desafio_codeflix import metrics
+from desafio_codeflix.cache import bump_versions
+from desafio_codeflix.counters import set_media_status
+from desafio_codeflix.events import publish_media_status
+from desafio_codeflix.signals import touch_media_videos
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = 'Start the RabbitMQ consumer for processing video conversion events'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--metrics-port', type=int,
+                            help='Expose Prometheus metrics over HTTP on this port')
+
     def handle(self, *args, **options):
+        if options.get('metrics_port'):
+            metrics.start_http_server(options['metrics_port'])
         self.stdout.write(self.style.SUCCESS('Starting RabbitMQ consumer...'))
         
         while True:
@@ -31,20 +44,27 @@ class Command(BaseCommand):
         
         # Define the callback function
         def callback(ch, method, properties, body):
+            started = time.perf_counter()
             try:
                 # Parse the message
                 message = json.loads(body)
                 self.stdout.write(self.style.SUCCESS(f'Received message: {message}'))
                 
                 # Process the message
-                self._process_message(message)
+                with consumer_profiler.profile(method.routing_key):
+                    self._process_message(message)
                 
                 # Acknowledge the message
                 ch.basic_ack(delivery_tag=method.delivery_tag)
+                metrics.consumer_messages.inc(queue=method.routing_key, outcome='ack')
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'Error processing message: {e}'))
                 # Reject the message and requeue it
                 ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                metrics.consumer_messages.inc(queue=method.routing_key, outcome='nack')
+            finally:
+                metrics.consumer_processing_duration.observe(
+                    time.perf_counter() - started, queue=method.routing_key)
         
         # Set up the consumer
         channel.basic_qos(prefetch_count=1)
@@ -80,6 +100,21 @@ class Command(BaseCommand):
                 media.encoded_path = encoded_path
                 media.status = MediaStatus.COMPLETED
                 media.save()
+                publish_media_status(video.id, media.id, media.status, encoded_path)
+
+                if media.asset_id:
+                    # Every media sharing the master file shares its encoding
+                    MediaAsset.objects.filter(content_hash=media.asset_id).update(encoded_path=encoded_path)
+                    siblings = AudioVideoMedia.objects.filter(asset_id=media.asset_id).exclude(
+                        status=MediaStatus.COMPLETED
+                    )
+                    waiting = list(siblings.values_list('id', 'video__id'))
+                    with transaction.atomic():
+                        set_media_status(siblings, MediaStatus.COMPLETED, encoded_path=encoded_path)
+                        touch_media_videos([media_id for media_id, _ in waiting])
+                    bump_versions(AudioVideoMedia)
+                    for media_id, sibling_video_id in waiting:
+                        publish_media_status(sibling_video_id, media_id, MediaStatus.COMPLETED, encoded_path)
                 
                 self.stdout.write(self.style.SUCCESS(f'Updated media status for video {video_id}'))
             else:
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from desafio_codeflix import metrics
+from desafio_codeflix.conversion import ConversionService
+
+
+class Command(BaseCommand):
+    help = 'Start the local conversion workers that encode PENDING media and publish videos.converted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.CONVERSION_WORKERS,
+                            help='Encoder processes on this node')
+        parser.add_argument('--max-pending', type=int, default=settings.CONVERSION_MAX_PENDING,
+                            help='Claimed media allowed to wait for a free worker')
+        parser.add_argument('--encoder', default=settings.CONVERSION_ENCODER,
+                            choices=['auto', 'ffmpeg', 'stub'])
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds between scans for PENDING media')
+        parser.add_argument('--metrics-port', type=int,
+                            help='Expose Prometheus metrics over HTTP on this port')
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            metrics.start_http_server(options['metrics_port'])
+
+        service = ConversionService(
+            workers=options['workers'],
+            max_pending=options['max_pending'],
+            encoder=options['encoder'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Starting {options['workers']} conversion workers with the {service.encoder_name} encoder..."
+        ))
+        try:
+            service.run_forever(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Waiting for running conversions to finish...'))
+        finally:
+            service.shutdown()
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from desafio_codeflix.sweeper import sweep_stale_media
+
+
+class Command(BaseCommand):
+    help = 'Re-enqueue or fail media stuck in PROCESSING or PENDING'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processing-timeout', type=int, default=3600,
+                            help='Seconds after which PROCESSING media is considered stuck')
+        parser.add_argument('--pending-timeout', type=int,
+                            help='Seconds after which PENDING media is failed (default: never)')
+        parser.add_argument('--max-attempts', type=int, default=3,
+                            help='Conversion attempts before stuck media is failed')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int,
+                            help='Batches per status and run (default: until no stale media is left)')
+        parser.add_argument('--interval', type=int,
+                            help='Keep running, sweeping every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            result = sweep_stale_media(
+                processing_timeout=timedelta(seconds=options['processing_timeout']),
+                pending_timeout=(
+                    timedelta(seconds=options['pending_timeout']) if options['pending_timeout'] else None
+                ),
+                max_attempts=options['max_attempts'],
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Requeued {result['requeued']} and failed {result['failed']} stale media"
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,230 @@
+import abc
+import logging
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric(abc.ABC):
+    """
+    Base class for metrics aggregated per thread.
+
+    Every thread writes into its own shard without taking a lock; shards are
+    only merged when the registry is scraped. Shards of finished threads are
+    folded into a base shard when the next thread registers or the next scrape
+    runs, so cumulative values never go backwards and the number of shards
+    follows the number of live threads.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._base = {}
+        self._shards_lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _prune(self):
+        # Finished threads no longer write to their shard; called with the lock held
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._base, shard)
+        self._shards = live
+
+    @abc.abstractmethod
+    def _merge(self, totals, shard):
+        """
+        Add the values of shard into totals.
+        """
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _snapshots(self):
+        with self._shards_lock:
+            self._prune()
+            shards = [shard for _, shard in self._shards]
+            base = self._base.copy()
+        # dict.copy() is atomic, so writers never have to wait for a scrape
+        return [base] + [shard.copy() for shard in shards]
+
+    def _labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = self._key(labels)
+        return sum(shard.get(key, 0) for shard in self._snapshots())
+
+    def _merge(self, totals, shard):
+        for key, value in list(shard.items()):
+            totals[key] = totals.get(key, 0) + value
+
+    def _samples(self):
+        totals = {}
+        for shard in self._snapshots():
+            self._merge(totals, shard)
+        return [f'{self.name}_total{self._labels(key)} {value}' for key, value in sorted(totals.items())]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # per-bucket counts, then +Inf count and sum
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        else:
+            state[len(self.buckets)] += 1
+        state[-1] += value
+
+    def count(self, **labels):
+        key = self._key(labels)
+        return sum(sum(shard[key][:-1]) for shard in self._snapshots() if key in shard)
+
+    def _merge(self, totals, shard):
+        # New lists, so snapshots of totals never see one being summed
+        for key, state in list(shard.items()):
+            merged = totals.get(key, [0] * (len(self.buckets) + 1) + [0.0])
+            totals[key] = [a + b for a, b in zip(merged, list(state))]
+
+    def _samples(self):
+        totals = {}
+        for shard in self._snapshots():
+            self._merge(totals, shard)
+        lines = []
+        for key, state in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(float(bound))
+                lines.append(f'{self.name}_bucket{self._labels(key, ("le", le))} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(key)} {state[-1]}')
+            lines.append(f'{self.name}_count{self._labels(key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self):
+        """
+        Render every registered metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# API
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Request latency by route.', ['method', 'route', 'status'])
+http_request_queries = Histogram(
+    'http_request_queries', 'Database queries per sampled request.', ['route'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200))
+http_query_budget_exceeded = Counter(
+    'http_query_budget_exceeded', 'Sampled requests that issued more queries than API_QUERY_BUDGET.', ['route'])
+cache_requests = Counter(
+    'cache_requests', 'Response cache lookups by result (hit, stale, coalesced, refresh or miss).', ['cache', 'result'])
+
+# Publisher
+publish_duration = Histogram(
+    'rabbitmq_publish_duration_seconds', 'Time spent in publish_event.', ['queue'])
+publish_failures = Counter(
+    'rabbitmq_publish_failures', 'Messages that publish_event failed to publish.', ['queue'])
+
+# Consumer
+consumer_messages = Counter(
+    'consumer_messages', 'Messages handled by startconsumer by outcome (ack or nack).', ['queue', 'outcome'])
+consumer_processing_duration = Histogram(
+    'consumer_processing_duration_seconds', 'Time spent processing one message.', ['queue'])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, addr='0.0.0.0'):
+    """
+    Serve the registry on its own port from a daemon thread (for non-HTTP processes).
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on {addr}:{port}")
+    return server
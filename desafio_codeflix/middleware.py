@@ -0,0 +1,180 @@
+import contextvars
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection
+from . import metrics
+from .compression import compress_response
+from .profiling import api_profiler
+
+logger = logging.getLogger(__name__)
+
+_current_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def current_timings():
+    """
+    Return the RequestTimings of the request being handled, or None when it is not sampled.
+    """
+    return _current_timings.get()
+
+
+class RequestTimings:
+    """
+    Timing figures collected for a single request.
+
+    Instances are installed as a database execute wrapper, so every query issued
+    while the request is handled is counted and timed.
+    """
+    __slots__ = ('started', 'queries', 'db', 'serializer', 'render', 'view_finished', '_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.render = 0.0
+        self.view_finished = None
+        self._depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def serializing(self):
+        """
+        Time a serializer operation. Nested operations are only counted once.
+        """
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self.serializer += time.perf_counter() - started
+
+    def mark_view_finished(self):
+        self.view_finished = time.perf_counter()
+
+    def mark_rendered(self, response):
+        if self.view_finished is not None:
+            self.render += time.perf_counter() - self.view_finished
+        return response
+
+    def header(self, total):
+        return ', '.join([
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"',
+            f'ser;dur={self.serializer * 1000:.2f}',
+            f'render;dur={self.render * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+
+class ServerTimingMiddleware:
+    """
+    Record query count, DB time, serializer time and render time per request.
+
+    The figures are sent back in a ``Server-Timing`` header and logged as one JSON
+    line. ``SERVER_TIMING_SAMPLE_RATE`` (0.0 - 1.0) controls the fraction of
+    requests that are instrumented; unsampled requests pay a single random() call.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 1.0)
+        if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        total = time.perf_counter() - timings.started
+        request.timings = timings
+
+        response['Server-Timing'] = timings.header(total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timings.queries,
+            'db_ms': round(timings.db * 1000, 2),
+            'serializer_ms': round(timings.serializer * 1000, 2),
+            'render_ms': round(timings.render * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }))
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests matching the active profiling session (see desafio_codeflix.profiling).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with api_profiler.profile(request.path):
+            return self.get_response(request)
+
+
+class MetricsMiddleware:
+    """
+    Record request latency by route, and the query count of requests sampled by
+    ServerTimingMiddleware (which must come after this middleware).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match is not None else 'unmatched'
+        metrics.http_request_duration.observe(
+            elapsed, method=request.method, route=route, status=response.status_code)
+
+        timings = getattr(request, 'timings', None)
+        if timings is not None:
+            metrics.http_request_queries.observe(timings.queries, route=route)
+            if timings.queries > getattr(settings, 'API_QUERY_BUDGET', 20):
+                metrics.http_query_budget_exceeded.inc(route=route)
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compress responses that are not encoded yet (uncached reads, writes,
+    batches) in the best coding the client accepts.
+
+    Responses from the API cache arrive already encoded from their stored
+    variants and pass through. Streaming responses and byte ranges are left
+    alone; exports compress their own stream.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding') or response.has_header('Content-Range'):
+            return response
+        return compress_response(response, request.META.get('HTTP_ACCEPT_ENCODING', ''))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:45
+
+import desafio_codeflix.models
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desafio_codeflix', '0004_audiovideomedia_video_video'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(max_length=255)),
+                ('total_size', models.BigIntegerField()),
+                ('chunk_size', models.IntegerField()),
+                ('received_size', models.BigIntegerField(default=0)),
+                ('chunk_checksums', models.TextField(blank=True, default='')),
+                ('status', models.CharField(choices=[('IN_PROGRESS', 'IN_PROGRESS'), ('COMPLETED', 'COMPLETED')], default=desafio_codeflix.models.UploadStatus['IN_PROGRESS'], max_length=11)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('media', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='desafio_codeflix.audiovideomedia')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='desafio_codeflix.video')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desafio_codeflix', '0006_mediaasset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiovideomedia',
+            name='priority',
+            field=models.SmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desafio_codeflix', '0007_audiovideomedia_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiovideomedia',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='audiovideomedia',
+            index=models.Index(fields=['status', 'updated_at'], name='media_status_updated_idx'),
+        ),
+    ]
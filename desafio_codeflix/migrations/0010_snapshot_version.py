@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:14
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desafio_codeflix', '0009_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.UUIDField(default=uuid.uuid4)),
+            ],
+        ),
+    ]
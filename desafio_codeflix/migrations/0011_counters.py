@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Video = apps.get_model('desafio_codeflix', 'Video')
+    for name in ('categories', 'genres', 'cast_members'):
+        field = Video._meta.get_field(name)
+        target = field.m2m_reverse_field_name()
+        counts = (
+            field.remote_field.through.objects.filter(**{target: OuterRef('pk')})
+            .order_by().values(target).annotate(count=Count('pk')).values('count')
+        )
+        field.related_model.objects.update(videos_count=Coalesce(Subquery(counts), 0))
+
+    AudioVideoMedia = apps.get_model('desafio_codeflix', 'AudioVideoMedia')
+    MediaStatusCount = apps.get_model('desafio_codeflix', 'MediaStatusCount')
+    MediaStatusCount.objects.bulk_create([
+        MediaStatusCount(status=row['status'], count=row['count'])
+        for row in AudioVideoMedia.objects.order_by().values('status').annotate(count=Count('pk'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desafio_codeflix', '0010_snapshot_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaStatusCount',
+            fields=[
+                ('status', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='castmember',
+            name='videos_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='videos_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='videos_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
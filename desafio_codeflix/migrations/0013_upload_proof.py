@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desafio_codeflix', '0012_related_videos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaupload',
+            name='claimed_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='mediaupload',
+            name='proof_offset',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
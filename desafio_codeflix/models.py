@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 from enum import StrEnum
 
@@ -8,11 +9,33 @@ class MediaStatus(StrEnum):
     PROCESSING = "PROCESSING"
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
+class UploadStatus(StrEnum):
+    IN_PROGRESS = "IN_PROGRESS"
+    COMPLETED = "COMPLETED"
 class CastMemberType(StrEnum):
     DIRECTOR = "DIRECTOR"
     ACTOR = "ACTOR"
 
-class CastMember(models.Model):
+class VideoCounted(models.Model):
+    """
+    Row with a number of linked videos, maintained by counters.py with F()
+    updates. Saves of existing rows leave videos_count alone, so an instance
+    loaded before a link changed cannot write its stale count back.
+    """
+    videos_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'videos_count'
+            ]
+        super().save(*args, **kwargs)
+
+class CastMember(VideoCounted):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     type = models.CharField(
@@ -24,11 +47,15 @@ class CastMember(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Change feed keyset
+            models.Index(fields=['updated_at', 'id'], name='castmember_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
-class Category(models.Model):
+class Category(VideoCounted):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
@@ -39,11 +66,14 @@ class Category(models.Model):
     class Meta:
         ordering = ['name']
         verbose_name_plural = 'Categories'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='category_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
-class Genre(models.Model):
+class Genre(VideoCounted):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
@@ -53,6 +83,9 @@ class Genre(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='genre_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -65,18 +98,48 @@ class Rating(StrEnum):
     AGE_16 = "16"
     AGE_18 = "18"
 
+class MediaAsset(models.Model):
+    """
+    A master file stored once under its content hash and shared by every
+    AudioVideoMedia uploaded with the same bytes.
+
+    content_hash is the SHA-256 of the concatenated binary SHA-256 digests of the
+    file's upload chunks (MEDIA_UPLOAD_CHUNK_SIZE bytes each), so it is known as
+    soon as the last chunk is verified. ref_count is the number of media rows
+    pointing at the asset; the file is deleted when it drops to zero.
+    """
+    content_hash = models.CharField(max_length=64, primary_key=True)
+    file_path = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    encoded_path = models.CharField(max_length=255, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.content_hash
+
 class AudioVideoMedia(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     file_path = models.CharField(max_length=255)
+    asset = models.ForeignKey(MediaAsset, on_delete=models.PROTECT, null=True, blank=True, related_name='media')
     encoded_path = models.CharField(max_length=255, null=True, blank=True)
     status = models.CharField(
         max_length=10,
         choices=[(status.name, status.value) for status in MediaStatus],
         default=MediaStatus.PENDING
     )
+    priority = models.SmallIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Stale media scans and per-status counts
+            models.Index(fields=['status', 'updated_at'], name='media_status_updated_idx'),
+        ]
+
     def __str__(self):
         return f"Media {self.id} - {self.status}"
 
@@ -100,6 +163,98 @@ class Video(models.Model):
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='video_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+class MediaUpload(models.Model):
+    """
+    A chunked, resumable upload of a video's master file.
+
+    Chunks are written in order straight to a part file under MEDIA_ROOT;
+    received_size is the offset the next chunk must start at. When the client
+    claims the content hash of a stored asset, proof_offset is the server-chosen
+    chunk it must send to reuse that asset (see uploads.py).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='uploads')
+    file_name = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    received_size = models.BigIntegerField(default=0)
+    chunk_checksums = models.TextField(blank=True, default='')
+    claimed_hash = models.CharField(max_length=64, blank=True, default='')
+    proof_offset = models.BigIntegerField(null=True, blank=True)
+    status = models.CharField(
+        max_length=11,
+        choices=[(status.name, status.value) for status in UploadStatus],
+        default=UploadStatus.IN_PROGRESS
+    )
+    media = models.OneToOneField(AudioVideoMedia, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} - {self.received_size}/{self.total_size}"
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted catalog row, served by the change feed so downstream
+    copies learn about deletes. resource is the API basename ('video', 'genre', ...).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    resource = models.CharField(max_length=50)
+    object_id = models.UUIDField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'deleted_at', 'object_id'], name='tombstone_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} {self.object_id} deleted at {self.deleted_at}"
+
+class SnapshotVersion(models.Model):
+    """
+    Version of the in-process snapshot of a table (see snapshot.py). Every write
+    to the table replaces version in the writing transaction, so each process
+    learns that its copy is out of date. name is the model name ('category', ...).
+    """
+    name = models.CharField(primary_key=True, max_length=50)
+    version = models.UUIDField(default=uuid.uuid4)
+
+    def __str__(self):
+        return f"{self.name} snapshot {self.version}"
+
+class MediaStatusCount(models.Model):
+    """
+    Number of media in a status, maintained by counters.py so status counts do
+    not scan the media table.
+    """
+    status = models.CharField(primary_key=True, max_length=10)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.count} media {self.status}"
+
+class RelatedVideo(models.Model):
+    """
+    One of a video's nearest neighbours by shared genres, categories and cast,
+    computed offline by related.py; rank 0 is the most similar.
+    """
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='related_videos')
+    related = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'rank'], name='related_video_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.related_id} related to {self.video_id} ({self.score:.3f})"
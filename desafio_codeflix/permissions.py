@@ -0,0 +1,45 @@
+import jwt
+from rest_framework.permissions import BasePermission
+from .auth import decode_token
+
+
+def get_token_payload(request):
+    """
+    Decode the Bearer token of a request.
+
+    The payload is cached on the Django request, so permission checks and the
+    operations of a batch request decode the token only once.
+
+    Args:
+        request: The DRF or Django request.
+
+    Returns:
+        dict: Decoded token payload, or None if the request has no valid token.
+    """
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, 'token_payload'):
+        http_request.token_payload = _decode_bearer(http_request.META.get('HTTP_AUTHORIZATION', ''))
+    return http_request.token_payload
+
+
+def _decode_bearer(header):
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return decode_token(token)
+    except (jwt.InvalidTokenError, ValueError):
+        return None
+
+
+class IsAdminRole(BasePermission):
+    """
+    Allow access only to requests carrying a token with the realm 'admin' role.
+    """
+
+    def has_permission(self, request, view):
+        payload = get_token_payload(request)
+        if payload is None:
+            return False
+        roles = payload.get('realm_access', {}).get('roles', [])
+        return 'admin' in roles
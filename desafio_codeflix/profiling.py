@@ -0,0 +1,184 @@
+import cProfile
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTROL_FILE = 'control.json'
+TARGETS = ('api', 'consumer', 'all')
+
+
+def profiling_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def start_session(target='api', path_pattern='.*', max_requests=None, duration=None):
+    """
+    Start a profiling session picked up by every worker watching the profiling directory.
+
+    Args:
+        target (str): Which processes should profile: 'api', 'consumer' or 'all'.
+        path_pattern (str): Regular expression matched against the request path (API)
+            or the queue name (consumer).
+        max_requests (int): Number of matching requests each process profiles.
+        duration (float): Length of the profiling window in seconds.
+
+    Returns:
+        dict: The session written to the control file.
+
+    Raises:
+        ValueError: If the target or pattern is invalid, or neither a request count
+            nor a duration is given.
+    """
+    if target not in TARGETS:
+        raise ValueError(f"Invalid target '{target}'")
+    if not max_requests and not duration:
+        raise ValueError("Either max_requests or duration is required")
+    try:
+        re.compile(path_pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid path pattern: {e}")
+
+    session = {
+        'id': uuid.uuid4().hex[:12],
+        'target': target,
+        'path_pattern': path_pattern,
+        'max_requests': max_requests,
+        'until': time.time() + duration if duration else None,
+        'started_at': time.time(),
+    }
+    directory = profiling_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = directory / f'.{CONTROL_FILE}.{os.getpid()}'
+    tmp_path.write_text(json.dumps(session))
+    os.replace(tmp_path, directory / CONTROL_FILE)
+    return session
+
+
+def stop_session():
+    """
+    Stop the active profiling session, if any.
+    """
+    try:
+        (profiling_dir() / CONTROL_FILE).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def active_session():
+    try:
+        return json.loads((profiling_dir() / CONTROL_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def list_profiles():
+    directory = profiling_dir()
+    if not directory.is_dir():
+        return []
+    return sorted(
+        ({'name': p.name, 'size': p.stat().st_size, 'modified_at': p.stat().st_mtime}
+         for p in directory.glob('*.prof')),
+        key=lambda p: p['modified_at'],
+        reverse=True,
+    )
+
+
+def profile_path(name):
+    """
+    Resolve a profile file name inside the profiling directory, refusing anything else.
+    """
+    if not re.fullmatch(r'[\w.-]+\.prof', name):
+        return None
+    path = profiling_dir() / name
+    return path if path.is_file() else None
+
+
+class ProcessProfiler:
+    """
+    Per-process profiler driven by the shared control file.
+
+    The control file is polled at most once every ``PROFILING_CHECK_INTERVAL``
+    seconds, so idle workers only pay a clock read per request. A single request
+    is profiled at a time; concurrent matching requests run unprofiled.
+    """
+
+    def __init__(self, component):
+        self.component = component
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._session = None
+        self._pattern = None
+        self._profile = None
+        self._profiled = 0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + getattr(settings, 'PROFILING_CHECK_INTERVAL', 1.0)
+        session = active_session()
+        if session and session['target'] not in (self.component, 'all'):
+            session = None
+        if (session or {}).get('id') != (self._session or {}).get('id'):
+            self._session = session
+            self._pattern = re.compile(session['path_pattern']) if session else None
+            self._profile = cProfile.Profile() if session else None
+            self._profiled = 0
+
+    def _wants(self, label):
+        session = self._session
+        if session is None or not self._pattern.search(label):
+            return False
+        if session['until'] is not None and time.time() > session['until']:
+            return False
+        if session['max_requests'] is not None and self._profiled >= session['max_requests']:
+            return False
+        return True
+
+    @contextmanager
+    def profile(self, label):
+        """
+        Profile the enclosed block if the active session matches label.
+        """
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            yield
+            return
+        self._refresh()
+        if not self._wants(label) or not self._lock.acquire(blocking=False):
+            yield
+            return
+        profile = self._profile
+        session_id = self._session['id']
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                self._profiled += 1
+                self._dump(profile, session_id)
+        finally:
+            self._lock.release()
+
+    def _dump(self, profile, session_id):
+        directory = profiling_dir()
+        path = directory / f'{session_id}-{self.component}-{os.getpid()}.prof'
+        tmp_path = directory / f'.{path.name}.tmp'
+        try:
+            profile.dump_stats(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write profile {path}: {e}")
+
+
+api_profiler = ProcessProfiler('api')
+consumer_profiler = ProcessProfiler('consumer')
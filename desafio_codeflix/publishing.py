@@ -0,0 +1,257 @@
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from itertools import islice
+from pathlib import Path
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import HttpRequest, QueryDict
+from rest_framework.renderers import JSONRenderer
+from .compression import compressed_variants
+from .models import AudioVideoMedia, CastMember, Category, Genre, Video
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = {
+    CastMember: 'cast_members',
+    Category: 'categories',
+    Genre: 'genres',
+    Video: 'videos',
+}
+
+EXTENSIONS = {'gzip': '.gz', 'br': '.br'}
+
+
+def write_atomic(path, content):
+    """
+    Replace a file in one rename, so readers never see it half written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _remove(path):
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class SnapshotPublisher:
+    """
+    Write catalog reads as static JSON files for a web server to serve.
+
+    Under root, api/<resource>/pages/<n>.json holds the first pages of each
+    list (?current_page=n, page 1 being the plain list) and api/videos/<id>.json
+    every video detail, the same bytes the API sends. Each file has .gz (and
+    .br when brotli is installed) siblings for gzip_static-style serving. Files
+    are replaced by atomic renames and removed when their page or video is gone.
+
+    Args:
+        root: Directory to publish into (default: PUBLISHED_SNAPSHOTS_ROOT).
+        pages (int): List pages published per resource (default: PUBLISHED_SNAPSHOTS_PAGES).
+    """
+
+    def __init__(self, root=None, pages=None):
+        self.root = Path(root or settings.PUBLISHED_SNAPSHOTS_ROOT)
+        self.pages = pages or getattr(settings, 'PUBLISHED_SNAPSHOTS_PAGES', 5)
+
+    def publish_all(self, chunk_size=500, progress=None):
+        """
+        Publish every list and video detail, and remove the files of videos
+        that no longer exist.
+
+        Args:
+            chunk_size (int): Videos loaded per query.
+            progress (callable): Called as progress(videos published so far) after every chunk.
+
+        Returns:
+            dict: Number of list 'pages' and 'videos' published, and of stale pages
+            and videos 'removed'.
+        """
+        # Margin for file systems with coarse modification times
+        started = time.time() - 2
+        result = {'pages': 0, 'videos': 0, 'removed': 0}
+        for resource in RESOURCES.values():
+            pages, removed = self.publish_list(resource)
+            result['pages'] += pages
+            result['removed'] += removed
+        published, _ = self.publish_videos(chunk_size=chunk_size, progress=progress)
+        result['videos'] = published
+        # Every live video was just rewritten; older files belong to deleted ones
+        directory = self.root / 'api' / 'videos'
+        if directory.is_dir():
+            for path in directory.glob('*.json*'):
+                if path.stat().st_mtime < started and _remove(path) and path.suffix == '.json':
+                    result['removed'] += 1
+        return result
+
+    def publish_list(self, resource):
+        """
+        Returns:
+            tuple: (pages written, stale pages removed)
+        """
+        directory = self.root / 'api' / resource / 'pages'
+        last = self.pages
+        page = 1
+        while page <= last:
+            view = self._view(resource, 'list', {'current_page': page})
+            response = view._list(view.request)
+            meta = response.data['meta']
+            last = min(self.pages, max(1, math.ceil(meta['total'] / meta['per_page'])))
+            self._write(directory / f'{page}.json', self._render(view, response.data))
+            page += 1
+        removed = 0
+        if directory.is_dir():
+            for path in directory.glob('*.json*'):
+                if int(path.name.split('.')[0]) > last and _remove(path) and path.suffix == '.json':
+                    removed += 1
+        return last, removed
+
+    def publish_videos(self, pks=None, chunk_size=500, progress=None):
+        """
+        Publish the details of the given videos (all of them by default) and
+        remove those of the given ids that no longer exist.
+
+        Returns:
+            tuple: (details written, details removed)
+        """
+        view = self._view('videos', 'retrieve')
+        queryset = view._optimize_for(view.get_queryset(), view.get_serializer_class())
+        if pks is None:
+            ids = Video.objects.values_list('pk', flat=True).order_by().iterator(chunk_size=chunk_size)
+        else:
+            ids = iter(pks)
+        published = removed = 0
+        while chunk := list(islice(ids, chunk_size)):
+            found = set()
+            for video in queryset.filter(pk__in=chunk):
+                self._write(self._detail_path(video.pk), self._render(view, view.get_serializer(video).data))
+                found.add(video.pk)
+            for pk in set(chunk) - found:
+                removed += self._remove_detail(pk)
+            published += len(found)
+            if progress is not None:
+                progress(published)
+        return published, removed
+
+    def _detail_path(self, pk):
+        return self.root / 'api' / 'videos' / f'{pk}.json'
+
+    def _remove_detail(self, pk):
+        path = self._detail_path(pk)
+        found = _remove(path)
+        for extension in EXTENSIONS.values():
+            _remove(path.with_name(path.name + extension))
+        return int(found)
+
+    def _view(self, resource, action, params=None):
+        from .urls import router
+        viewset = next(viewset for prefix, viewset, _ in router.registry if prefix == resource)
+        http_request = HttpRequest()
+        http_request.method = 'GET'
+        http_request.GET = QueryDict(mutable=True)
+        http_request.GET.update(params or {})
+        http_request.META = {'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_ACCEPT': 'application/json'}
+        view = viewset(action_map={'get': action}, args=(), kwargs={}, format_kwarg=None)
+        view.request = view.initialize_request(http_request)
+        return view
+
+    def _render(self, view, data):
+        return JSONRenderer().render(data, 'application/json', view.get_renderer_context())
+
+    def _write(self, path, content):
+        variants = compressed_variants(content)
+        for encoding, extension in EXTENSIONS.items():
+            variant = path.with_name(path.name + extension)
+            if encoding in variants:
+                write_atomic(variant, variants[encoding])
+            else:
+                _remove(variant)
+        write_atomic(path, content)
+
+
+class IncrementalPublisher:
+    """
+    Republish what model writes change, when PUBLISHED_SNAPSHOTS_INCREMENTAL is on.
+
+    Changes are collected when their transaction commits and published
+    PUBLISHED_SNAPSHOTS_DELAY seconds later by a background thread, so a burst
+    of writes republishes each list and video once. Writes that skip model
+    signals (imports, bulk updates) are picked up by the next full
+    publishsnapshots run.
+    """
+
+    def __init__(self):
+        self._lists = set()
+        self._videos = set()
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'PUBLISHED_SNAPSHOTS_INCREMENTAL', False)
+
+    def changed(self, model, pks):
+        """
+        Queue the lists and details showing the given rows of model.
+        """
+        if not self.enabled:
+            return
+        if model is AudioVideoMedia:
+            # Media is nested in the video representation
+            model, pks = Video, Video.objects.filter(video__in=pks).values_list('pk', flat=True)
+        resource = RESOURCES.get(model)
+        if resource is None:
+            return
+        videos = set(pks) if model is Video else set()
+        transaction.on_commit(lambda: self._queue(resource, videos))
+
+    def _queue(self, resource, videos):
+        with self._lock:
+            self._lists.add(resource)
+            self._videos |= videos
+            if self._scheduled:
+                return
+            self._scheduled = True
+        delay = getattr(settings, 'PUBLISHED_SNAPSHOTS_DELAY', 1.0)
+        if delay:
+            timer = threading.Timer(delay, self._flush_in_thread)
+            timer.daemon = True
+            timer.start()
+        else:
+            self.flush()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        with self._lock:
+            lists, videos = self._lists, self._videos
+            self._lists, self._videos, self._scheduled = set(), set(), False
+        publisher = SnapshotPublisher()
+        try:
+            for resource in sorted(lists):
+                publisher.publish_list(resource)
+            publisher.publish_videos(videos)
+        except Exception:
+            logger.exception('Failed to publish catalog snapshots')
+
+
+incremental_publisher = IncrementalPublisher()
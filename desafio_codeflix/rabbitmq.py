@@ -1,6 +1,8 @@
 import pika
 import json
 import logging
+import time
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,7 @@ def publish_event(queue_name, message):
     Returns:
         bool: True if the message was published successfully, False otherwise.
     """
+    started = time.perf_counter()
     try:
         # Connect to RabbitMQ
         connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
@@ -40,4 +43,7 @@ def publish_event(queue_name, message):
         return True
     except Exception as e:
         logger.error(f"Failed to publish message to {queue_name}: {e}")
-        return False
\ No newline at end of file
+        metrics.publish_failures.inc(queue=queue_name)
+        return False
+    finally:
+        metrics.publish_duration.observe(time.perf_counter() - started, queue=queue_name)
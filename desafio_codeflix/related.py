@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.db import transaction
+from .cache import bump_versions
+from .models import RelatedVideo, Video
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+# Many-to-many fields of Video that make two videos similar
+RELATIONS = [Video.genres, Video.categories, Video.cast_members]
+
+
+class RelatedVideosUnavailable(Exception):
+    pass
+
+
+class RelatedVideosBuilder:
+    """
+    Compute the related videos of every video, or of some, into RelatedVideo.
+
+    Each video is a row of a sparse matrix with a column per genre, category and
+    cast member it is linked to, weighted by RELATED_VIDEOS_WEIGHTS and by how
+    rare the column is (idf), and normalized. Scores are the cosine similarities
+    of one block of rows against all of them, a sparse product densified one
+    block at a time, and the top k of every row are kept with argpartition. The
+    rows of each block are replaced in one transaction.
+
+    Needs numpy and scipy.
+
+    Args:
+        k (int): Related videos kept per video (default: RELATED_VIDEOS_K).
+        block_cells (int): Scores computed at once (default: RELATED_VIDEOS_BLOCK_CELLS).
+        progress (callable): Called as progress(videos done, videos to do) after every block.
+    """
+
+    def __init__(self, k=None, block_cells=None, progress=None):
+        if np is None:
+            raise RelatedVideosUnavailable('Related videos need numpy and scipy (pip install numpy scipy)')
+        self.k = k or getattr(settings, 'RELATED_VIDEOS_K', 20)
+        self.block_cells = block_cells or getattr(settings, 'RELATED_VIDEOS_BLOCK_CELLS', 2 ** 24)
+        self.progress = progress
+
+    def build(self, pks=None):
+        """
+        Recompute the related videos of the given videos (all by default).
+
+        With pks, the videos listing one of them are recomputed as well. Videos
+        that only now become similar to a changed one are picked up by the next
+        full build.
+
+        Returns:
+            dict: Number of 'videos' recomputed and related 'rows' written.
+        """
+        ids, matrix = self.feature_matrix()
+        position = {pk: i for i, pk in enumerate(ids)}
+        if pks is None:
+            targets = np.arange(len(ids))
+        else:
+            pks = set(pks) | set(RelatedVideo.objects.filter(related__in=pks).values_list('video_id', flat=True))
+            targets = np.array(sorted(position[pk] for pk in pks if pk in position), dtype=np.int64)
+
+        result = {'videos': 0, 'rows': 0}
+        transposed = matrix.T.tocsr()
+        block_size = max(1, self.block_cells // max(1, len(ids)))
+        for start in range(0, len(targets), block_size):
+            block = targets[start:start + block_size]
+            neighbours, scores = self.top_k(matrix[block] @ transposed, block)
+            rows = [
+                RelatedVideo(video_id=ids[row], related_id=ids[column], rank=rank, score=float(score))
+                for row, columns, values in zip(block, neighbours, scores)
+                for rank, (column, score) in enumerate(
+                    (column, score) for column, score in zip(columns, values) if score > 0
+                )
+            ]
+            with transaction.atomic():
+                RelatedVideo.objects.filter(video_id__in=[ids[row] for row in block]).delete()
+                RelatedVideo.objects.bulk_create(rows, batch_size=1000)
+            result['videos'] += len(block)
+            result['rows'] += len(rows)
+            if self.progress is not None:
+                self.progress(result['videos'], len(targets))
+        bump_versions(RelatedVideo)
+        return result
+
+    def feature_matrix(self):
+        """
+        Returns:
+            tuple: (video ids, CSR matrix with one L2-normalized row per video)
+        """
+        ids = list(Video.objects.order_by('pk').values_list('pk', flat=True))
+        position = {pk: i for i, pk in enumerate(ids)}
+        weights = getattr(settings, 'RELATED_VIDEOS_WEIGHTS', {})
+        rows, columns, column_weights = [], [], []
+        for relation in RELATIONS:
+            field = relation.field
+            targets = {}
+            links = relation.through.objects.order_by().values_list(
+                f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+            )
+            for video, target in links.iterator(chunk_size=10000):
+                if video not in position:
+                    # Linked to a video created after the ids were read
+                    continue
+                rows.append(position[video])
+                columns.append(len(column_weights) + targets.setdefault(target, len(targets)))
+            column_weights.extend([weights.get(field.name, 1.0)] * len(targets))
+
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+        # Columns shared by most videos say little about how alike two of them are
+        frequency = np.bincount(columns, minlength=len(column_weights))
+        idf = np.log((1 + len(ids)) / (1 + frequency)) + 1
+        values = (np.array(column_weights) * idf)[columns].astype(np.float32)
+        matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(ids), len(column_weights)))
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return ids, sparse.diags(1 / norms).dot(matrix).astype(np.float32).tocsr()
+
+    def top_k(self, similarities, block):
+        """
+        Columns and scores of the k highest scores of every row, highest first,
+        skipping each row's own video.
+
+        Args:
+            similarities: Sparse scores of the block's rows against every video.
+            block: Row index of every block row in the matrix.
+        """
+        scores = similarities.toarray()
+        scores[np.arange(len(block)), block] = -1
+        k = min(self.k, scores.shape[1] - 1)
+        if k <= 0:
+            return np.empty((len(block), 0), dtype=np.int64), np.empty((len(block), 0))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
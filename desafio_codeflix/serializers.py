@@ -1,6 +1,12 @@
+import re
+from django.conf import settings
 from rest_framework import serializers
-from .models import CastMember, CastMemberType, Category, Genre, Video, Rating, AudioVideoMedia, MediaStatus
+from .models import (
+    CastMember, CastMemberType, Category, Genre, Video, Rating, AudioVideoMedia, MediaStatus,
+    MediaUpload, UploadStatus
+)
 from .base import BaseSerializer
+from .snapshot import catalog_snapshot
 
 class CastMemberTypeField(serializers.ChoiceField):
     def __init__(self, **kwargs):
@@ -38,6 +44,17 @@ class MediaStatusField(serializers.ChoiceField):
     def to_representation(self, value):
         return str(super().to_representation(value))
 
+class UploadStatusField(serializers.ChoiceField):
+    def __init__(self, **kwargs):
+        choices = [(status.name, status.value) for status in UploadStatus]
+        super().__init__(choices=choices, **kwargs)
+
+    def to_internal_value(self, data):
+        return UploadStatus(super().to_internal_value(data))
+
+    def to_representation(self, value):
+        return str(super().to_representation(value))
+
 class CastMemberSerializer(BaseSerializer):
     type = CastMemberTypeField()
 
@@ -57,13 +74,15 @@ class GenreSerializer(BaseSerializer):
         model = Genre
         fields = ['id', 'name', 'is_active', 'categories', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        # Relations that ?include= replaces with the related objects
+        includable = {'categories': CategorySerializer}
 
 class AudioVideoMediaSerializer(BaseSerializer):
     status = MediaStatusField()
 
     class Meta:
         model = AudioVideoMedia
-        fields = ['id', 'file_path', 'encoded_path', 'status', 'created_at', 'updated_at']
+        fields = ['id', 'file_path', 'encoded_path', 'status', 'priority', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 class VideoSerializer(BaseSerializer):
@@ -78,6 +97,12 @@ class VideoSerializer(BaseSerializer):
             'video', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        includable = {
+            'categories': CategorySerializer,
+            'genres': GenreSerializer,
+            'cast_members': CastMemberSerializer,
+            'video': AudioVideoMediaSerializer,
+        }
 
 class CreateVideoSerializer(BaseSerializer):
     rating = RatingField()
@@ -109,14 +134,15 @@ class CreateVideoSerializer(BaseSerializer):
 
         video = Video.objects.create(**validated_data)
 
+        # Unknown ids are left out; the snapshot answers without a query when it can
         if categories_id:
-            video.categories.set(Category.objects.filter(id__in=categories_id))
+            video.categories.set(catalog_snapshot.existing_ids(Category, categories_id))
 
         if genres_id:
-            video.genres.set(Genre.objects.filter(id__in=genres_id))
+            video.genres.set(catalog_snapshot.existing_ids(Genre, genres_id))
 
         if cast_members_id:
-            video.cast_members.set(CastMember.objects.filter(id__in=cast_members_id))
+            video.cast_members.set(catalog_snapshot.existing_ids(CastMember, cast_members_id))
 
         return video
 
@@ -125,7 +151,7 @@ class UploadVideoMediaSerializer(BaseSerializer):
 
     class Meta:
         model = AudioVideoMedia
-        fields = ['file_path']
+        fields = ['file_path', 'priority']
 
     def create(self, validated_data):
         video_id = self.context.get('video_id')
@@ -145,3 +171,79 @@ class UploadVideoMediaSerializer(BaseSerializer):
         video.save()
 
         return media
+
+
+class StartMediaUploadSerializer(serializers.Serializer):
+    file_name = serializers.CharField(max_length=255)
+    total_size = serializers.IntegerField(min_value=1)
+    content_hash = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False)
+
+class MediaUploadSerializer(BaseSerializer):
+    status = UploadStatusField(read_only=True)
+
+    class Meta:
+        model = MediaUpload
+        fields = [
+            'id', 'file_name', 'total_size', 'chunk_size', 'received_size', 'proof_offset',
+            'status', 'media', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+class StartProfilingSerializer(serializers.Serializer):
+    target = serializers.ChoiceField(choices=['api', 'consumer', 'all'], default='api')
+    path_pattern = serializers.CharField(max_length=255, default='.*')
+    requests = serializers.IntegerField(min_value=1, required=False)
+    seconds = serializers.FloatField(min_value=1, max_value=3600, required=False)
+
+    def validate_path_pattern(self, value):
+        try:
+            re.compile(value)
+        except re.error as e:
+            raise serializers.ValidationError(f"Invalid regular expression: {e}")
+        return value
+
+    def validate(self, attrs):
+        if not attrs.get('requests') and not attrs.get('seconds'):
+            raise serializers.ValidationError("Either 'requests' or 'seconds' is required")
+        return attrs
+
+class BatchOperationSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
+    # Path of the resource, relative to /api/ (e.g. 'categories/<id>/')
+    resource = serializers.CharField(max_length=500)
+    body = serializers.JSONField(required=False)
+    params = serializers.DictField(required=False)
+
+class BatchRequestSerializer(serializers.Serializer):
+    operations = BatchOperationSerializer(many=True, allow_empty=False)
+    atomic = serializers.BooleanField(default=True)
+
+    def validate_operations(self, value):
+        limit = settings.BATCH_MAX_OPERATIONS
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} operations can be batched")
+        return value
+
+class VideoFilterSerializer(serializers.Serializer):
+    """
+    Optional query parameters narrowing the video list, export and facets.
+    """
+    rating = serializers.ChoiceField(choices=[rating.value for rating in Rating], required=False)
+    year_launched = serializers.IntegerField(required=False)
+    category = serializers.UUIDField(required=False)
+    genre = serializers.UUIDField(required=False)
+    cast_member = serializers.UUIDField(required=False)
+
+    LOOKUPS = {
+        'rating': 'rating',
+        'year_launched': 'year_launched',
+        'category': 'categories',
+        'genre': 'genres',
+        'cast_member': 'cast_members',
+    }
+
+    def filter(self, queryset):
+        for name, value in self.validated_data.items():
+            # One filter() per relation, so each one joins its own links
+            queryset = queryset.filter(**{self.LOOKUPS[name]: value})
+        return queryset
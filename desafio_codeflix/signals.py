@@ -0,0 +1,245 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .autocomplete import cast_member_autocomplete
+from .cache import bump_versions
+from .counters import COUNTED_RELATIONS, adjust_videos_count, counted_relation, move_media_status
+from .models import AudioVideoMedia, CastMember, Category, Genre, Tombstone, Video
+from .publishing import incremental_publisher
+from .snapshot import bump
+from .uploads import release_asset
+
+# Many-to-many fields whose changes show up in the representation of the owning model
+TRACKED_RELATIONS = [Video.categories, Video.genres, Video.cast_members, Genre.categories]
+
+
+def touch(model, pks):
+    """
+    Bump updated_at so the change feed picks the rows up.
+    """
+    now = timezone.now()
+    model.objects.filter(pk__in=pks).update(updated_at=now)
+    bump(model)
+    bump_versions(model)
+    incremental_publisher.changed(model, model.objects.filter(pk__in=pks).values_list('pk', flat=True))
+    return now
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=CastMember)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=CastMember)
+def expire_snapshot(sender, **kwargs):
+    """
+    Every worker reloads its snapshot of the table (see snapshot.py).
+    """
+    bump(sender)
+
+
+@receiver(post_delete, sender=AudioVideoMedia)
+def release_media_asset(sender, instance, **kwargs):
+    """
+    Keep MediaAsset.ref_count in step with the media rows sharing the asset.
+    """
+    if instance.asset_id:
+        release_asset(instance.asset_id)
+
+
+@receiver(post_save, sender=AudioVideoMedia)
+def touch_media_video(sender, instance, created, **kwargs):
+    """
+    Media is nested in the video representation.
+    """
+    if not created:
+        Video.objects.filter(video=instance).update(updated_at=timezone.now())
+
+
+def touch_media_videos(media_ids):
+    """
+    Touch the videos of media whose status was written with update(), which
+    sends no post_save.
+    """
+    return touch(Video, Video.objects.filter(video__in=media_ids).values('pk'))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=CastMember)
+@receiver(post_delete, sender=Video)
+def record_tombstone(sender, instance, **kwargs):
+    """
+    The tombstone tells change feed consumers about the delete, however the
+    row was deleted. Its resource is the API basename, the model name.
+    """
+    Tombstone.objects.create(resource=sender._meta.model_name, object_id=instance.pk)
+
+
+def touch_linked(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Touch the owner of a many-to-many field whose links changed.
+
+    Links removed by clear() are only known before they are deleted, so clears
+    touch on pre_clear.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        instance.updated_at = touch(type(instance), [instance.pk])
+    elif action == 'pre_clear':
+        field = next(field for field in TRACKED_RELATIONS if field.through is sender).field
+        touch(field.model, field.model.objects.filter(**{field.name: instance}).values('pk'))
+    elif pk_set:
+        touch(model, pk_set)
+
+
+for relation in TRACKED_RELATIONS:
+    m2m_changed.connect(touch_linked, sender=relation.through, dispatch_uid=f'touch_{relation.through.__name__}')
+
+
+def expire_cached_responses(sender, **kwargs):
+    """
+    Cached API responses are keyed by the versions of the models they show.
+    """
+    bump_versions(sender)
+
+
+def publish_changes(sender, instance, **kwargs):
+    """
+    Static snapshots (see publishing.py) show these rows.
+    """
+    incremental_publisher.changed(sender, [instance.pk])
+
+
+for model in (AudioVideoMedia, CastMember, Category, Genre, Video):
+    post_save.connect(publish_changes, sender=model, dispatch_uid=f'publish_{model.__name__}_saved')
+    post_delete.connect(publish_changes, sender=model, dispatch_uid=f'publish_{model.__name__}_deleted')
+    post_save.connect(expire_cached_responses, sender=model, dispatch_uid=f'expire_{model.__name__}_saved')
+    post_delete.connect(expire_cached_responses, sender=model, dispatch_uid=f'expire_{model.__name__}_deleted')
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=CastMember)
+def touch_before_unlink(sender, instance, **kwargs):
+    """
+    Deleting a row cascades to its links without m2m_changed, so touch the
+    owners that lose it first.
+    """
+    for relation in TRACKED_RELATIONS:
+        field = relation.field
+        if field.related_model is sender:
+            touch(field.model, field.model.objects.filter(**{field.name: instance}).values('pk'))
+
+
+@receiver(post_save, sender=CastMember)
+def index_cast_member(sender, instance, **kwargs):
+    """
+    Keep the autocomplete index of this process in step (see autocomplete.py).
+    """
+    if cast_member_autocomplete.active:
+        pk, name = instance.pk, instance.name
+        transaction.on_commit(lambda: cast_member_autocomplete.member_saved(pk, name))
+
+
+@receiver(post_delete, sender=CastMember)
+def unindex_cast_member(sender, instance, **kwargs):
+    if cast_member_autocomplete.active:
+        pk = instance.pk
+        transaction.on_commit(lambda: cast_member_autocomplete.member_deleted(pk))
+
+
+@receiver(m2m_changed, sender=Video.cast_members.through)
+def count_cast_member_videos(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Autocomplete ranks cast members by their number of videos.
+    """
+    if not cast_member_autocomplete.active or action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        pks = {instance.pk}
+    elif action == 'pre_clear':
+        pks = set(instance.cast_members.values_list('pk', flat=True))
+    else:
+        pks = set(pk_set or ())
+    transaction.on_commit(lambda: cast_member_autocomplete.counts_changed(pks))
+
+
+@receiver(pre_delete, sender=Video)
+def count_before_video_delete(sender, instance, **kwargs):
+    if cast_member_autocomplete.active:
+        pks = set(instance.cast_members.values_list('pk', flat=True))
+        transaction.on_commit(lambda: cast_member_autocomplete.counts_changed(pks))
+
+
+@receiver(pre_save, sender=AudioVideoMedia)
+def read_media_status(sender, instance, raw, **kwargs):
+    """
+    Read the stored status a save replaces, which the instance may not know.
+    """
+    if not instance._state.adding:
+        instance._stored_status = (
+            AudioVideoMedia.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=AudioVideoMedia)
+def count_media_status(sender, instance, created, **kwargs):
+    """
+    Keep the media status counters (see counters.py) in step.
+    """
+    move_media_status(None if created else instance.__dict__.pop('_stored_status', None), instance.status)
+
+
+@receiver(pre_delete, sender=AudioVideoMedia)
+def uncount_media(sender, instance, **kwargs):
+    status = AudioVideoMedia.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    if status is not None:
+        move_media_status(status, None)
+
+
+def count_links(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Keep videos_count (see counters.py) in step with the links added and removed.
+
+    remove() reports every id it was given, linked or not, so removed links are
+    counted on pre_remove and pre_clear, in the transaction that deletes them.
+    """
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    field = counted_relation(sender)
+    video, other = field.m2m_field_name(), field.m2m_reverse_field_name()
+    if action == 'post_add':
+        if reverse:
+            adjust_videos_count(type(instance), {instance.pk: len(pk_set)})
+        else:
+            adjust_videos_count(model, dict.fromkeys(pk_set, 1))
+    elif reverse:
+        links = sender.objects.filter(**{other: instance})
+        if action == 'pre_remove':
+            links = links.filter(**{f'{video}__in': pk_set})
+        adjust_videos_count(type(instance), {instance.pk: -links.count()})
+    else:
+        links = sender.objects.filter(**{video: instance})
+        if action == 'pre_remove':
+            links = links.filter(**{f'{other}__in': pk_set})
+        adjust_videos_count(model, dict.fromkeys(links.values_list(f'{other}_id', flat=True), -1))
+
+
+for relation in COUNTED_RELATIONS:
+    m2m_changed.connect(count_links, sender=relation.through, dispatch_uid=f'count_{relation.through.__name__}')
+
+
+@receiver(pre_delete, sender=Video)
+def uncount_video_links(sender, instance, **kwargs):
+    """
+    Deleting a video cascades to its links without m2m_changed.
+    """
+    for relation in COUNTED_RELATIONS:
+        field = relation.field
+        linked = relation.through.objects.filter(**{field.m2m_field_name(): instance})
+        adjust_videos_count(field.related_model, dict.fromkeys(
+            linked.values_list(f'{field.m2m_reverse_field_name()}_id', flat=True), -1
+        ))
@@ -0,0 +1,223 @@
+import logging
+import threading
+import time
+import uuid
+from types import MappingProxyType
+from django.conf import settings
+from django.db import connections, router, transaction
+from rest_framework.relations import PKOnlyObject
+from .models import CastMember, Category, Genre, SnapshotVersion
+
+logger = logging.getLogger(__name__)
+
+# Small, read-mostly tables kept in memory by every worker
+SNAPSHOT_MODELS = (CastMember, Category, Genre)
+
+
+class Record:
+    """
+    Read-only row of a snapshot.
+
+    Subclasses are built per model by record_class() with one slot per concrete
+    field and one per many-to-many field (holding the related ids), so rows carry
+    no instance __dict__. The many-to-many attributes return pk-only objects,
+    which is what the serializers' pk list fields read.
+    """
+    __slots__ = ()
+    model = None
+    fields = ()
+    many = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    @property
+    def pk(self):
+        return getattr(self, self.model._meta.pk.attname)
+
+    def related_ids(self, name):
+        return getattr(self, f'_{name}_ids')
+
+    def to_instance(self):
+        """
+        The row as a model instance, as if it had been loaded from the database.
+        """
+        return self.model.from_db(
+            router.db_for_read(self.model), list(self.fields), [getattr(self, name) for name in self.fields]
+        )
+
+
+def _many_property(name):
+    slot = f'_{name}_ids'
+    return property(lambda self: tuple(PKOnlyObject(pk) for pk in getattr(self, slot)))
+
+
+_record_classes = {}
+
+
+def record_class(model):
+    if model not in _record_classes:
+        fields = tuple(field.attname for field in model._meta.concrete_fields)
+        many = tuple(field.name for field in model._meta.many_to_many)
+        namespace = {
+            '__slots__': fields + tuple(f'_{name}_ids' for name in many),
+            'model': model,
+            'fields': fields,
+            'many': many,
+        }
+        namespace.update({name: _many_property(name) for name in many})
+        _record_classes[model] = type(f'{model.__name__}Record', (Record,), namespace)
+    return _record_classes[model]
+
+
+class TableSnapshot:
+    """
+    Immutable copy of one table at a version: rows in the model's default
+    ordering and the same rows by primary key.
+    """
+    __slots__ = ('model', 'version', 'rows', 'by_pk')
+
+    def __init__(self, model, version, rows):
+        self.model = model
+        self.version = version
+        self.rows = tuple(rows)
+        self.by_pk = MappingProxyType({row.pk: row for row in self.rows})
+
+
+class SnapshotStore:
+    """
+    Per-process snapshots of SNAPSHOT_MODELS.
+
+    A snapshot is used while its version matches the table's SnapshotVersion
+    row, which every write replaces in the writing transaction (see bump()).
+    That row is read at most once per CATALOG_SNAPSHOT_CHECK_INTERVAL seconds
+    per table, so writes made by other processes show up within that interval;
+    writes committed by this process expire the snapshot right away. A new
+    version is loaded whole and swapped in, readers never see a partial table.
+
+    Nothing is served from a snapshot inside a transaction, whose own
+    uncommitted writes the snapshot cannot contain.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        """
+        Returns:
+            TableSnapshot: The current snapshot of the model, or None when the
+                model has none or the database must be read instead.
+        """
+        if model not in SNAPSHOT_MODELS or not getattr(settings, 'CATALOG_SNAPSHOT_ENABLED', True):
+            return None
+        if connections[router.db_for_read(model)].in_atomic_block:
+            return None
+        table = self._tables.get(model)
+        now = time.monotonic()
+        interval = getattr(settings, 'CATALOG_SNAPSHOT_CHECK_INTERVAL', 1.0)
+        if table is not None and now - self._checked.get(model, float('-inf')) < interval:
+            return table
+        version = current_version(model)
+        self._checked[model] = now
+        if table is not None and table.version == version:
+            return table
+        with self._lock:
+            table = self._tables.get(model)
+            if table is None or table.version != version:
+                table = self._load(model, version)
+                self._tables[model] = table
+        return table
+
+    def expire(self, model):
+        # Compare versions on the next read
+        self._checked.pop(model, None)
+
+    def clear(self):
+        self._tables.clear()
+        self._checked.clear()
+
+    def _load(self, model, version):
+        started = time.perf_counter()
+        record = record_class(model)
+        related = {name: self._related_ids(model._meta.get_field(name)) for name in record.many}
+        pk_index = record.fields.index(model._meta.pk.attname)
+        rows = [
+            record(*values, *(tuple(related[name].get(values[pk_index], ())) for name in record.many))
+            for values in model.objects.values_list(*record.fields).iterator(chunk_size=5000)
+        ]
+        logger.info(
+            f"Loaded {len(rows)} {model._meta.verbose_name_plural} into the snapshot "
+            f"in {time.perf_counter() - started:.3f}s"
+        )
+        return TableSnapshot(model, version, rows)
+
+    def _related_ids(self, field):
+        # In the related model's ordering, like the serializers' pk lists
+        through = field.remote_field.through
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        ordering = [
+            f"-{target}__{name[1:]}" if name.startswith('-') else f'{target}__{name}'
+            for name in field.related_model._meta.ordering
+        ]
+        related = {}
+        for source_id, target_id in through.objects.order_by(*ordering).values_list(source, target):
+            related.setdefault(source_id, []).append(target_id)
+        return related
+
+    def rows(self, model):
+        table = self.get(model)
+        return None if table is None else table.rows
+
+    def existing_ids(self, model, ids):
+        """
+        The given ids that exist, in the given order. Ids missing from the
+        snapshot are looked up in the database, since rows created by another
+        process only reach it on the next version check.
+        """
+        table = self.get(model)
+        missing = ids if table is None else [pk for pk in ids if pk not in table.by_pk]
+        found = set(model.objects.filter(pk__in=missing).values_list('pk', flat=True)) if missing else set()
+        return [pk for pk in ids if pk in found or (table is not None and pk in table.by_pk)]
+
+    def related_ids(self, instance, name):
+        """
+        Ids of a many-to-many field of a model instance, or None when the
+        snapshot cannot answer (or the relation is already prefetched).
+        """
+        model = type(instance)
+        if name in getattr(instance, '_prefetched_objects_cache', {}):
+            return None
+        if model not in SNAPSHOT_MODELS or name not in record_class(model).many:
+            return None
+        table = self.get(model)
+        row = None if table is None else table.by_pk.get(instance.pk)
+        return None if row is None else row.related_ids(name)
+
+
+catalog_snapshot = SnapshotStore()
+
+
+def current_version(model):
+    return SnapshotVersion.objects.filter(name=model._meta.model_name).values_list('version', flat=True).first()
+
+
+def bump(*models):
+    """
+    Mark the snapshots of the given models as out of date, in the current
+    transaction so the new version is only seen together with the change.
+    """
+    for model in models:
+        if model not in SNAPSHOT_MODELS:
+            continue
+        name = model._meta.model_name
+        if not SnapshotVersion.objects.filter(name=name).update(version=uuid.uuid4()):
+            _, created = SnapshotVersion.objects.get_or_create(name=name)
+            if not created:
+                SnapshotVersion.objects.filter(name=name).update(version=uuid.uuid4())
+        transaction.on_commit(lambda model=model: catalog_snapshot.expire(model))
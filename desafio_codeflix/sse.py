@@ -0,0 +1,116 @@
+import asyncio
+import json
+import re
+import uuid
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .events import get_backend, video_channel
+from .models import Video
+
+EVENTS_PATH = re.compile(r'^/api/videos/(?P<video_id>[0-9a-fA-F-]{36})/events/$')
+
+
+def _media_state(video_id):
+    """
+    Current media state of a video, or None if the video does not exist.
+    """
+    row = Video.objects.filter(id=video_id).values('id', 'video__id', 'video__status', 'video__encoded_path').first()
+    if row is None:
+        return None
+    return {
+        'video_id': str(row['id']),
+        'media_id': str(row['video__id']) if row['video__id'] else None,
+        'status': row['video__status'],
+        'encoded_path': row['video__encoded_path'],
+    }
+
+
+def format_event(event, name='status'):
+    return f"event: {name}\ndata: {json.dumps(event)}\n\n".encode('utf-8')
+
+
+class MediaEventsApp:
+    """
+    ASGI app streaming media status transitions of a video as Server-Sent Events.
+
+    GET /api/videos/{id}/events/ sends the current state first and then every
+    transition published through desafio_codeflix.events. Each idle connection
+    only costs a subscription queue and a pending task, so a single async worker
+    can hold thousands of them. Every other request goes to the wrapped app.
+    """
+
+    def __init__(self, app, heartbeat=None):
+        self.app = app
+        self.heartbeat = heartbeat
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            match = EVENTS_PATH.match(scope['path'])
+            if match:
+                return await self.stream(scope, receive, send, match.group('video_id'))
+        return await self.app(scope, receive, send)
+
+    async def stream(self, scope, receive, send, video_id):
+        if scope['method'] != 'GET':
+            return await self._respond(send, 405, b'Method not allowed')
+        try:
+            video_id = uuid.UUID(video_id)
+        except ValueError:
+            return await self._respond(send, 404, b'Not found')
+
+        backend = get_backend()
+        # Subscribe before reading the state so no transition falls in between
+        subscription = backend.subscribe(video_channel(video_id))
+        try:
+            state = await sync_to_async(_media_state)(video_id)
+            if state is None:
+                return await self._respond(send, 404, b'Not found')
+
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': format_event(state), 'more_body': True})
+            await self._pump(subscription, receive, send)
+        finally:
+            subscription.close()
+
+    async def _pump(self, subscription, receive, send):
+        heartbeat = self.heartbeat or getattr(settings, 'MEDIA_EVENTS_HEARTBEAT', 15)
+        disconnect = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            while True:
+                event = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait({event, disconnect}, timeout=heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    event.cancel()
+                    return
+                if event in done:
+                    body = format_event(event.result())
+                else:
+                    event.cancel()
+                    # Comment line that keeps proxies from closing idle connections
+                    body = b': keep-alive\n\n'
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnect.cancel()
+
+    async def _wait_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    async def _respond(self, send, status, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain')],
+        })
+        await send({'type': 'http.response.body', 'body': body})
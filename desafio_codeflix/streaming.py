@@ -0,0 +1,186 @@
+import mimetypes
+import re
+from pathlib import Path
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.negotiation import BaseContentNegotiation
+
+BLOCK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Pick the first renderer whatever the Accept header says, so players sending
+    'Accept: video/*' get the file instead of a 406.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range 'Range' header.
+
+    Args:
+        header (str): The Range header value.
+        size (int): Size of the file in bytes.
+
+    Returns:
+        tuple: (start, end) with end inclusive, or None when the header should be
+            ignored (absent, malformed or asking for several ranges).
+
+    Raises:
+        RangeNotSatisfiable: If the range lies outside the file.
+    """
+    match = _RANGE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+class RangeFile:
+    """
+    Read-only view of a byte range of an open file.
+
+    The underlying file is positioned at the start of the range and fileno() is
+    exposed, so WSGI servers with a sendfile-capable wsgi.file_wrapper (gunicorn)
+    send the range with os.sendfile, bounded by Content-Length. Other servers
+    fall back to read(), which never crosses the end of the range.
+    """
+
+    def __init__(self, file, start, length):
+        self._file = file
+        self._remaining = length
+        self.name = file.name
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+def _offload_response(path):
+    """
+    Hand the file over to the front proxy if MEDIA_SENDFILE_BACKEND is configured.
+    """
+    backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', None)
+    if not backend:
+        return None
+    if backend == 'x-accel-redirect':
+        try:
+            relative = path.resolve().relative_to(Path(settings.MEDIA_ROOT).resolve())
+        except ValueError:
+            return None
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_LOCATION.rstrip('/') + '/' + relative.as_posix()
+    elif backend == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = str(path)
+    else:
+        raise ValueError(f"Unknown MEDIA_SENDFILE_BACKEND '{backend}'")
+    # The proxy fills in the body and the headers describing it
+    del response['Content-Type']
+    return response
+
+
+def serve_file(request, path):
+    """
+    Serve a file with ETag, conditional requests and single byte-range support.
+
+    Args:
+        request: The Django request.
+        path (Path): File to serve.
+
+    Returns:
+        HttpResponse: A 200, 206, 304 or 416 response.
+    """
+    stat = path.stat()
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = http_date(stat.st_mtime)
+
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    response = _offload_response(path)
+    if response is not None:
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and _if_range_matches(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+    start, end = byte_range if byte_range else (0, size - 1)
+    length = end - start + 1 if size else 0
+    file = open(path, 'rb')
+    if request.method == 'HEAD':
+        file.close()
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = FileResponse(RangeFile(file, start, length), content_type=content_type)
+        response.block_size = BLOCK_SIZE
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    return response
+
+
+def _if_range_matches(request, etag, mtime):
+    """
+    A Range is only honoured if If-Range, when present, still describes the file.
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
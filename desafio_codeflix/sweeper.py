@@ -0,0 +1,93 @@
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .cache import bump_versions
+from .counters import move_media_status
+from .events import publish_media_status
+from .models import AudioVideoMedia, MediaStatus
+from .signals import touch_media_videos
+
+logger = logging.getLogger(__name__)
+
+
+def _stale_batch(status, cutoff, batch_size):
+    # Range scan on media_status_updated_idx, oldest first
+    return list(
+        AudioVideoMedia.objects
+        .filter(status=status, updated_at__lt=cutoff)
+        .order_by('updated_at')
+        .values_list('id', 'attempts')[:batch_size]
+    )
+
+
+def sweep_stale_media(processing_timeout, pending_timeout=None, max_attempts=3,
+                      batch_size=500, max_batches=None):
+    """
+    Re-enqueue or fail media stuck in PROCESSING (and optionally PENDING).
+
+    Media that has been PROCESSING for longer than processing_timeout goes back
+    to PENDING for the conversion workers, unless it already used max_attempts,
+    in which case it is marked FAILED. Media left PENDING for longer than
+    pending_timeout is marked FAILED.
+
+    Each batch is selected through the (status, updated_at) index and updated in
+    its own short transaction, so the sweep never scans the table nor holds
+    locks for long.
+
+    Args:
+        processing_timeout (timedelta): Age after which PROCESSING media is stale.
+        pending_timeout (timedelta): Age after which PENDING media is failed; None keeps it.
+        max_attempts (int): Conversion attempts before media is failed.
+        batch_size (int): Rows selected and updated per transaction.
+        max_batches (int): Stop after this many batches per status; None sweeps everything.
+
+    Returns:
+        dict: Number of media 'requeued' and 'failed'.
+    """
+    now = timezone.now()
+    result = {'requeued': 0, 'failed': 0}
+
+    sweeps = [(MediaStatus.PROCESSING, now - processing_timeout)]
+    if pending_timeout is not None:
+        sweeps.append((MediaStatus.PENDING, now - pending_timeout))
+
+    for status, cutoff in sweeps:
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            batch = _stale_batch(status, cutoff, batch_size)
+            if not batch:
+                break
+            batches += 1
+            if status == MediaStatus.PENDING:
+                retry, fail = [], [media_id for media_id, _ in batch]
+            else:
+                retry = [media_id for media_id, attempts in batch if attempts < max_attempts]
+                fail = [media_id for media_id, attempts in batch if attempts >= max_attempts]
+
+            announcements = []
+            with transaction.atomic():
+                # Re-check the status so media that moved on meanwhile is left alone
+                stale = AudioVideoMedia.objects.filter(status=status, updated_at__lt=cutoff)
+                for ids, new_status, key in [(retry, MediaStatus.PENDING, 'requeued'),
+                                             (fail, MediaStatus.FAILED, 'failed')]:
+                    if not ids:
+                        continue
+                    swept = list(stale.filter(id__in=ids).values_list('id', 'video__id'))
+                    moved = stale.filter(id__in=[media_id for media_id, _ in swept]).update(
+                        status=new_status, updated_at=timezone.now()
+                    )
+                    move_media_status(status, new_status, moved)
+                    touch_media_videos([media_id for media_id, _ in swept])
+                    result[key] += moved
+                    announcements.extend((video_id, media_id, new_status) for media_id, video_id in swept)
+                if announcements:
+                    bump_versions(AudioVideoMedia)
+            for video_id, media_id, new_status in announcements:
+                publish_media_status(video_id, media_id, new_status)
+            if len(batch) < batch_size:
+                break
+
+    if result['requeued'] or result['failed']:
+        logger.info(f"Swept stale media: {result}")
+    return result
+
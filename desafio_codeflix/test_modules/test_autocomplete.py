@@ -0,0 +1,94 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..autocomplete import PrefixIndex, cast_member_autocomplete, fold
+from ..models import CastMember, CastMemberType, Video, Rating
+
+class PrefixIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = PrefixIndex.build([
+            (1, 'José Wilker', 3),
+            (2, 'Joseph Gordon-Levitt', 10),
+            (3, 'Fernanda Montenegro', 7),
+            (4, 'Wagner Moura', 7),
+        ], top_size=3, scan_limit=1)
+
+    def search(self, query, limit=10):
+        return [pk for pk, _, _ in self.index.search(query, limit)]
+
+    def test_fold(self):
+        self.assertEqual(fold('JOSÉ Çé'), 'jose ce')
+
+    def test_prefix_of_any_word_ranked_by_count(self):
+        self.assertEqual(self.search('jos'), [2, 1])
+        self.assertEqual(self.search('JOSE'), [2, 1])
+        self.assertEqual(self.search('José'), [2, 1])
+        self.assertEqual(self.search('levitt'), [2])
+        self.assertEqual(self.search('x'), [])
+        self.assertEqual(self.search('  '), [])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('jo wil'), [1])
+        self.assertEqual(self.search('w m'), [4])
+
+    def test_ties_ordered_by_name(self):
+        self.assertEqual(self.search('m'), [3, 4])
+
+    def test_cached_tops_follow_changes(self):
+        self.index.upsert(5, 'Joana Fomm', 1)
+        self.assertEqual(self.search('jo', 3), [2, 1, 5])
+        self.index.upsert(5, count=20)
+        self.assertEqual(self.search('jo', 3), [5, 2, 1])
+        self.index.upsert(5, count=0)
+        self.assertEqual(self.search('jo', 3), [2, 1, 5])
+        self.index.upsert(2, name='Selton Mello')
+        self.assertEqual(self.search('jo', 3), [1, 5])
+        self.assertEqual(self.search('selt'), [2])
+        self.index.remove(1)
+        self.assertEqual(self.search('jo', 3), [5])
+        self.assertEqual(len(self.index), 4)
+
+class AutocompleteEndpointTest(APITestCase):
+    def setUp(self):
+        self.addCleanup(cast_member_autocomplete.reset)
+        self.jose = CastMember.objects.create(name='José Wilker', type=CastMemberType.ACTOR)
+        self.joana = CastMember.objects.create(name='Joana Fomm', type=CastMemberType.ACTOR)
+        video = Video.objects.create(title='Video', year_launched=2020, rating=Rating.L, duration=90)
+        video.cast_members.add(self.joana)
+        cast_member_autocomplete.build()
+
+    def test_search(self):
+        response = self.client.get(reverse('castmember-autocomplete'), {'q': 'jo'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [
+            {'id': str(self.joana.id), 'name': 'Joana Fomm', 'videos_count': 1},
+            {'id': str(self.jose.id), 'name': 'José Wilker', 'videos_count': 0},
+        ])
+
+    def test_kept_in_step_by_signals(self):
+        video = Video.objects.create(title='Other', year_launched=2020, rating=Rating.L, duration=90)
+        with self.captureOnCommitCallbacks(execute=True):
+            video.cast_members.add(self.jose)
+            self.jose.videos.add(Video.objects.get(title='Video'))
+            CastMember.objects.create(name='Jonas Bloch', type=CastMemberType.ACTOR)
+            self.joana.delete()
+        results = cast_member_autocomplete.search('jo')
+        self.assertEqual([(name, count) for _, name, count in results], [('José Wilker', 2), ('Jonas Bloch', 0)])
+
+    def test_limit(self):
+        response = self.client.get(reverse('castmember-autocomplete'), {'q': 'jo', 'limit': 1})
+        self.assertEqual(len(response.data['data']), 1)
+        response = self.client.get(reverse('castmember-autocomplete'), {'q': 'jo', 'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class AutocompleteFallbackTest(TestCase):
+    @override_settings(AUTOCOMPLETE_ENABLED=False)
+    def test_database_until_built(self):
+        CastMember.objects.create(name='Wagner Moura', type=CastMemberType.ACTOR)
+        response = self.client.get(reverse('castmember-autocomplete'), {'q': 'moura'})
+        self.assertEqual([member['name'] for member in response.json()['data']], ['Wagner Moura'])
+        CastMember.objects.create(name='Marjorie Estiano', type=CastMemberType.ACTOR)
+        CastMember.objects.create(name='Jorge Mautner', type=CastMemberType.ACTOR)
+        response = self.client.get(reverse('castmember-autocomplete'), {'q': 'jor m'})
+        self.assertEqual([member['name'] for member in response.json()['data']], ['Jorge Mautner'])
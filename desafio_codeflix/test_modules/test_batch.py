@@ -0,0 +1,100 @@
+import threading
+from unittest import mock
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..models import Category, Genre
+from ..views import CategoryViewSet
+
+class BatchTest(APITestCase):
+    def setUp(self):
+        self.url = reverse('batch')
+
+    def batch(self, operations, **kwargs):
+        response = self.client.post(self.url, {'operations': operations, **kwargs}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_runs_operations_in_order(self):
+        category = Category.objects.create(name="Movies")
+        result = self.batch([
+            {'method': 'POST', 'resource': 'categories', 'body': {'name': 'Series'}},
+            {'method': 'PATCH', 'resource': f'categories/{category.id}', 'body': {'description': 'Films'}},
+            {'method': 'GET', 'resource': '/api/categories/', 'params': {'current_page': 1}},
+            {'method': 'DELETE', 'resource': f'categories/{category.id}/'},
+        ])
+
+        self.assertTrue(result['meta']['committed'])
+        statuses = [op['status'] for op in result['data']]
+        self.assertEqual(statuses, [201, 200, 200, 204])
+        self.assertEqual(result['data'][1]['body']['description'], 'Films')
+        self.assertEqual([c['name'] for c in result['data'][2]['body']['data']], ['Movies', 'Series'])
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['Series'])
+
+    def test_atomic_batch_rolls_back(self):
+        result = self.batch([
+            {'method': 'POST', 'resource': 'categories', 'body': {'name': 'Series'}},
+            {'method': 'POST', 'resource': 'genres', 'body': {'name': 'Drama', 'categories': ['missing']}},
+            {'method': 'POST', 'resource': 'categories', 'body': {'name': 'Movies'}},
+        ])
+
+        self.assertFalse(result['meta']['committed'])
+        self.assertEqual([op['status'] for op in result['data']], [201, 400, 424])
+        self.assertIn('categories', result['data'][1]['body'])
+        self.assertFalse(Category.objects.exists())
+
+    def test_per_operation_mode(self):
+        result = self.batch([
+            {'method': 'POST', 'resource': 'categories', 'body': {'name': 'Series'}},
+            {'method': 'POST', 'resource': 'genres', 'body': {'name': 'Drama', 'categories': ['missing']}},
+            {'method': 'POST', 'resource': 'categories', 'body': {'name': 'Movies'}},
+        ], atomic=False)
+
+        self.assertFalse(result['meta']['committed'])
+        self.assertEqual([op['status'] for op in result['data']], [201, 400, 201])
+        self.assertEqual(Category.objects.count(), 2)
+        self.assertFalse(Genre.objects.exists())
+
+    def test_unknown_and_nested(self):
+        result = self.batch([
+            {'method': 'GET', 'resource': 'nothing-here'},
+            {'method': 'POST', 'resource': 'batch', 'body': {'operations': []}},
+        ], atomic=False)
+        self.assertEqual([op['status'] for op in result['data']], [404, 400])
+
+    def test_decodes_token_once(self):
+        payload = {'realm_access': {'roles': ['admin']}}
+        with override_settings(PROFILING_ENABLED=True), \
+                mock.patch('desafio_codeflix.permissions.decode_token', return_value=payload) as decode:
+            response = self.client.post(self.url, {'operations': [
+                {'method': 'GET', 'resource': 'profiling'} for _ in range(3)
+            ]}, format='json', HTTP_AUTHORIZATION='Bearer token')
+        self.assertEqual([op['status'] for op in response.data['data']], [200, 200, 200])
+        decode.assert_called_once_with('token')
+
+    @override_settings(BATCH_MAX_OPERATIONS=2)
+    def test_limit(self):
+        response = self.client.post(self.url, {'operations': [
+            {'method': 'GET', 'resource': 'categories'} for _ in range(3)
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class ConcurrentBatchReadsTest(TransactionTestCase):
+    async def test_reads_run_concurrently_under_asgi(self):
+        category = await Category.objects.acreate(name="Movies")
+        threads = set()
+        retrieve = CategoryViewSet.retrieve
+
+        def record_thread(viewset, *args, **kwargs):
+            threads.add(threading.get_ident())
+            return retrieve(viewset, *args, **kwargs)
+
+        operations = [{'method': 'GET', 'resource': f'categories/{category.id}'} for _ in range(4)]
+        with mock.patch.object(CategoryViewSet, 'retrieve', record_thread):
+            response = await self.async_client.post(
+                reverse('batch'), {'operations': operations, 'atomic': False}, content_type='application/json'
+            )
+
+        self.assertEqual([op['status'] for op in response.json()['data']], [200] * 4)
+        self.assertGreater(len(threads), 1)
@@ -0,0 +1,63 @@
+import uuid
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..models import CastMember, CastMemberType, Category, Genre, Video, Rating, AudioVideoMedia
+
+class BatchGetTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Movies")
+        self.genre = Genre.objects.create(name="Action")
+        self.cast_member = CastMember.objects.create(name="John Doe", type=CastMemberType.ACTOR)
+        self.videos = []
+        for i in range(4):
+            video = Video.objects.create(
+                title=f"Video {i}", year_launched=2020, rating=Rating.L, duration=90,
+                video=AudioVideoMedia.objects.create(file_path=f'/{i}.mp4'),
+            )
+            video.categories.add(self.category)
+            video.genres.add(self.genre)
+            video.cast_members.add(self.cast_member)
+            self.videos.append(video)
+
+    def test_preserves_order_and_reports_missing(self):
+        missing = uuid.uuid4()
+        ids = [self.videos[2].id, missing, self.videos[0].id, self.videos[2].id]
+
+        response = self.client.get(reverse('video-list'), {'ids': ','.join(str(i) for i in ids)})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([v['id'] for v in response.data['data']], [str(self.videos[2].id), str(self.videos[0].id)])
+        self.assertEqual(response.data['meta'], {'missing': [str(missing)]})
+        detail = self.client.get(reverse('video-detail', kwargs={'pk': self.videos[2].id})).data
+        self.assertEqual(response.data['data'][0], detail)
+
+    def test_post(self):
+        ids = [str(video.id) for video in reversed(self.videos)]
+        # One query for the videos and their media, one per many-to-many field
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('video-batch-get'), {'ids': ids}, format='json')
+        self.assertEqual([v['id'] for v in response.data['data']], ids)
+        self.assertEqual(response.data['data'][0]['genres'], [self.genre.id])
+
+    def test_with_include(self):
+        response = self.client.post(reverse('video-batch-get') + '?include=genres',
+                                    {'ids': [str(self.videos[0].id)]}, format='json')
+        self.assertEqual(response.data['data'][0]['genres'][0]['name'], 'Action')
+
+    def test_other_resources(self):
+        response = self.client.get(reverse('castmember-list'), {'ids': str(self.cast_member.id)})
+        self.assertEqual(response.data['data'][0]['name'], 'John Doe')
+
+    def test_invalid_ids(self):
+        response = self.client.get(reverse('category-list'), {'ids': 'not-a-uuid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('category-batch-get'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BATCH_GET_MAX_IDS=2)
+    def test_limit(self):
+        ids = ','.join(str(video.id) for video in self.videos)
+        response = self.client.get(reverse('video-list'), {'ids': ids})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,121 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .. import metrics
+from ..cache import SingleFlightCache
+from ..models import AudioVideoMedia, Category, MediaStatus, Video, Rating
+from ..sweeper import sweep_stale_media
+
+class SingleFlightCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.cache = SingleFlightCache('test')
+        self.calls = 0
+
+    def compute(self, value='fresh', delay=0.0):
+        def run():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return run
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        start = threading.Barrier(8)
+
+        def request():
+            start.wait()
+            results.append(self.cache.get_or_compute('key', self.compute(delay=0.2), ttl=30))
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['fresh'] * 8)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(metrics.cache_requests.value(cache='test', result='coalesced'), 7)
+
+    def test_waits_for_another_process(self):
+        # Another process holds the key's lock and stores the value shortly
+        cache.add('key:lock', 1, 10)
+        threading.Timer(0.1, lambda: cache.set('key', ('theirs', 0.1, time.time() + 30), 60)).start()
+        self.assertEqual(self.cache.get_or_compute('key', self.compute(), ttl=30), 'theirs')
+        self.assertEqual(self.calls, 0)
+
+    @override_settings(API_CACHE_LOCK_TIMEOUT=0.1)
+    def test_computes_when_the_other_process_never_answers(self):
+        cache.add('key:lock', 1, 10)
+        self.assertEqual(self.cache.get_or_compute('key', self.compute(), ttl=30), 'fresh')
+
+    def test_expired_entry_is_served_stale_during_refresh(self):
+        cache.set('key', ('old', 0.01, time.time() - 1), 60)
+        cache.add('key:lock', 1, 10)
+        self.assertEqual(self.cache.get_or_compute('key', self.compute(), ttl=30), 'old')
+        self.assertEqual(self.calls, 0)
+        cache.delete('key:lock')
+        self.assertEqual(self.cache.get_or_compute('key', self.compute(), ttl=30), 'fresh')
+        self.assertEqual(self.cache.get_or_compute('key', self.compute('newer'), ttl=30), 'fresh')
+
+    @mock.patch('desafio_codeflix.cache.random.random', return_value=0.5)
+    def test_early_refresh(self, random):
+        # Expires in 5s but took 10s to compute: refreshed before it expires
+        cache.set('key', ('old', 10.0, time.time() + 5), 60)
+        self.assertEqual(self.cache.get_or_compute('key', self.compute(), ttl=30), 'fresh')
+        cache.set('key', ('old', 0.001, time.time() + 5), 60)
+        self.assertEqual(self.cache.get_or_compute('key', self.compute(), ttl=30), 'old')
+
+class ResponseCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Movies')
+        self.media = AudioVideoMedia.objects.create(file_path='/video.mp4')
+        self.video = Video.objects.create(title='Video', year_launched=2020, rating=Rating.L, duration=90,
+                                          video=self.media)
+        self.url = reverse('video-detail', kwargs={'pk': self.video.id})
+
+    def test_detail_served_from_cache_until_a_write(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], 'application/json')
+
+        self.client.patch(self.url, {'title': 'Renamed'}, format='json')
+        self.assertEqual(self.client.get(self.url).json()['title'], 'Renamed')
+
+        self.video.categories.add(self.category)
+        self.assertEqual(self.client.get(self.url).json()['categories'], [str(self.category.id)])
+
+    def test_bulk_updates_expire_dependents(self):
+        self.client.get(self.url)
+        AudioVideoMedia.objects.filter(pk=self.media.pk).update(
+            status=MediaStatus.PROCESSING, updated_at=timezone.now() - timedelta(hours=1))
+        sweep_stale_media(timedelta(minutes=5))
+        self.assertEqual(self.client.get(self.url).json()['video']['status'], MediaStatus.PENDING)
+
+    def test_list_and_includes_are_separate_entries(self):
+        plain = self.client.get(reverse('video-list')).json()
+        included = self.client.get(reverse('video-list'), {'include': 'video'}).json()
+        self.assertEqual(plain['data'][0]['video']['id'], str(self.media.id))
+        self.assertEqual(included['data'][0]['video']['file_path'], '/video.mp4')
+        Category.objects.create(name='Series')
+        self.assertEqual(self.client.get(reverse('category-list')).json()['meta']['total'], 2)
+
+    def test_bypassed_in_transactions(self):
+        self.client.get(self.url)
+        with transaction.atomic():
+            Video.objects.filter(pk=self.video.pk).update(title='Uncommitted')
+            self.assertEqual(self.client.get(self.url).json()['title'], 'Uncommitted')
+            transaction.set_rollback(True)
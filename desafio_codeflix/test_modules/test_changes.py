@@ -0,0 +1,173 @@
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..models import (
+    CastMember, CastMemberType, Category, Genre, Video, Rating, AudioVideoMedia, MediaStatus, Tombstone
+)
+from ..sweeper import sweep_stale_media
+
+class ChangeFeedTest(APITestCase):
+    def setUp(self):
+        override = override_settings(CHANGE_FEED_SAFETY_LAG=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.url = reverse('category-changes')
+
+    def read_feed(self, params):
+        changes = []
+        while True:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            changes.extend(response.data['data'])
+            params = {'cursor': response.data['meta']['cursor'], 'limit': params.get('limit')}
+            if not response.data['meta']['has_more']:
+                return changes, params['cursor']
+
+    def test_pages_through_changes_in_order(self):
+        categories = [Category.objects.create(name=f"Category {i}") for i in range(5)]
+
+        changes, cursor = self.read_feed({'limit': 2})
+
+        self.assertEqual([change['id'] for change in changes], [str(category.id) for category in categories])
+        self.assertEqual(changes[0]['type'], 'updated')
+        self.assertEqual(changes[0]['data']['name'], 'Category 0')
+
+        # Nothing new: the cursor stays where it was
+        response = self.client.get(self.url, {'cursor': cursor})
+        self.assertEqual(response.data['data'], [])
+        self.assertEqual(response.data['meta']['cursor'], cursor)
+
+        categories[1].name = 'Renamed'
+        categories[1].save()
+        response = self.client.get(self.url, {'cursor': cursor})
+        self.assertEqual([change['data']['name'] for change in response.data['data']], ['Renamed'])
+
+    def test_updated_since(self):
+        old = Category.objects.create(name="Old")
+        Category.objects.filter(id=old.id).update(updated_at=timezone.now() - timedelta(days=2))
+        recent = Category.objects.create(name="Recent")
+
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        changes, _ = self.read_feed({'updated_since': since})
+
+        self.assertEqual([change['id'] for change in changes], [str(recent.id)])
+
+    def test_deletes_are_tombstoned(self):
+        category = Category.objects.create(name="Movies")
+        _, cursor = self.read_feed({})
+
+        response = self.client.delete(reverse('category-detail', kwargs={'pk': category.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        changes, _ = self.read_feed({'cursor': cursor})
+        self.assertEqual(changes, [{
+            'type': 'deleted', 'id': str(category.id),
+            'changed_at': Tombstone.objects.get().deleted_at.isoformat(),
+        }])
+
+    def test_deletes_outside_the_api_are_tombstoned(self):
+        category = Category.objects.create(name="Movies")
+        video = Video.objects.create(title="Video", year_launched=2020, rating=Rating.L, duration=90)
+        category_id, video_id = category.pk, video.pk
+        _, cursor = self.read_feed({})
+
+        category.delete()
+        Video.objects.filter(pk=video_id).delete()
+
+        changes, _ = self.read_feed({'cursor': cursor})
+        self.assertEqual([(change['type'], change['id']) for change in changes], [('deleted', str(category_id))])
+        self.assertTrue(Tombstone.objects.filter(resource='video', object_id=video_id).exists())
+
+    def test_held_back_changes(self):
+        Category.objects.create(name="Movies")
+        with override_settings(CHANGE_FEED_SAFETY_LAG=60):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['data'], [])
+
+    def test_batched_representation(self):
+        genre = Genre.objects.create(name="Action")
+        for i in range(10):
+            video = Video.objects.create(title=f"Video {i}", year_launched=2020, rating=Rating.L, duration=90)
+            video.genres.add(genre)
+
+        # Rows, tombstones, and one query per many-to-many field
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('video-changes'))
+        self.assertEqual(len(response.data['data']), 10)
+        self.assertEqual(response.data['data'][0]['data']['genres'], [str(genre.id)])
+
+    def test_invalid_parameters(self):
+        for params in [{'cursor': 'garbage'}, {'updated_since': 'yesterday'}, {'limit': 0}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class TouchOnLinkChangeTest(TestCase):
+    def setUp(self):
+        self.long_ago = timezone.now() - timedelta(days=1)
+        self.category = Category.objects.create(name="Movies")
+        self.genre = Genre.objects.create(name="Action")
+        self.cast_member = CastMember.objects.create(name="John Doe", type=CastMemberType.ACTOR)
+        self.video = Video.objects.create(title="Video", year_launched=2020, rating=Rating.L, duration=90)
+
+    def age(self, *objects):
+        for obj in objects:
+            type(obj).objects.filter(pk=obj.pk).update(updated_at=self.long_ago)
+
+    def assertTouched(self, obj):
+        obj.refresh_from_db()
+        self.assertGreater(obj.updated_at, self.long_ago)
+
+    def test_forward_changes(self):
+        self.age(self.video)
+        self.video.categories.add(self.category)
+        self.assertTouched(self.video)
+
+        self.age(self.video)
+        self.video.categories.clear()
+        self.assertTouched(self.video)
+
+    def test_reverse_changes(self):
+        self.age(self.video)
+        self.cast_member.videos.add(self.video)
+        self.assertTouched(self.video)
+
+        self.age(self.video)
+        self.cast_member.videos.clear()
+        self.assertTouched(self.video)
+
+    def test_deleting_linked_row(self):
+        self.genre.categories.add(self.category)
+        self.video.categories.add(self.category)
+        self.age(self.video, self.genre)
+
+        self.category.delete()
+
+        self.assertTouched(self.video)
+        self.assertTouched(self.genre)
+
+    def test_media_update(self):
+        media = AudioVideoMedia.objects.create(file_path='/master.mp4')
+        self.video.video = media
+        self.video.save()
+        self.age(self.video)
+
+        media.encoded_path = '/encoded.mp4'
+        media.save()
+
+        self.assertTouched(self.video)
+
+    def test_bulk_status_update(self):
+        media = AudioVideoMedia.objects.create(file_path='/master.mp4', status=MediaStatus.PROCESSING)
+        self.video.video = media
+        self.video.save()
+        AudioVideoMedia.objects.filter(pk=media.pk).update(updated_at=self.long_ago)
+        self.age(self.video)
+
+        sweep_stale_media(processing_timeout=timedelta(hours=1), max_attempts=0)
+
+        media.refresh_from_db()
+        self.assertEqual(media.status, MediaStatus.FAILED)
+        self.assertTouched(self.video)
@@ -0,0 +1,85 @@
+import gzip
+import json
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+from .. import compression
+from ..compression import compressed_variants, negotiate
+from ..models import Category
+
+class FakeBrotli:
+    @staticmethod
+    def compress(content, quality):
+        return b'br' + gzip.compress(content)
+
+class NegotiationTest(SimpleTestCase):
+    def test_negotiate(self):
+        self.assertEqual(negotiate('gzip, deflate, br', ('br', 'gzip')), 'br')
+        self.assertEqual(negotiate('gzip;q=1.0, br;q=0.5', ('br', 'gzip')), 'gzip')
+        self.assertEqual(negotiate('br;q=0, *', ('br', 'gzip')), 'gzip')
+        self.assertEqual(negotiate('GZIP', ('gzip',)), 'gzip')
+        self.assertIsNone(negotiate('deflate, identity', ('br', 'gzip')))
+        self.assertIsNone(negotiate('', ('gzip',)))
+        self.assertIsNone(negotiate('gzip;q=abc', ('gzip',)))
+
+    def test_variants(self):
+        body = json.dumps([{'name': f'Category {i}'} for i in range(100)]).encode()
+        self.assertEqual(gzip.decompress(compressed_variants(body)['gzip']), body)
+        self.assertEqual(compressed_variants(b'{}'), {})
+        with mock.patch.object(compression, 'brotli', FakeBrotli):
+            self.assertEqual(set(compressed_variants(body)), {'br', 'gzip'})
+
+class CachedCompressionTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        for i in range(10):
+            Category.objects.create(name=f'Category {i}', description='A category with a long description ' * 5)
+
+    def test_cached_variants_are_compressed_once(self):
+        url = reverse('category-list')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        with mock.patch.object(compression, 'compress', wraps=compression.compress) as compress:
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        compress.assert_not_called()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_brotli_when_installed(self):
+        with mock.patch.object(compression, 'brotli', FakeBrotli):
+            response = self.client.get(reverse('category-list'), HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            response = self.client.get(reverse('category-list'), HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_batch_bodies_stay_plain(self):
+        # Outside a transaction the operation is served from the API cache
+        response = self.client.post(reverse('batch'), {'atomic': False, 'operations': [
+            {'method': 'GET', 'resource': 'categories'},
+        ]}, format='json', HTTP_ACCEPT_ENCODING='gzip')
+        body = json.loads(gzip.decompress(response.content))
+        self.assertEqual(body['data'][0]['body']['meta']['total'], 10)
+
+class CompressionMiddlewareTest(APITestCase):
+    def test_uncached_responses(self):
+        response = self.client.post(reverse('category-list'), {'name': 'Movies', 'description': 'x' * 1000},
+                                    format='json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['name'], 'Movies')
+
+        response = self.client.get(reverse('category-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_small_and_streaming_responses(self):
+        response = self.client.post(reverse('category-list'), {'name': 'Movies'},
+                                    format='json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+        response = self.client.get(reverse('category-export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).count(b'\n'), 1)
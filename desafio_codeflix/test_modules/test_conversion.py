@@ -0,0 +1,124 @@
+import io
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from ..conversion import ConversionService, encode
+from ..management.commands.startconsumer import Command as ConsumerCommand
+from ..models import Video, Rating, AudioVideoMedia, MediaAsset, MediaStatus
+
+class ConversionServiceTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        # Deliver published events straight to the consumer
+        consumer = ConsumerCommand(stdout=io.StringIO())
+        self.published = []
+
+        def publish(queue_name, message):
+            self.published.append(message)
+            consumer._process_message(message)
+            return True
+
+        patcher = mock.patch('desafio_codeflix.conversion.publish_event', side_effect=publish)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_media(self, title, content=b'master', priority=0, **kwargs):
+        source = os.path.join(self.media_root, f'{title}.mov')
+        with open(source, 'wb') as f:
+            f.write(content)
+        media = AudioVideoMedia.objects.create(file_path=source, priority=priority, **kwargs)
+        Video.objects.create(title=title, year_launched=2021, rating=Rating.L, duration=60, video=media)
+        return media
+
+    def service(self, **kwargs):
+        service = ConversionService(encoder='stub', executor=ThreadPoolExecutor(max_workers=2), **kwargs)
+        self.addCleanup(service.shutdown)
+        return service
+
+    def test_converts_pending_media(self):
+        media = self.create_media('first', b'master bytes')
+
+        self.assertEqual(self.service().drain(), 1)
+
+        media.refresh_from_db()
+        self.assertEqual(media.status, MediaStatus.COMPLETED)
+        with open(media.encoded_path, 'rb') as f:
+            self.assertEqual(f.read(), b'master bytes')
+
+    def test_priority_and_backpressure(self):
+        low = self.create_media('low', priority=0)
+        high = self.create_media('high', priority=5)
+
+        service = self.service(workers=1, max_pending=0)
+        service.run_once()
+        low.refresh_from_db()
+        high.refresh_from_db()
+        self.assertEqual(high.status, MediaStatus.PROCESSING)
+        self.assertEqual(low.status, MediaStatus.PENDING)
+
+        service.drain()
+        low.refresh_from_db()
+        self.assertEqual(low.status, MediaStatus.COMPLETED)
+
+    def test_failed_encoding(self):
+        media = self.create_media('broken')
+        os.remove(media.file_path)
+
+        self.service().drain()
+
+        media.refresh_from_db()
+        self.assertEqual(media.status, MediaStatus.FAILED)
+        self.assertEqual(self.published, [])
+
+    def test_reuses_encoded_asset(self):
+        asset = MediaAsset.objects.create(
+            content_hash='a' * 64, file_path='/objects/a', size=6, ref_count=1, encoded_path='/encoded/a.mp4'
+        )
+        media = self.create_media('copy', asset=asset)
+
+        self.service().drain()
+
+        media.refresh_from_db()
+        self.assertEqual(media.status, MediaStatus.COMPLETED)
+        self.assertEqual(media.encoded_path, '/encoded/a.mp4')
+
+    def test_encodes_shared_asset_once(self):
+        source = os.path.join(self.media_root, 'shared.mov')
+        with open(source, 'wb') as f:
+            f.write(b'master')
+        asset = MediaAsset.objects.create(content_hash='b' * 64, file_path=source, size=6, ref_count=2)
+        first = self.create_media('first', asset=asset)
+        second = self.create_media('second', asset=asset)
+
+        with mock.patch('desafio_codeflix.conversion.encode', wraps=encode) as encoded:
+            service = self.service()
+            service.run_once()
+            second.refresh_from_db()
+            self.assertEqual(second.status, MediaStatus.PENDING)
+            service.drain()
+
+        self.assertEqual(encoded.call_count, 1)
+        for media in (first, second):
+            media.refresh_from_db()
+            self.assertEqual(media.status, MediaStatus.COMPLETED)
+        self.assertEqual(first.encoded_path, second.encoded_path)
+
+    def test_run_forever_survives_errors(self):
+        service = self.service()
+        passes = [OperationalError('connection lost'), None, KeyboardInterrupt()]
+        with mock.patch.object(service, 'run_once', side_effect=passes) as run_once, \
+                mock.patch('desafio_codeflix.conversion.time.sleep') as sleep, \
+                self.assertLogs('desafio_codeflix.conversion', 'ERROR'):
+            with self.assertRaises(KeyboardInterrupt):
+                service.run_forever(poll_interval=1, retry_delay=5)
+        self.assertEqual(run_once.call_count, 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [5, 1])
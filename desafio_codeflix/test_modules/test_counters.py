@@ -0,0 +1,117 @@
+import uuid
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..counters import media_status_counts, recount_videos, set_media_status
+from ..deletion import BulkDeleter
+from ..facets import video_facets
+from ..models import AudioVideoMedia, CastMember, CastMemberType, Category, Genre, MediaStatus, Rating, Video
+
+def counts(model):
+    return dict(model.objects.values_list('name', 'videos_count'))
+
+class VideosCountTest(TestCase):
+    def setUp(self):
+        self.drama = Category.objects.create(name='Drama')
+        self.comedy = Category.objects.create(name='Comedy')
+        self.videos = [
+            Video.objects.create(title=f'Video {i}', year_launched=2020, rating=Rating.L, duration=90)
+            for i in range(3)
+        ]
+
+    def test_links(self):
+        self.videos[0].categories.add(self.drama, self.comedy)
+        self.videos[0].categories.add(self.drama)
+        self.drama.videos.add(self.videos[1], self.videos[2])
+        self.assertEqual(counts(Category), {'Drama': 3, 'Comedy': 1})
+
+        self.videos[0].categories.remove(self.drama, self.drama)
+        self.drama.videos.remove(self.videos[0], self.videos[1])
+        self.assertEqual(counts(Category), {'Drama': 1, 'Comedy': 1})
+
+        self.videos[0].categories.set([self.drama])
+        self.assertEqual(counts(Category), {'Drama': 2, 'Comedy': 0})
+        self.drama.videos.clear()
+        self.assertEqual(counts(Category), {'Drama': 0, 'Comedy': 0})
+
+    def test_video_delete_and_bulk_delete(self):
+        for video in self.videos:
+            video.categories.add(self.drama)
+        self.videos[0].categories.add(self.comedy)
+        self.videos[0].delete()
+        self.assertEqual(counts(Category), {'Drama': 2, 'Comedy': 0})
+
+        BulkDeleter(Video, chunk_size=1).delete([self.videos[1].pk])
+        self.assertEqual(counts(Category), {'Drama': 1, 'Comedy': 0})
+
+    def test_saving_a_stale_instance_keeps_the_count(self):
+        stale = Category.objects.get(pk=self.drama.pk)
+        self.videos[0].categories.add(self.drama)
+        stale.name = 'Dramas'
+        stale.save()
+        self.assertEqual(counts(Category), {'Dramas': 1, 'Comedy': 0})
+
+    def test_recount(self):
+        self.videos[0].categories.add(self.drama)
+        Category.objects.update(videos_count=7)
+        Video.categories.through.objects.create(video=self.videos[1], category=self.comedy)
+        recount_videos(Category, [self.comedy.pk])
+        self.assertEqual(counts(Category), {'Drama': 7, 'Comedy': 1})
+        call_command('recountcounters', stdout=open('/dev/null', 'w'))
+        self.assertEqual(counts(Category), {'Drama': 1, 'Comedy': 1})
+
+class MediaStatusCountTest(TestCase):
+    def test_counters_follow_writes(self):
+        media = [AudioVideoMedia.objects.create(file_path=f'/{i}.mp4') for i in range(3)]
+        media[0].status = MediaStatus.PROCESSING
+        media[0].save()
+        media[0].save()
+        set_media_status(AudioVideoMedia.objects.exclude(pk=media[0].pk), MediaStatus.FAILED)
+        media[1].delete()
+        self.assertEqual(media_status_counts(), {'PENDING': 0, 'PROCESSING': 1, 'COMPLETED': 0, 'FAILED': 1})
+
+class FacetsTest(APITestCase):
+    def setUp(self):
+        self.drama = Category.objects.create(name='Drama')
+        self.action = Genre.objects.create(name='Action')
+        self.actor = CastMember.objects.create(name='Actor', type=CastMemberType.ACTOR)
+        for i, (year, rating) in enumerate([(2020, Rating.L), (2020, Rating.AGE_12), (2021, Rating.L)]):
+            video = Video.objects.create(title=f'Video {i}', year_launched=year, rating=rating, duration=90)
+            if i < 2:
+                video.categories.add(self.drama)
+            if i > 0:
+                video.genres.add(self.action)
+                video.cast_members.add(self.actor)
+
+    def test_facets(self):
+        response = self.client.get(reverse('video-facets'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, video_facets(Video.objects.all()))
+        self.assertEqual(response.data['meta'], {'total': 3})
+        self.assertEqual(response.data['data'], {
+            'rating': [{'value': Rating.L, 'count': 2}, {'value': Rating.AGE_12, 'count': 1}],
+            'year_launched': [{'value': 2020, 'count': 2}, {'value': 2021, 'count': 1}],
+            'categories': [{'id': str(self.drama.pk), 'count': 2}],
+            'genres': [{'id': str(self.action.pk), 'count': 2}],
+        })
+
+    def test_filtered_facets(self):
+        response = self.client.get(reverse('video-facets'), {'category': self.drama.pk, 'rating': Rating.L})
+        self.assertEqual(response.data['meta'], {'total': 1})
+        self.assertEqual(response.data['data']['genres'], [])
+        self.assertEqual(response.data['data']['categories'], [{'id': str(self.drama.pk), 'count': 1}])
+
+        response = self.client.get(reverse('video-facets'), {'cast_member': self.actor.pk, 'year_launched': 2020})
+        self.assertEqual(response.data['data']['rating'], [{'value': Rating.AGE_12, 'count': 1}])
+
+    def test_list_filters(self):
+        response = self.client.get(reverse('video-list'), {'genre': self.action.pk, 'year_launched': 2021})
+        self.assertEqual([video['title'] for video in response.data['data']], ['Video 2'])
+        response = self.client.get(reverse('video-list'), {'category': uuid.uuid4()})
+        self.assertEqual(response.data['data'], [])
+
+        response = self.client.get(reverse('video-facets'), {'rating': 'X', 'genre': 'not-a-uuid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'rating', 'genre'})
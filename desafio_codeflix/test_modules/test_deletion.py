@@ -0,0 +1,75 @@
+import io
+import uuid
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..deletion import BulkDeleter
+from ..models import Category, Genre, Video, Rating, Tombstone
+
+class BulkDeleterTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Movies")
+        self.genre = Genre.objects.create(name="Action")
+        self.genre.categories.add(self.category)
+        self.videos = []
+        for i in range(5):
+            video = Video.objects.create(title=f"Video {i}", year_launched=2020, rating=Rating.L, duration=90)
+            video.categories.add(self.category)
+            video.genres.add(self.genre)
+            self.videos.append(video)
+
+    def test_deletes_links_in_chunks(self):
+        calls = []
+        deleter = BulkDeleter(Category, chunk_size=2, progress=lambda *args: calls.append(args))
+
+        result = deleter.delete([self.category.pk])
+
+        self.assertEqual(result, {'deleted': 1, 'links': 6, 'missing': []})
+        self.assertFalse(Category.objects.filter(pk=self.category.pk).exists())
+        self.assertFalse(Video.categories.through.objects.exists())
+        self.assertFalse(Genre.categories.through.objects.exists())
+        # Video.categories takes three chunks, Genre.categories one
+        self.assertEqual([deleted for _, _, deleted in calls], [2, 4, 5, 1])
+        self.assertTrue(Tombstone.objects.filter(resource='category', object_id=self.category.pk).exists())
+
+    def test_touches_owners(self):
+        before = {video.pk: Video.objects.get(pk=video.pk).updated_at for video in self.videos}
+        BulkDeleter(Category, chunk_size=2).delete([self.category.pk])
+        for video in Video.objects.all():
+            self.assertGreater(video.updated_at, before[video.pk])
+        self.assertGreater(Genre.objects.get(pk=self.genre.pk).updated_at, self.genre.updated_at)
+
+    def test_own_relations_and_missing(self):
+        missing = uuid.uuid4()
+        result = BulkDeleter(Genre, chunk_size=10).delete([self.genre.pk, missing])
+        self.assertEqual(result, {'deleted': 1, 'links': 6, 'missing': [missing]})
+        self.assertTrue(Category.objects.filter(pk=self.category.pk).exists())
+        self.assertEqual(Video.categories.through.objects.count(), 5)
+
+class BulkDeleteEndpointTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Movies")
+        video = Video.objects.create(title="Video", year_launched=2020, rating=Rating.L, duration=90)
+        video.categories.add(self.category)
+
+    def test_bulk_delete(self):
+        missing = str(uuid.uuid4())
+        response = self.client.post(reverse('category-bulk-delete'),
+                                    {'ids': [str(self.category.id), missing]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'data': {'deleted': 1, 'links': 1}, 'meta': {'missing': [missing]}})
+        self.assertFalse(Category.objects.exists())
+
+    @override_settings(BULK_DELETE_MAX_IDS=1)
+    def test_limit(self):
+        response = self.client.post(reverse('category-bulk-delete'),
+                                    {'ids': [str(uuid.uuid4()), str(uuid.uuid4())]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('bulkdelete', 'categories', str(self.category.id), '--chunk-size', '1', stdout=out)
+        self.assertIn('Deleted 1 categories and 1 links', out.getvalue())
+        self.assertFalse(Category.objects.exists())
@@ -0,0 +1,75 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from ..events import LocalEventBackend, publish_media_status, get_backend
+from ..models import Video, Rating, AudioVideoMedia, MediaStatus
+from ..sse import MediaEventsApp
+
+class LocalEventBackendTest(TestCase):
+    async def test_fan_out(self):
+        backend = LocalEventBackend()
+        first = backend.subscribe('video:1')
+        second = backend.subscribe('video:1')
+        other = backend.subscribe('video:2')
+
+        backend.publish('video:1', {'status': 'COMPLETED'})
+
+        self.assertEqual(await asyncio.wait_for(first.get(), 1), {'status': 'COMPLETED'})
+        self.assertEqual(await asyncio.wait_for(second.get(), 1), {'status': 'COMPLETED'})
+        self.assertTrue(other.queue.empty())
+
+        first.close()
+        backend.publish('video:1', {'status': 'FAILED'})
+        await asyncio.sleep(0)
+        self.assertTrue(first.queue.empty())
+
+class MediaEventsAppTest(TestCase):
+    def setUp(self):
+        media = AudioVideoMedia.objects.create(file_path='/master.mp4', status=MediaStatus.PROCESSING)
+        self.video = Video.objects.create(
+            title="Test Video", year_launched=2021, rating=Rating.L, duration=120, video=media
+        )
+        self.media = media
+
+    async def fallback_app(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def request(self, path, until_events=1):
+        app = MediaEventsApp(self.fallback_app)
+        incoming = asyncio.Queue()
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+            events = [m for m in sent if m['type'] == 'http.response.body' and m['body'].startswith(b'event:')]
+            if len(events) >= until_events or not message.get('more_body', True):
+                await incoming.put({'type': 'http.disconnect'})
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path}
+        task = asyncio.ensure_future(app(scope, incoming.get, send))
+        return task, sent
+
+    async def test_streams_status_transitions(self):
+        task, sent = await self.request(f'/api/videos/{self.video.id}/events/', until_events=2)
+        while len(sent) < 2:
+            await asyncio.sleep(0.01)
+
+        await sync_to_async(publish_media_status)(self.video.id, self.media.id, MediaStatus.COMPLETED, '/enc.mp4')
+        await asyncio.wait_for(task, 1)
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertIn(b'"status": "PROCESSING"', sent[1]['body'])
+        self.assertIn(b'"status": "COMPLETED"', sent[2]['body'])
+        self.assertEqual(get_backend()._subscribers, {})
+
+    async def test_unknown_video(self):
+        task, sent = await self.request('/api/videos/00000000-0000-0000-0000-000000000000/events/')
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(sent[0]['status'], 404)
+
+    async def test_other_paths_pass_through(self):
+        task, sent = await self.request('/api/videos/')
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(sent[0]['status'], 204)
@@ -0,0 +1,77 @@
+import csv
+import gzip
+import io
+import json
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..models import CastMember, CastMemberType, Category, Genre, Video, Rating, AudioVideoMedia, MediaStatus
+
+class CatalogExportTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Movies")
+        self.genre = Genre.objects.create(name="Action")
+        self.genre.categories.add(self.category)
+        self.cast_member = CastMember.objects.create(name="John Doe", type=CastMemberType.ACTOR)
+        self.videos = []
+        for i in range(5):
+            video = Video.objects.create(
+                title=f"Video {i}", year_launched=2020 + i, rating=Rating.L, duration=90 + i
+            )
+            video.categories.add(self.category)
+            video.genres.add(self.genre)
+            self.videos.append(video)
+        self.videos[0].cast_members.add(self.cast_member)
+        self.videos[0].video = AudioVideoMedia.objects.create(file_path='/master.mp4', status=MediaStatus.COMPLETED)
+        self.videos[0].save()
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_matches_detail_representation(self):
+        response = self.client.get(reverse('video-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).decode().splitlines()]
+
+        self.assertEqual(len(rows), 5)
+        exported = {row['id']: row for row in rows}
+        for video in self.videos:
+            detail = self.client.get(reverse('video-detail', kwargs={'pk': video.id})).json()
+            self.assertEqual(exported[str(video.id)], detail)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_batches_many_to_many_lookups_per_chunk(self):
+        response = self.client.get(reverse('video-export'))
+        # One streamed query for the rows, then one per relation for each of the 3 chunks
+        with self.assertNumQueries(1 + 3 * 3):
+            rows = self.read(response).decode().splitlines()
+        self.assertEqual(len(rows), 5)
+
+    def test_csv(self):
+        response = self.client.get(reverse('genre-export'), {'output': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('genre.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self.read(response).decode())))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['name'], 'Action')
+        self.assertEqual(rows[0]['categories'], str(self.category.id))
+
+    def test_csv_flattens_nested_media(self):
+        response = self.client.get(reverse('video-export'), {'output': 'csv'})
+        rows = {row['title']: row for row in csv.DictReader(io.StringIO(self.read(response).decode()))}
+        self.assertEqual(rows['Video 0']['video.status'], 'COMPLETED')
+        self.assertEqual(rows['Video 1']['video.status'], '')
+
+    def test_gzip(self):
+        response = self.client.get(reverse('castmember-export'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        rows = gzip.decompress(self.read(response)).decode().splitlines()
+        self.assertEqual(json.loads(rows[0])['name'], 'John Doe')
+
+    def test_unsupported_output(self):
+        response = self.client.get(reverse('category-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,187 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from ..importer import CatalogImporter
+from ..models import CastMember, Category, Genre, Video
+
+class ImportCatalogTestMixin:
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w') as f:
+            if isinstance(content, list):
+                f.write(''.join(json.dumps(row) + '\n' for row in content))
+            else:
+                f.write(content)
+        return path
+
+class ImportCatalogTest(ImportCatalogTestMixin, TestCase):
+    def import_catalog(self, **files):
+        out, err = StringIO(), StringIO()
+        call_command('importcatalog', workers=0, stdout=out, stderr=err, **files)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_resources_with_references_by_name_and_id(self):
+        movies = Category.objects.create(name="Movies")
+        categories = self.write('categories.ndjson', [
+            {'name': 'Series', 'description': 'TV series'},
+        ])
+        cast_members = self.write('cast_members.csv', 'name,type\nJohn Doe,ACTOR\nJane Roe,DIRECTOR\n')
+        genres = self.write('genres.ndjson', [
+            {'name': 'Drama', 'categories': ['Series', str(movies.id)]},
+        ])
+        videos = self.write('videos.ndjson', [
+            {'title': 'Pilot', 'year_launched': 2020, 'rating': 'AGE_12', 'duration': 45,
+             'categories': ['Series'], 'genres': ['Drama'], 'cast_members': ['John Doe', 'Jane Roe']},
+        ])
+
+        out, err = self.import_catalog(categories=categories, cast_members=cast_members,
+                                       genres=genres, videos=videos)
+
+        self.assertIn('Imported 1 videos', out)
+        self.assertEqual(err, '')
+        drama = Genre.objects.get(name='Drama')
+        self.assertEqual(set(drama.categories.values_list('name', flat=True)), {'Movies', 'Series'})
+        video = Video.objects.get(title='Pilot')
+        self.assertEqual(video.rating, 'AGE_12')
+        self.assertFalse(video.opened)
+        self.assertEqual(set(video.cast_members.values_list('name', flat=True)), {'John Doe', 'Jane Roe'})
+        self.assertEqual(list(video.genres.all()), [drama])
+
+    def test_reimport_updates_by_natural_key(self):
+        path = self.write('categories.ndjson', [{'name': 'Movies', 'description': 'old'}])
+        self.import_catalog(categories=path)
+        first = Category.objects.get()
+
+        path = self.write('categories.ndjson', [{'name': 'Movies', 'description': 'new'}])
+        self.import_catalog(categories=path)
+
+        category = Category.objects.get()
+        self.assertEqual(category.id, first.id)
+        self.assertEqual(category.description, 'new')
+        self.assertEqual(category.created_at, first.created_at)
+
+    def test_replaces_many_to_many_links(self):
+        action = Genre.objects.create(name="Action")
+        drama = Genre.objects.create(name="Drama")
+        video = Video.objects.create(title="Pilot", year_launched=2020, rating='L', duration=45)
+        video.genres.add(action)
+
+        path = self.write('videos.ndjson', [
+            {'id': str(video.id), 'title': 'Pilot', 'year_launched': 2020, 'rating': 'L', 'duration': 45,
+             'genres_id': [str(drama.id)]},
+        ])
+        self.import_catalog(videos=path)
+
+        self.assertEqual(list(video.genres.all()), [drama])
+
+    def test_recounts_only_relinked_rows(self):
+        action = Genre.objects.create(name="Action")
+        drama = Genre.objects.create(name="Drama")
+        comedy = Genre.objects.create(name="Comedy")
+        video = Video.objects.create(title="Pilot", year_launched=2020, rating='L', duration=45)
+        video.genres.add(action)
+        # Left stale on purpose: only rows whose links changed are recounted
+        Genre.objects.filter(pk=comedy.pk).update(videos_count=7)
+
+        path = self.write('videos.ndjson', [
+            {'title': 'Pilot', 'year_launched': 2020, 'rating': 'L', 'duration': 45, 'genres': ['Drama']},
+            {'title': 'Finale', 'year_launched': 2020, 'rating': 'L', 'duration': 45, 'genres': ['Drama']},
+        ])
+        self.import_catalog(videos=path)
+
+        self.assertEqual(dict(Genre.objects.values_list('name', 'videos_count')),
+                         {'Action': 0, 'Drama': 2, 'Comedy': 7})
+
+    def test_rejects_invalid_rows(self):
+        path = self.write('videos.ndjson', [
+            {'title': 'Valid', 'year_launched': 2020, 'rating': 'L', 'duration': 45},
+            {'title': 'Bad rating', 'year_launched': 2020, 'rating': 'PG', 'duration': 45},
+            {'title': 'No duration', 'year_launched': 2020, 'rating': 'L'},
+            {'title': 'Unknown genre', 'year_launched': 2020, 'rating': 'L', 'duration': 45,
+             'genres': ['Missing']},
+        ])
+
+        out, err = self.import_catalog(videos=path)
+
+        self.assertIn('rejected 3', out)
+        self.assertIn('videos.ndjson:2: rating', err)
+        self.assertIn('videos.ndjson:3: duration', err)
+        self.assertIn("videos.ndjson:4: Unknown or ambiguous Genre 'Missing'", err)
+        self.assertEqual(list(Video.objects.values_list('title', flat=True)), ['Valid'])
+
+    def test_counts_valid_rows_among_rejected_ones(self):
+        path = self.write('videos.ndjson', [
+            {'title': 'First', 'year_launched': 2020, 'rating': 'L', 'duration': 45},
+            {'title': 'Bad rating', 'year_launched': 2020, 'rating': 'PG', 'duration': 45},
+            {'title': 'Second', 'year_launched': 2020, 'rating': 'L', 'duration': 45},
+            {'title': 'No duration', 'year_launched': 2020, 'rating': 'L'},
+            {'title': 'Unknown genre', 'year_launched': 2020, 'rating': 'L', 'duration': 45,
+             'genres': ['Missing']},
+        ])
+
+        result = CatalogImporter(workers=0).import_file('videos', path)
+
+        self.assertEqual((result['imported'], result['rejected']), (2, 3))
+        self.assertEqual(Video.objects.count(), 2)
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write('cast_members.ndjson', [
+            {'name': f'Member {i}', 'type': 'ACTOR'} for i in range(5)
+        ])
+        checkpoint = os.path.join(self.tmp_dir, 'checkpoint.json')
+        importer = CatalogImporter(batch_size=2, workers=0, checkpoint=checkpoint)
+        write = importer._write
+        calls = []
+
+        def interrupted(model, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise KeyboardInterrupt()
+            return write(model, rows)
+
+        with mock.patch.object(importer, '_write', side_effect=interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                importer.import_file('cast_members', path)
+        self.assertEqual(CastMember.objects.count(), 2)
+
+        result = CatalogImporter(batch_size=2, workers=0, checkpoint=checkpoint).import_file('cast_members', path)
+
+        self.assertEqual(result['skipped'], 2)
+        self.assertEqual(result['imported'], 3)
+        self.assertEqual(CastMember.objects.count(), 5)
+
+    def test_validation_pool(self):
+        path = self.write('categories.ndjson', [{'name': f'Category {i}'} for i in range(7)])
+        result = CatalogImporter(batch_size=2, workers=2).import_file('categories', path)
+        self.assertEqual(result['imported'], 7)
+        self.assertEqual(Category.objects.count(), 7)
+
+class ExportImportRoundTripTest(ImportCatalogTestMixin, APITestCase):
+    def test_csv_export_imports_back(self):
+        category = Category.objects.create(name="Movies")
+        genre = Genre.objects.create(name="Action")
+        video = Video.objects.create(title="Pilot", year_launched=2020, rating='L', duration=45)
+        video.categories.add(category)
+        video.genres.add(genre)
+        response = self.client.get(reverse('video-export'), {'output': 'csv'})
+        path = self.write('videos.csv', b''.join(response.streaming_content).decode())
+        video.categories.clear()
+        Video.objects.filter(id=video.id).update(title='Renamed')
+
+        CatalogImporter(workers=0).import_file('videos', path)
+
+        video.refresh_from_db()
+        self.assertEqual(video.title, 'Pilot')
+        self.assertEqual(list(video.categories.all()), [category])
+        self.assertEqual(Video.objects.count(), 1)
@@ -0,0 +1,60 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..models import CastMember, CastMemberType, Category, Genre, Video, Rating, AudioVideoMedia
+
+class IncludeRelatedTest(APITestCase):
+    def setUp(self):
+        self.categories = [Category.objects.create(name=f"Category {i}") for i in range(2)]
+        self.genre = Genre.objects.create(name="Action")
+        self.genre.categories.set(self.categories)
+        self.cast_member = CastMember.objects.create(name="John Doe", type=CastMemberType.ACTOR)
+        self.videos = []
+        for i in range(5):
+            video = Video.objects.create(
+                title=f"Video {i}", year_launched=2020, rating=Rating.L, duration=90,
+                video=AudioVideoMedia.objects.create(file_path=f'/{i}.mp4'),
+            )
+            video.categories.set(self.categories)
+            video.genres.add(self.genre)
+            video.cast_members.add(self.cast_member)
+            self.videos.append(video)
+
+    def test_embeds_related_objects(self):
+        response = self.client.get(reverse('video-list'), {'include': 'categories,genres,cast_members,video'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        video = response.data['data'][0]
+        self.assertEqual(list(video), [
+            'id', 'title', 'description', 'year_launched', 'opened', 'rating', 'duration',
+            'categories', 'genres', 'cast_members', 'video', 'created_at', 'updated_at',
+        ])
+        self.assertEqual([c['name'] for c in video['categories']], ['Category 0', 'Category 1'])
+        self.assertEqual(video['genres'][0]['name'], 'Action')
+        self.assertEqual(video['genres'][0]['categories'], [c.id for c in self.categories])
+        self.assertEqual(video['cast_members'][0]['type'], 'ACTOR')
+        self.assertEqual(video['video']['file_path'], '/0.mp4')
+
+    def test_one_query_per_relation_for_the_page(self):
+        url = reverse('video-list')
+        # Count and page, then one per included relation (+1 for the genres' own categories)
+        with self.assertNumQueries(2 + 4 + 1):
+            self.client.get(url, {'include': 'categories,genres,cast_members,video'})
+
+    def test_only_included_relations_are_embedded(self):
+        response = self.client.get(reverse('video-detail', kwargs={'pk': self.videos[0].id}),
+                                   {'include': 'genres'})
+        self.assertEqual(response.data['genres'][0]['id'], str(self.genre.id))
+        self.assertEqual(response.data['categories'], [c.id for c in self.categories])
+
+    def test_genre_categories(self):
+        response = self.client.get(reverse('genre-list'), {'include': 'categories'})
+        self.assertEqual(
+            [c['name'] for c in response.data['data'][0]['categories']], ['Category 0', 'Category 1']
+        )
+
+    def test_unknown_relation(self):
+        response = self.client.get(reverse('genre-list'), {'include': 'videos'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('category-list'), {'include': 'genres'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,35 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..models import Category
+
+class ServerTimingMiddlewareTest(APITestCase):
+    def setUp(self):
+        for i in range(3):
+            Category.objects.create(name=f"Category {i}")
+        self.list_url = reverse('category-list')
+
+    def test_server_timing_header(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        metrics = {
+            part.split(';')[0].strip(): part
+            for part in response['Server-Timing'].split(',')
+        }
+        self.assertEqual(set(metrics), {'db', 'ser', 'render', 'total'})
+        # count + page
+        self.assertIn('desc="2 queries"', metrics['db'])
+
+    def test_timing_log_line(self):
+        with self.assertLogs('desafio_codeflix.middleware', level='INFO') as logs:
+            self.client.get(self.list_url)
+        self.assertIn('"queries": 2', logs.output[0])
+        self.assertIn('"render_ms"', logs.output[0])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,86 @@
+import threading
+from unittest import mock
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from .. import metrics
+from ..rabbitmq import publish_event
+
+class MetricsTest(SimpleTestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter_aggregates_threads(self):
+        counter = metrics.Counter('jobs', 'Jobs.', ['kind'], registry=self.registry)
+
+        def work():
+            for _ in range(1000):
+                counter.inc(kind='a')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(5, kind='b')
+
+        self.assertEqual(counter.value(kind='a'), 4000)
+        output = self.registry.render()
+        self.assertIn('# TYPE jobs counter', output)
+        self.assertIn('jobs_total{kind="a"} 4000', output)
+        self.assertIn('jobs_total{kind="b"} 5', output)
+
+    def test_finished_threads_are_folded(self):
+        counter = metrics.Counter('jobs', 'Jobs.', registry=self.registry)
+        histogram = metrics.Histogram('latency_seconds', 'Latency.', buckets=(1,), registry=self.registry)
+
+        def work():
+            counter.inc()
+            histogram.observe(0.5)
+
+        for _ in range(20):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(counter.value(), 20)
+        self.assertEqual(histogram.count(), 20)
+        self.assertEqual(len(counter._shards), 0)
+        self.assertEqual(len(histogram._shards), 0)
+        self.assertIn('latency_seconds_sum 10.0', self.registry.render())
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1), registry=self.registry)
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value)
+
+        output = self.registry.render()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', output)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 3', output)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', output)
+        self.assertIn('latency_seconds_sum 6.05', output)
+        self.assertIn('latency_seconds_count 4', output)
+
+    def test_label_escaping(self):
+        counter = metrics.Counter('paths', 'Paths.', ['path'], registry=self.registry)
+        counter.inc(path='a"b')
+        self.assertIn('paths_total{path="a\\"b"} 1', self.registry.render())
+
+    def test_publish_failure(self):
+        before = metrics.publish_failures.value(queue='videos.test')
+        with mock.patch('pika.BlockingConnection', side_effect=OSError('unreachable')):
+            self.assertFalse(publish_event('videos.test', {'id': 1}))
+        self.assertEqual(metrics.publish_failures.value(queue='videos.test'), before + 1)
+        self.assertGreaterEqual(metrics.publish_duration.count(queue='videos.test'), 1)
+
+class MetricsEndpointTest(APITestCase):
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('category-list'))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="category-list",status="200"}', body)
+        self.assertIn('http_request_queries_bucket{route="category-list"', body)
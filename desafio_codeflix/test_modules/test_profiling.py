@@ -0,0 +1,95 @@
+import pstats
+import shutil
+import tempfile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..profiling import ProcessProfiler, start_session, stop_session, list_profiles
+from ..test_utils import JWTAuthMixin
+
+class ProfilingTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.profiles_dir = tempfile.mkdtemp()
+        settings_override = override_settings(
+            PROFILING_ENABLED=True,
+            PROFILING_DIR=self.profiles_dir,
+            PROFILING_CHECK_INTERVAL=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.profiles_dir, True)
+
+class ProcessProfilerTest(ProfilingTestMixin, APITestCase):
+    def test_profiles_next_matching_requests(self):
+        profiler = ProcessProfiler('api')
+        start_session(target='api', path_pattern='^/api/videos/', max_requests=2)
+
+        for path in ['/api/categories/', '/api/videos/', '/api/videos/1/', '/api/videos/2/']:
+            with profiler.profile(path):
+                sum(range(100))
+
+        profiles = list_profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertIn('-api-', profiles[0]['name'])
+        self.assertEqual(profiler._profiled, 2)
+        pstats.Stats(f"{self.profiles_dir}/{profiles[0]['name']}")
+
+    def test_ignores_other_targets(self):
+        profiler = ProcessProfiler('consumer')
+        start_session(target='api', max_requests=5)
+        with profiler.profile('videos.converted'):
+            pass
+        self.assertEqual(list_profiles(), [])
+
+    def test_stopped_session(self):
+        profiler = ProcessProfiler('api')
+        start_session(target='all', max_requests=5)
+        stop_session()
+        with profiler.profile('/api/videos/'):
+            pass
+        self.assertEqual(list_profiles(), [])
+
+    def test_session_requires_limit(self):
+        with self.assertRaises(ValueError):
+            start_session(target='api')
+
+class ProfilingAPITest(ProfilingTestMixin, JWTAuthMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_url = reverse('profiling-list')
+
+    def test_profile_and_download(self):
+        response = self.client.post(self.list_url, {'requests': 1, 'path_pattern': '^/api/categories/'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.client.get(reverse('category-list'))
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['data']), 1)
+
+        name = response.data['data'][0]['name']
+        response = self.client.get(reverse('profiling-detail', kwargs={'pk': name}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(b''.join(response.streaming_content))
+
+    def test_rejects_invalid_path_pattern(self):
+        response = self.client.post(self.list_url, {'requests': 1, 'path_pattern': '('})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('path_pattern', response.data)
+
+    def test_requires_admin_role(self):
+        self.set_auth(roles=["user"])
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.remove_auth()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_disabled(self):
+        with override_settings(PROFILING_ENABLED=False):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,106 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from ..models import AudioVideoMedia, Category, MediaStatus, Video, Rating
+from ..publishing import SnapshotPublisher, incremental_publisher
+
+class PublisherTestCase(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(PUBLISHED_SNAPSHOTS_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for i in range(12):
+            Category.objects.create(name=f'Category {i:02}', description='A category with a long description ' * 3)
+        self.media = AudioVideoMedia.objects.create(file_path='/video.mp4')
+        self.video = Video.objects.create(title='Video', description='A video ' * 60, year_launched=2020,
+                                          rating=Rating.L, duration=90, video=self.media)
+        self.video.categories.add(Category.objects.first())
+
+    def published(self, path):
+        return (self.root / path).read_bytes()
+
+    def detail(self, video):
+        return f'api/videos/{video.pk}.json'
+
+class SnapshotPublisherTest(PublisherTestCase):
+    def test_files_match_the_api(self):
+        result = SnapshotPublisher(pages=5).publish_all()
+        self.assertEqual(result, {'pages': 5, 'videos': 1, 'removed': 0})
+
+        for page in (1, 2):
+            expected = self.client.get(reverse('category-list'), {'current_page': page}).content
+            self.assertEqual(self.published(f'api/categories/pages/{page}.json'), expected)
+            self.assertEqual(gzip.decompress(self.published(f'api/categories/pages/{page}.json.gz')), expected)
+        self.assertFalse((self.root / 'api/categories/pages/3.json').exists())
+        self.assertEqual(json.loads(self.published('api/cast_members/pages/1.json'))['data'], [])
+
+        expected = self.client.get(reverse('video-detail', args=[self.video.pk])).content
+        self.assertEqual(self.published(self.detail(self.video)), expected)
+        self.assertEqual(gzip.decompress(self.published(self.detail(self.video) + '.gz')), expected)
+        self.assertEqual(os.stat(self.root / self.detail(self.video)).st_mode & 0o777, 0o644)
+        self.assertEqual(list(self.root.rglob('*.tmp')), [])
+
+    def test_stale_files_are_removed(self):
+        SnapshotPublisher(pages=5).publish_all()
+        gone = Video.objects.create(title='Gone', year_launched=2020, rating=Rating.L, duration=90)
+        SnapshotPublisher().publish_videos([gone.pk])
+        old = os.stat(self.root / self.detail(gone)).st_mtime - 60
+        os.utime(self.root / self.detail(gone), (old, old))
+        gone.delete()
+        Category.objects.filter(name__gte='Category 02').delete()
+
+        result = SnapshotPublisher(pages=5).publish_all()
+
+        self.assertEqual(result['removed'], 2)
+        self.assertFalse((self.root / self.detail(gone)).exists())
+        self.assertFalse((self.root / 'api/categories/pages/2.json').exists())
+        self.assertFalse((self.root / 'api/categories/pages/2.json.gz').exists())
+        self.assertTrue((self.root / self.detail(self.video)).exists())
+
+    def test_command(self):
+        call_command('publishsnapshots', '--pages', '1', '--root', str(self.root / 'out'), stdout=open(os.devnull, 'w'))
+        self.assertTrue((self.root / 'out' / self.detail(self.video)).exists())
+        self.assertFalse((self.root / 'out/api/categories/pages/2.json').exists())
+
+@override_settings(PUBLISHED_SNAPSHOTS_INCREMENTAL=True, PUBLISHED_SNAPSHOTS_DELAY=0)
+class IncrementalPublisherTest(PublisherTestCase):
+    def setUp(self):
+        super().setUp()
+        SnapshotPublisher().publish_all()
+
+    def test_writes_republish_what_they_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('video-detail', args=[self.video.pk]), {'title': 'Renamed'},
+                              content_type='application/json')
+        self.assertEqual(json.loads(self.published(self.detail(self.video)))['title'], 'Renamed')
+        self.assertEqual(json.loads(self.published('api/videos/pages/1.json'))['data'][0]['title'], 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.media.status = MediaStatus.COMPLETED
+            self.media.save()
+        self.assertEqual(json.loads(self.published(self.detail(self.video)))['video']['status'], MediaStatus.COMPLETED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.first().delete()
+        self.assertEqual(json.loads(self.published(self.detail(self.video)))['categories'], [])
+        self.assertEqual(json.loads(self.published('api/categories/pages/1.json'))['meta']['total'], 11)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.delete()
+        self.assertFalse((self.root / self.detail(self.video)).exists())
+        self.assertFalse((self.root / (self.detail(self.video) + '.gz')).exists())
+
+    @override_settings(PUBLISHED_SNAPSHOTS_INCREMENTAL=False)
+    def test_disabled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Video.objects.get(pk=self.video.pk).save()
+            incremental_publisher.changed(Video, [self.video.pk])
+        self.assertEqual(incremental_publisher._videos, set())
@@ -0,0 +1,96 @@
+import os
+import unittest
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from .. import related
+from ..models import CastMember, CastMemberType, Category, Genre, RelatedVideo, Rating, Video
+from ..related import RelatedVideosBuilder
+
+class RelatedVideosTestCase(TestCase):
+    def setUp(self):
+        self.action = Genre.objects.create(name='Action')
+        self.drama = Category.objects.create(name='Drama')
+        self.actor = CastMember.objects.create(name='Actor', type=CastMemberType.ACTOR)
+        self.videos = {
+            title: Video.objects.create(title=title, year_launched=2020, rating=Rating.L, duration=90)
+            for title in ('A', 'B', 'C', 'D', 'E')
+        }
+        for title in ('A', 'B', 'C'):
+            self.videos[title].genres.add(self.action)
+        for title in ('A', 'B'):
+            self.videos[title].cast_members.add(self.actor)
+        self.videos['D'].categories.add(self.drama)
+
+    def related(self, title):
+        return [
+            row.related.title
+            for row in RelatedVideo.objects.filter(video=self.videos[title]).select_related('related').order_by('rank')
+        ]
+
+@unittest.skipIf(related.np is None, 'numpy and scipy are not installed')
+class RelatedVideosBuilderTest(RelatedVideosTestCase):
+    def test_build(self):
+        calls = []
+        # Two videos per block
+        result = RelatedVideosBuilder(k=3, block_cells=10, progress=lambda *args: calls.append(args)).build()
+
+        self.assertEqual(result, {'videos': 5, 'rows': 6})
+        self.assertEqual(calls, [(2, 5), (4, 5), (5, 5)])
+        self.assertEqual(self.related('A'), ['B', 'C'])
+        self.assertEqual(set(self.related('C')), {'A', 'B'})
+        self.assertEqual(self.related('D'), [])
+        scores = list(RelatedVideo.objects.filter(video=self.videos['A']).values_list('score', flat=True))
+        self.assertAlmostEqual(scores[0], 1.0, places=5)
+        self.assertLess(scores[1], scores[0])
+
+        self.videos['B'].delete()
+        self.assertEqual(self.related('A'), ['C'])
+
+    def test_incremental_build(self):
+        builder = RelatedVideosBuilder(k=2)
+        builder.build()
+        self.videos['D'].genres.add(self.action)
+        self.videos['D'].cast_members.add(self.actor)
+
+        self.assertEqual(builder.build([self.videos['D'].pk]), {'videos': 1, 'rows': 2})
+        self.assertEqual(set(self.related('D')), {'A', 'B'})
+
+        # A and B list C, so they are recomputed with it
+        self.videos['C'].cast_members.add(self.actor)
+        self.assertEqual(builder.build([self.videos['C'].pk])['videos'], 3)
+        # A, B and C are now alike
+        scores = RelatedVideo.objects.filter(video=self.videos['A']).values_list('score', flat=True)
+        self.assertEqual([round(score, 5) for score in scores], [1.0, 1.0])
+
+    def test_command(self):
+        call_command('buildrelated', '--k', '2', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.related('A'), ['B', 'C'])
+
+class RelatedVideosViewTest(RelatedVideosTestCase, APITestCase):
+    def setUp(self):
+        super().setUp()
+        for rank, (title, score) in enumerate([('B', 0.9), ('C', 0.5)]):
+            RelatedVideo.objects.create(video=self.videos['A'], related=self.videos[title], rank=rank, score=score)
+
+    def test_related(self):
+        url = reverse('video-related', args=[self.videos['A'].pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([video['title'] for video in response.data['data']], ['B', 'C'])
+        self.assertEqual(response.data['data'][0]['genres'], [self.action.pk])
+        self.assertEqual(response.data['meta'], {'scores': [0.9, 0.5]})
+
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual([video['title'] for video in response.data['data']], ['B'])
+        response = self.client.get(reverse('video-related', args=[self.videos['E'].pk]))
+        self.assertEqual(response.data['data'], [])
+
+    def test_invalid(self):
+        url = reverse('video-related', args=[self.videos['A'].pk])
+        self.assertEqual(self.client.get(url, {'limit': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'limit': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.videos['A'].delete()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
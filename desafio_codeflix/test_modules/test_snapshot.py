@@ -0,0 +1,114 @@
+import uuid
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from ..models import CastMember, CastMemberType, Category, Genre, SnapshotVersion, Video
+from ..serializers import CreateVideoSerializer, GenreSerializer
+from ..snapshot import catalog_snapshot, current_version
+
+@override_settings(CATALOG_SNAPSHOT_CHECK_INTERVAL=60, API_CACHE_ENABLED=False)
+class SnapshotTest(TransactionTestCase):
+    def setUp(self):
+        catalog_snapshot.clear()
+        self.addCleanup(catalog_snapshot.clear)
+        self.client = APIClient()
+        self.movies = Category.objects.create(name="Movies")
+        self.series = Category.objects.create(name="Series")
+        self.genre = Genre.objects.create(name="Action")
+        self.genre.categories.add(self.series, self.movies)
+
+    def test_list_is_served_from_memory(self):
+        expected = [{'id': str(c.id), 'name': c.name} for c in Category.objects.all()]
+        self.client.get(reverse('category-list'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('category-list'))
+
+        self.assertEqual([{'id': c['id'], 'name': c['name']} for c in response.json()['data']], expected)
+        self.assertEqual(response.json()['meta']['total'], 2)
+
+    def test_lists_match_database(self):
+        CastMember.objects.create(name="Jane", type=CastMemberType.DIRECTOR)
+        for name in ('category-list', 'genre-list', 'castmember-list'):
+            with override_settings(CATALOG_SNAPSHOT_ENABLED=False):
+                expected = self.client.get(reverse(name)).json()
+            self.assertEqual(self.client.get(reverse(name)).json(), expected)
+        self.assertEqual(expected['data'][0]['type'], 'DIRECTOR')
+
+    def test_local_writes_expire_right_away(self):
+        self.client.get(reverse('category-list'))
+        Category.objects.create(name="Documentaries")
+        response = self.client.get(reverse('category-list'))
+        self.assertEqual(response.json()['meta']['total'], 3)
+
+        self.genre.categories.remove(self.series)
+        response = self.client.get(reverse('genre-list'))
+        self.assertEqual(response.json()['data'][0]['categories'], [str(self.movies.id)])
+
+    @override_settings(CATALOG_SNAPSHOT_CHECK_INTERVAL=0)
+    def test_other_processes_are_seen_through_the_version(self):
+        table = catalog_snapshot.get(Category)
+        # Another process writes without this process's on_commit hooks
+        Category.objects.filter(pk=self.movies.pk).update(name="Films")
+        self.assertIs(catalog_snapshot.get(Category), table)
+        SnapshotVersion.objects.filter(name='category').update(version=uuid.uuid4())
+        self.assertEqual(catalog_snapshot.get(Category).by_pk[self.movies.pk].name, "Films")
+
+    def test_bypassed_in_transactions(self):
+        with transaction.atomic():
+            self.assertIsNone(catalog_snapshot.get(Category))
+            version = current_version(Category)
+            Category.objects.create(name="Kids")
+            self.assertNotEqual(current_version(Category), version)
+
+    def test_records_are_compact_and_read_only(self):
+        record = catalog_snapshot.get(Genre).by_pk[self.genre.pk]
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(record.related_ids('categories'), (self.movies.pk, self.series.pk))
+        with self.assertRaises(AttributeError):
+            record.name = 'Other'
+        self.assertEqual(record.to_instance(), self.genre)
+
+    def test_id_checks(self):
+        cast_member = CastMember.objects.create(name="Jane", type=CastMemberType.ACTOR)
+        catalog_snapshot.get(Category)
+        catalog_snapshot.get(Genre)
+        catalog_snapshot.get(CastMember)
+        serializer = GenreSerializer(self.genre, data={'categories': [str(self.movies.id)]}, partial=True)
+        with self.assertNumQueries(0):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        serializer = CreateVideoSerializer(data={
+            'title': 'Video', 'year_launched': 2020, 'opened': False, 'rating': 'L', 'duration': 90,
+            'categories_id': [str(self.movies.id), str(uuid.uuid4())],
+            'genres_id': [str(self.genre.id)],
+            'cast_members_id': [str(cast_member.id)],
+        })
+        serializer.is_valid(raise_exception=True)
+        video = serializer.save()
+        self.assertEqual(list(video.categories.all()), [self.movies])
+        self.assertEqual(list(Video.objects.get(pk=video.pk).cast_members.all()), [cast_member])
+
+    def test_id_checks_see_rows_of_other_processes(self):
+        catalog_snapshot.get(Category)
+        # Another process inserts a category within the check interval
+        kids = Category.objects.bulk_create([Category(name="Kids")])[0]
+        SnapshotVersion.objects.filter(name='category').update(version=uuid.uuid4())
+        self.assertNotIn(kids.pk, catalog_snapshot.get(Category).by_pk)
+
+        serializer = GenreSerializer(self.genre, data={'categories': [str(kids.id)]}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer = CreateVideoSerializer(data={
+            'title': 'Video', 'year_launched': 2020, 'opened': False, 'rating': 'L', 'duration': 90,
+            'categories_id': [str(self.movies.id), str(kids.id)],
+            'genres_id': [str(self.genre.id)],
+            'cast_members_id': [],
+        })
+        serializer.is_valid(raise_exception=True)
+        video = serializer.save()
+        self.assertEqual(set(video.categories.all()), {self.movies, kids})
+
+    @override_settings(CATALOG_SNAPSHOT_ENABLED=False)
+    def test_disabled(self):
+        self.assertIsNone(catalog_snapshot.get(Category))
@@ -0,0 +1,69 @@
+from datetime import timedelta
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..models import AudioVideoMedia, MediaStatus
+from ..sweeper import sweep_stale_media
+
+class SweepStaleMediaTest(TestCase):
+    def create_media(self, status, age, attempts=0):
+        media = AudioVideoMedia.objects.create(file_path='/master.mp4', status=status, attempts=attempts)
+        AudioVideoMedia.objects.filter(id=media.id).update(updated_at=timezone.now() - age)
+        return media
+
+    def test_requeues_stuck_processing_media(self):
+        stuck = self.create_media(MediaStatus.PROCESSING, timedelta(hours=2), attempts=1)
+        exhausted = self.create_media(MediaStatus.PROCESSING, timedelta(hours=2), attempts=3)
+        recent = self.create_media(MediaStatus.PROCESSING, timedelta(minutes=5), attempts=1)
+
+        result = sweep_stale_media(processing_timeout=timedelta(hours=1), max_attempts=3)
+
+        self.assertEqual(result, {'requeued': 1, 'failed': 1})
+        for media, expected in [
+            (stuck, MediaStatus.PENDING), (exhausted, MediaStatus.FAILED), (recent, MediaStatus.PROCESSING)
+        ]:
+            media.refresh_from_db()
+            self.assertEqual(media.status, expected)
+
+    def test_fails_old_pending_media(self):
+        old = self.create_media(MediaStatus.PENDING, timedelta(days=2))
+        self.create_media(MediaStatus.PENDING, timedelta(hours=1))
+
+        result = sweep_stale_media(processing_timeout=timedelta(hours=1), pending_timeout=timedelta(days=1))
+
+        self.assertEqual(result, {'requeued': 0, 'failed': 1})
+        old.refresh_from_db()
+        self.assertEqual(old.status, MediaStatus.FAILED)
+
+    def test_bounded_batches(self):
+        for _ in range(5):
+            self.create_media(MediaStatus.PROCESSING, timedelta(hours=2))
+
+        result = sweep_stale_media(processing_timeout=timedelta(hours=1), batch_size=2, max_batches=2)
+
+        self.assertEqual(result['requeued'], 4)
+        self.assertEqual(AudioVideoMedia.objects.filter(status=MediaStatus.PROCESSING).count(), 1)
+
+    def test_scan_uses_status_index(self):
+        plan = (
+            AudioVideoMedia.objects
+            .filter(status=MediaStatus.PROCESSING, updated_at__lt=timezone.now())
+            .order_by('updated_at')
+            .explain()
+        )
+        self.assertIn('media_status_updated_idx', plan)
+
+class MediaStatusSummaryTest(APITestCase):
+    def test_summary(self):
+        AudioVideoMedia.objects.create(file_path='/a.mp4')
+        AudioVideoMedia.objects.create(file_path='/b.mp4')
+        AudioVideoMedia.objects.create(file_path='/c.mp4', status=MediaStatus.COMPLETED)
+
+        response = self.client.get(reverse('video-media-status'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], {
+            'PENDING': 2, 'PROCESSING': 0, 'COMPLETED': 1, 'FAILED': 0,
+        })
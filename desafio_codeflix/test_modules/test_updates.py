@@ -0,0 +1,110 @@
+import uuid
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..models import CastMember, CastMemberType, Category, Genre, Video, Rating
+from ..serializers import VideoSerializer
+
+class DiffUpdateTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Movies")
+        self.genre = Genre.objects.create(name="Action")
+        self.cast = [CastMember.objects.create(name=f"Actor {i}", type=CastMemberType.ACTOR) for i in range(20)]
+        self.video = Video.objects.create(title="Video", year_launched=2020, rating=Rating.L, duration=90)
+        self.video.categories.add(self.category)
+        self.video.genres.add(self.genre)
+        self.video.cast_members.add(*self.cast)
+        self.url = reverse('video-detail', kwargs={'pk': self.video.id})
+
+    def test_unchanged_update_writes_nothing(self):
+        before = Video.objects.get(pk=self.video.pk).updated_at
+        data = VideoSerializer(self.video).data
+        serializer = VideoSerializer(self.video, data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # Only the current ids of each relation are read, inside a savepoint
+        with self.assertNumQueries(5):
+            serializer.save()
+        self.assertEqual(Video.objects.get(pk=self.video.pk).updated_at, before)
+
+    def test_changed_column_only(self):
+        # One UPDATE inside a savepoint
+        with self.assertNumQueries(3):
+            serializer = VideoSerializer(self.video, data={'title': 'New title'}, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        video = Video.objects.get(pk=self.video.pk)
+        self.assertEqual(video.title, 'New title')
+        self.assertGreater(video.updated_at, self.video.created_at)
+
+    def test_related_ids_validated_in_one_query(self):
+        ids = [str(member.id) for member in self.cast]
+        serializer = VideoSerializer(self.video, data={'cast_members': ids}, partial=True)
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_patch_many_to_many_delta(self):
+        kept = self.cast[1:]
+        added = CastMember.objects.create(name="Newcomer", type=CastMemberType.DIRECTOR)
+        ids = [str(member.id) for member in kept + [added]]
+
+        response = self.client.patch(self.url, {'cast_members': ids}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['cast_members']), {uuid.UUID(i) for i in ids})
+        self.assertEqual(self.video.cast_members.count(), 20)
+        self.assertFalse(self.video.cast_members.filter(pk=self.cast[0].pk).exists())
+
+    def test_unknown_related_id(self):
+        response = self.client.patch(self.url, {'cast_members': [str(uuid.uuid4())]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cast_members', response.data)
+        response = self.client.patch(self.url, {'cast_members': ['nope']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.video.cast_members.count(), 20)
+
+class RelationActionTest(APITestCase):
+    def setUp(self):
+        self.video = Video.objects.create(title="Video", year_launched=2020, rating=Rating.L, duration=90)
+        self.cast = [CastMember.objects.create(name=f"Actor {i}", type=CastMemberType.ACTOR) for i in range(3)]
+        self.video.cast_members.add(self.cast[0])
+
+    def url(self, operation, relation='cast_members'):
+        return reverse('video-relation', kwargs={'pk': self.video.id, 'relation': relation, 'operation': operation})
+
+    def test_add_and_remove(self):
+        ids = [str(member.id) for member in self.cast]
+        response = self.client.post(self.url('add'), {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.video.cast_members.count(), 3)
+
+        response = self.client.post(self.url('remove'), {'ids': ids[:2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(self.video.cast_members.all()), [self.cast[2]])
+
+    def test_add_touches_video(self):
+        before = Video.objects.get(pk=self.video.pk).updated_at
+        self.client.post(self.url('add'), {'ids': [str(self.cast[1].id)]}, format='json')
+        self.assertGreater(Video.objects.get(pk=self.video.pk).updated_at, before)
+
+    def test_unknown_ids_are_rejected(self):
+        response = self.client.post(self.url('add'), {'ids': [str(uuid.uuid4())]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_relation(self):
+        response = self.client.post(self.url('add', relation='title'), {'ids': [str(uuid.uuid4())]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_other_resources(self):
+        genre = Genre.objects.create(name="Drama")
+        category = Category.objects.create(name="Series")
+        url = reverse('genre-relation', kwargs={'pk': genre.id, 'relation': 'categories', 'operation': 'add'})
+        response = self.client.post(url, {'ids': [str(category.id)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(genre.categories.all()), [category])
+
+    @override_settings(RELATION_CHANGE_MAX_IDS=2)
+    def test_limit(self):
+        ids = [str(member.id) for member in self.cast]
+        response = self.client.post(self.url('add'), {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,231 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ..models import AudioVideoMedia, Video, Rating, MediaAsset, MediaUpload, MediaStatus, UploadStatus
+from ..uploads import UploadError, complete_upload, content_hash, write_chunk
+from ..management.commands.startconsumer import Command as ConsumerCommand
+
+class ChunkedUploadTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_UPLOAD_CHUNK_SIZE=4)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        self.video = Video.objects.create(
+            title="Test Video", year_launched=2021, rating=Rating.L, duration=120
+        )
+        self.content = b'0123456789'
+
+    def start(self, video=None):
+        video = video or self.video
+        response = self.client.post(
+            reverse('video-uploads', kwargs={'pk': video.id}),
+            {'file_name': 'master.mp4', 'total_size': len(self.content)},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['chunk_size'], 4)
+        return reverse('video-upload', kwargs={'pk': video.id, 'upload_id': response.data['id']})
+
+    def upload(self, video=None):
+        url = self.start(video)
+        for start, end in [(0, 3), (4, 7), (8, 9)]:
+            self.put_chunk(url, start, end)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def put_chunk(self, url, start, end, checksum=None):
+        data = self.content[start:end + 1]
+        return self.client.generic(
+            'PUT', url, data, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(data).hexdigest(),
+        )
+
+class ChunkedUploadTest(ChunkedUploadTestMixin, APITestCase):
+    def test_chunked_upload(self):
+        url = self.start()
+        for start, end in [(0, 3), (4, 7), (8, 9)]:
+            response = self.put_chunk(url, start, end)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['received_size'], end + 1)
+
+        response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.video.refresh_from_db()
+        self.assertEqual(str(self.video.video.id), response.data['id'])
+        self.assertEqual(self.video.video.status, MediaStatus.PENDING)
+        with open(self.video.video.file_path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(MediaUpload.objects.get().status, UploadStatus.COMPLETED)
+
+    def test_resume_after_disconnect(self):
+        url = self.start()
+        self.put_chunk(url, 0, 3)
+
+        # The client lost track of its progress and asks where to resume
+        response = self.client.get(url)
+        self.assertEqual(response.data['received_size'], 4)
+
+        response = self.put_chunk(url, 8, 9)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['received_size'], 4)
+
+        self.put_chunk(url, 4, 7)
+        self.put_chunk(url, 8, 9)
+        response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_checksum_mismatch(self):
+        url = self.start()
+        response = self.put_chunk(url, 0, 3, checksum=hashlib.sha256(b'nope').hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['received_size'], 0)
+
+        upload = MediaUpload.objects.get()
+        self.assertEqual(os.path.getsize(os.path.join(self.media_root, 'uploads', f'{upload.id}.part')), 0)
+
+    def test_concurrent_chunk_does_not_truncate(self):
+        url = self.start()
+        upload = MediaUpload.objects.get()
+        # Both requests read received_size 0; the first one wins
+        stale = MediaUpload.objects.get()
+        self.put_chunk(url, 0, 3)
+
+        with self.assertRaises(UploadError) as raised:
+            write_chunk(stale, io.BytesIO(b'nope'), 'bytes 0-3/10', hashlib.sha256(b'0123').hexdigest())
+        self.assertEqual(raised.exception.status_code, 409)
+        with open(os.path.join(self.media_root, 'uploads', f'{upload.id}.part'), 'rb') as part:
+            self.assertEqual(part.read(), b'0123')
+
+    def test_concurrent_complete_attaches_once(self):
+        url = self.start()
+        for start, end in [(0, 3), (4, 7), (8, 9)]:
+            self.put_chunk(url, start, end)
+        # Both requests read the upload in progress; the first one wins
+        stale = MediaUpload.objects.get()
+        self.assertEqual(self.client.post(f'{url}complete/').status_code, status.HTTP_201_CREATED)
+
+        with self.assertRaises(UploadError) as raised:
+            complete_upload(stale)
+        self.assertEqual(raised.exception.status_code, 409)
+        self.assertEqual(AudioVideoMedia.objects.count(), 1)
+
+    def test_complete_incomplete_upload(self):
+        url = self.start()
+        self.put_chunk(url, 0, 3)
+        response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_wrong_chunk_size(self):
+        url = self.start()
+        response = self.put_chunk(url, 0, 1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class MediaAssetDeduplicationTest(ChunkedUploadTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_video = Video.objects.create(
+            title="Other Video", year_launched=2022, rating=Rating.L, duration=90
+        )
+
+    def expected_hash(self):
+        chunks = [self.content[i:i + 4] for i in range(0, len(self.content), 4)]
+        return content_hash('\n'.join(hashlib.sha256(chunk).hexdigest() for chunk in chunks))
+
+    def test_duplicate_upload_shares_asset(self):
+        self.upload()
+        self.upload(self.other_video)
+
+        asset = MediaAsset.objects.get()
+        self.assertEqual(asset.content_hash, self.expected_hash())
+        self.assertEqual(asset.ref_count, 2)
+        self.video.refresh_from_db()
+        self.other_video.refresh_from_db()
+        self.assertEqual(self.video.video.file_path, self.other_video.video.file_path)
+        # Only the stored object is left on disk
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), [])
+
+    def test_duplicate_of_encoded_asset_skips_encoding(self):
+        self.upload()
+        consumer = ConsumerCommand(stdout=io.StringIO())
+        consumer._process_message({'video_id': str(self.video.id), 'encoded_path': '/encoded/master.mp4'})
+
+        media_id = self.upload(self.other_video)
+        self.other_video.refresh_from_db()
+        self.assertEqual(str(self.other_video.video.id), media_id)
+        self.assertEqual(self.other_video.video.status, MediaStatus.COMPLETED)
+        self.assertEqual(self.other_video.video.encoded_path, '/encoded/master.mp4')
+
+    def start_known(self, content=None):
+        response = self.client.post(
+            reverse('video-uploads', kwargs={'pk': self.other_video.id}),
+            {'file_name': 'copy.mp4', 'total_size': len(self.content), 'content_hash': self.expected_hash()},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], UploadStatus.IN_PROGRESS)
+        offset = response.data['proof_offset']
+        url = reverse('video-upload', kwargs={'pk': self.other_video.id, 'upload_id': response.data['id']})
+        return url, offset, min(offset + 3, len(self.content) - 1)
+
+    def test_known_hash_completes_with_one_chunk(self):
+        self.upload()
+        url, start, end = self.start_known()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.put_chunk(url, start, end)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], UploadStatus.COMPLETED)
+        self.assertEqual(MediaAsset.objects.get().ref_count, 2)
+        self.other_video.refresh_from_db()
+        self.assertEqual(self.other_video.video.file_path, MediaAsset.objects.get().file_path)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), [])
+
+    def test_known_hash_needs_the_bytes(self):
+        self.upload()
+        url, start, end = self.start_known()
+        forged = b'x' * (end - start + 1)
+        response = self.client.generic(
+            'PUT', url, forged, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}',
+            HTTP_X_CHUNK_SHA256=hashlib.sha256(forged).hexdigest(),
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(MediaAsset.objects.get().ref_count, 1)
+        upload = MediaUpload.objects.get(video=self.other_video)
+        self.assertEqual((upload.status, upload.proof_offset), (UploadStatus.IN_PROGRESS, None))
+
+        # The claim is gone, the file has to be sent in full
+        for start, end in [(0, 3), (4, 7), (8, 9)]:
+            self.assertEqual(self.put_chunk(url, start, end).status_code, status.HTTP_200_OK)
+        response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(MediaAsset.objects.get().ref_count, 2)
+
+    def test_asset_released_with_last_media(self):
+        self.upload()
+        self.upload(self.other_video)
+        asset = MediaAsset.objects.get()
+
+        self.video.refresh_from_db()
+        self.video.video.delete()
+        asset.refresh_from_db()
+        self.assertEqual(asset.ref_count, 1)
+
+        self.other_video.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_video.video.delete()
+        self.assertFalse(MediaAsset.objects.exists())
+        self.assertFalse(os.path.exists(asset.file_path))
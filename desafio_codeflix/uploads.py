@@ -0,0 +1,304 @@
+import fcntl
+import hashlib
+import os
+import re
+import secrets
+import shutil
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from .models import AudioVideoMedia, MediaAsset, MediaStatus, MediaUpload, UploadStatus
+
+READ_BUFFER_SIZE = 64 * 1024
+
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    """
+    A chunk or completion request that cannot be applied to the upload.
+
+    Attributes:
+        status_code (int): HTTP status that describes the error.
+    """
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def media_root():
+    return Path(getattr(settings, 'MEDIA_ROOT', Path(settings.BASE_DIR) / 'media'))
+
+
+def part_path(upload):
+    return media_root() / 'uploads' / f'{upload.id}.part'
+
+
+def asset_path(content_hash):
+    return media_root() / 'objects' / content_hash[:2] / content_hash[2:4] / content_hash
+
+
+def content_hash(chunk_checksums):
+    """
+    Content hash of an upload from the hex digests of its chunks, one per line.
+    """
+    digest = hashlib.sha256()
+    for line in chunk_checksums.split():
+        digest.update(bytes.fromhex(line))
+    return digest.hexdigest()
+
+
+def start_upload(video, file_name, total_size, content_hash=None):
+    """
+    Create a MediaUpload and its empty part file.
+
+    When the client already knows the content hash of the file and an asset with
+    that hash and size exists, a random chunk of it is chosen as proof_offset.
+    Sending that chunk, which proves the client holds the bytes and not only
+    their hash, completes the upload with the stored asset (see write_chunk).
+    """
+    max_size = getattr(settings, 'MEDIA_UPLOAD_MAX_SIZE', None)
+    if max_size is not None and total_size > max_size:
+        raise UploadError(f"File exceeds the maximum upload size of {max_size} bytes", 413)
+
+    upload = MediaUpload(
+        video=video,
+        file_name=os.path.basename(file_name),
+        total_size=total_size,
+        chunk_size=settings.MEDIA_UPLOAD_CHUNK_SIZE,
+    )
+    if content_hash and MediaAsset.objects.filter(content_hash=content_hash.lower(), size=total_size).exists():
+        upload.claimed_hash = content_hash.lower()
+        chunks = -(-total_size // upload.chunk_size)
+        upload.proof_offset = secrets.randbelow(chunks) * upload.chunk_size
+
+    upload.save()
+    path = part_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return upload
+
+
+def parse_content_range(header):
+    """
+    Parse a 'bytes start-end/total' Content-Range header.
+
+    Returns:
+        tuple: (start, end, total) with end inclusive.
+
+    Raises:
+        UploadError: If the header is missing or malformed.
+    """
+    match = _CONTENT_RANGE.match(header or '')
+    if not match:
+        raise UploadError("A 'Content-Range: bytes start-end/total' header is required")
+    start, end, total = (int(group) for group in match.groups())
+    if end < start:
+        raise UploadError("Invalid Content-Range")
+    return start, end, total
+
+
+def write_chunk(upload, stream, content_range, checksum):
+    """
+    Stream one chunk from the request body into the part file.
+
+    The body is copied in READ_BUFFER_SIZE pieces and hashed on the way, so a
+    chunk is never held in memory. Chunks must arrive in order: a chunk starting
+    anywhere but received_size is rejected with 409 and the client resumes from
+    the offset returned by the upload status. The chunk at proof_offset, while
+    it is set, is compared with the claimed asset instead (see prove_possession).
+
+    Writes hold an exclusive lock on the part file and check the offset again
+    under it, so of two requests for the same offset the second one gets 409
+    and can never truncate what the first one wrote.
+
+    Args:
+        upload (MediaUpload): The upload being written.
+        stream: File-like request body.
+        content_range (str): The Content-Range header of the request.
+        checksum (str): Hex SHA-256 of the chunk as computed by the client.
+
+    Returns:
+        MediaUpload: The upload with its new received_size.
+
+    Raises:
+        UploadError: If the chunk is out of order, malformed or corrupt.
+    """
+    if upload.status != UploadStatus.IN_PROGRESS:
+        raise UploadError("Upload is already complete", 409)
+    if not checksum:
+        raise UploadError("An 'X-Chunk-SHA256' header is required")
+    if stream is None:
+        raise UploadError("Request body is empty")
+
+    start, end, total = parse_content_range(content_range)
+    length = end - start + 1
+    if total != upload.total_size or end >= total:
+        raise UploadError("Content-Range does not match the upload size", 416)
+    if length != upload.chunk_size and end != total - 1:
+        raise UploadError(f"Chunks must be {upload.chunk_size} bytes except for the last one")
+    if upload.proof_offset is not None and start == upload.proof_offset:
+        return prove_possession(upload, stream, start, length, checksum)
+    if start != upload.received_size:
+        raise UploadError(f"Expected a chunk starting at byte {upload.received_size}", 409)
+
+    digest = hashlib.sha256()
+    remaining = length
+    with open(part_path(upload), 'r+b') as part:
+        # Released when the file is closed
+        fcntl.flock(part, fcntl.LOCK_EX)
+        upload.refresh_from_db(fields=['received_size', 'status'])
+        if upload.status != UploadStatus.IN_PROGRESS:
+            raise UploadError("Upload is already complete", 409)
+        if start != upload.received_size:
+            raise UploadError("Chunk was written concurrently", 409)
+        part.seek(start)
+        while remaining:
+            data = stream.read(min(READ_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            digest.update(data)
+            part.write(data)
+            remaining -= len(data)
+        if remaining or digest.hexdigest() != checksum.lower():
+            part.truncate(start)
+            raise UploadError("Chunk is incomplete or does not match its checksum")
+        part.truncate(end + 1)
+
+        # Still under the lock, so no other request can have moved the offset
+        updated = MediaUpload.objects.filter(id=upload.id, received_size=start).update(
+            received_size=end + 1,
+            chunk_checksums=Concat(F('chunk_checksums'), Value(digest.hexdigest() + '\n')),
+        )
+        if not updated:
+            part.truncate(start)
+            raise UploadError("Chunk was written concurrently", 409)
+    upload.refresh_from_db()
+    return upload
+
+
+def _stream_digest(stream, length):
+    digest = hashlib.sha256()
+    remaining = length
+    while remaining:
+        data = stream.read(min(READ_BUFFER_SIZE, remaining))
+        if not data:
+            break
+        digest.update(data)
+        remaining -= len(data)
+    return digest.hexdigest() if not remaining else None
+
+
+def prove_possession(upload, stream, start, length, checksum):
+    """
+    Complete an upload with the asset whose hash it claimed, if the chunk sent
+    matches that asset's bytes at proof_offset.
+
+    A mismatch drops the claim: the upload goes on as a regular one from
+    received_size, and 409 is returned.
+    """
+    sent = _stream_digest(stream, length)
+    if sent is None or sent != checksum.lower():
+        raise UploadError("Chunk is incomplete or does not match its checksum")
+
+    with transaction.atomic():
+        upload = MediaUpload.objects.select_for_update().get(id=upload.id)
+        if upload.status != UploadStatus.IN_PROGRESS:
+            raise UploadError("Upload is already complete", 409)
+        asset = MediaAsset.objects.select_for_update().filter(
+            content_hash=upload.claimed_hash, size=upload.total_size
+        ).first()
+        matches = False
+        if asset is not None and upload.proof_offset == start:
+            try:
+                with open(asset.file_path, 'rb') as stored:
+                    stored.seek(start)
+                    matches = secrets.compare_digest(_stream_digest(stored, length) or '', sent)
+            except OSError:
+                matches = False
+        if matches:
+            upload.received_size = upload.total_size
+            upload.proof_offset = None
+            upload.save(update_fields=['received_size', 'proof_offset', 'updated_at'])
+            _attach_asset(upload, asset)
+            source = part_path(upload)
+            transaction.on_commit(lambda: source.unlink(missing_ok=True))
+            return upload
+        upload.claimed_hash = ''
+        upload.proof_offset = None
+        upload.save(update_fields=['claimed_hash', 'proof_offset', 'updated_at'])
+    raise UploadError("Chunk does not match the file with the claimed content hash", 409)
+
+
+def complete_upload(upload):
+    """
+    Store a fully received upload under its content hash and attach it to its video.
+
+    If an asset with the same hash already exists the part file is discarded
+    and the new media shares the existing file, including its encoded output.
+
+    Returns:
+        AudioVideoMedia: The media created for the upload.
+
+    Raises:
+        UploadError: If bytes are still missing or the upload was already completed.
+    """
+    with transaction.atomic():
+        # Locked so that a concurrent call waits and then sees the upload completed
+        upload = MediaUpload.objects.select_for_update().get(id=upload.id)
+        if upload.status != UploadStatus.IN_PROGRESS:
+            raise UploadError("Upload is already complete", 409)
+        if upload.received_size != upload.total_size:
+            raise UploadError(
+                f"Upload is incomplete: {upload.received_size} of {upload.total_size} bytes received", 409
+            )
+        digest = content_hash(upload.chunk_checksums)
+        source = part_path(upload)
+        asset = MediaAsset.objects.select_for_update().filter(content_hash=digest).first()
+        if asset is None:
+            destination = asset_path(digest)
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(source, destination)
+            asset = MediaAsset.objects.create(
+                content_hash=digest, file_path=str(destination), size=upload.total_size
+            )
+        else:
+            transaction.on_commit(lambda: source.unlink(missing_ok=True))
+        return _attach_asset(upload, asset)
+
+
+def _attach_asset(upload, asset):
+    """
+    Create the upload's media on top of an asset and make it the video's media.
+    """
+    media = AudioVideoMedia(file_path=asset.file_path, asset=asset)
+    if asset.encoded_path:
+        # Same bytes were already encoded, nothing left to convert
+        media.encoded_path = asset.encoded_path
+        media.status = MediaStatus.COMPLETED
+    media.save()
+    MediaAsset.objects.filter(content_hash=asset.content_hash).update(ref_count=F('ref_count') + 1)
+
+    upload.status = UploadStatus.COMPLETED
+    upload.media = media
+    upload.save(update_fields=['status', 'media', 'updated_at'])
+
+    video = upload.video
+    video.video = media
+    video.save()
+    return media
+
+
+def release_asset(content_hash):
+    """
+    Drop one reference to an asset, deleting the asset and its file once unused.
+    """
+    MediaAsset.objects.filter(content_hash=content_hash).update(ref_count=F('ref_count') - 1)
+    unused = MediaAsset.objects.filter(content_hash=content_hash, ref_count__lte=0).first()
+    if unused is not None:
+        path = Path(unused.file_path)
+        unused.delete()
+        transaction.on_commit(lambda: path.unlink(missing_ok=True))
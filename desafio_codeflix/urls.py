@@ -1,13 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CastMemberViewSet, CategoryViewSet, GenreViewSet, VideoViewSet
+from .views import CastMemberViewSet, CategoryViewSet, GenreViewSet, VideoViewSet, ProfilingViewSet, BatchView
 
 router = DefaultRouter()
 router.register(r'cast_members', CastMemberViewSet, basename='castmember')
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'genres', GenreViewSet, basename='genre')
 router.register(r'videos', VideoViewSet, basename='video')
+router.register(r'profiling', ProfilingViewSet, basename='profiling')
 
 urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
     path('', include(router.urls)),
 ]
@@ -1,12 +1,26 @@
+import re
+from django.http import FileResponse, Http404, HttpResponse
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import status, viewsets
+from rest_framework.views import APIView
 from rest_framework.decorators import action
-from .models import CastMember, Category, Genre, Video, AudioVideoMedia, MediaStatus
+from .models import CastMember, Category, Genre, Video, AudioVideoMedia, MediaStatus, MediaUpload, RelatedVideo
 from .serializers import (
     CastMemberSerializer, CategorySerializer, GenreSerializer, 
-    VideoSerializer, CreateVideoSerializer, UploadVideoMediaSerializer
+    VideoSerializer, CreateVideoSerializer, UploadVideoMediaSerializer, StartProfilingSerializer,
+    StartMediaUploadSerializer, MediaUploadSerializer, BatchRequestSerializer, VideoFilterSerializer
 )
 from .base import BaseViewSet
+from .permissions import IsAdminRole
+from . import metrics, profiling, uploads
+from .batch import BatchRunner
+from .streaming import IgnoreClientContentNegotiation, serve_file
+from .counters import media_status_counts
+from .facets import video_facets
+from .autocomplete import cast_member_autocomplete
 
 # Create your views here.
 class CastMemberViewSet(BaseViewSet):
@@ -16,6 +30,39 @@ class CastMemberViewSet(BaseViewSet):
     queryset = CastMember.objects.all()
     serializer_class = CastMemberSerializer
 
+    @action(detail=False, methods=['get'], url_path='autocomplete', url_name='autocomplete')
+    def autocomplete(self, request):
+        """
+        Cast members with a name word starting with each word of ?q=, ignoring
+        case and accents, the ones in most videos first.
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', 10))
+            if not 1 <= limit <= settings.AUTOCOMPLETE_MAX_LIMIT:
+                raise ValueError()
+        except ValueError:
+            return Response(
+                {'detail': f'limit must be an integer between 1 and {settings.AUTOCOMPLETE_MAX_LIMIT}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        results = cast_member_autocomplete.search(query, limit)
+        if results is None:
+            # The index is still being built. Words are matched by prefix like
+            # the index does, but without its accent folding: 'jose' does not
+            # find 'José' here
+            words = re.findall(r'\w+', query)
+            matches = CastMember.objects.all()
+            for word in words:
+                matches = matches.filter(name__iregex=rf'(^|\W){word}')
+            results = [] if not words else (
+                matches.order_by('-videos_count', 'name')
+                .values_list('id', 'name', 'videos_count')[:limit]
+            )
+        return Response({'data': [
+            {'id': str(pk), 'name': name, 'videos_count': count} for pk, name, count in results
+        ]})
+
 class CategoryViewSet(BaseViewSet):
     """
     API endpoint that allows categories to be viewed or edited.
@@ -36,12 +83,24 @@ class VideoViewSet(BaseViewSet):
     """
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
+    # Actions narrowed by ?rating=, ?year_launched=, ?category=, ?genre= and ?cast_member=
+    filtered_actions = ('list', 'export', 'facets')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in self.filtered_actions:
+            return queryset
+        filters = VideoFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        return filters.filter(queryset)
 
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateVideoSerializer
         elif self.action == 'upload_media':
             return UploadVideoMediaSerializer
+        elif self.action == 'start_upload':
+            return StartMediaUploadSerializer
         return self.serializer_class
 
     def create(self, request, *args, **kwargs):
@@ -60,9 +119,212 @@ class VideoViewSet(BaseViewSet):
         """
         Upload media for a video.
         """
-        video = self.get_object()
+        # 404 for an unknown video
+        self.get_object()
         serializer = self.get_serializer(data=request.data, context={'video_id': pk})
         serializer.is_valid(raise_exception=True)
         media = serializer.save()
 
         return Response({'id': str(media.id)}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], url_path='uploads', url_name='uploads')
+    def start_upload(self, request, pk=None):
+        """
+        Start a chunked upload of the video's master file.
+
+        Chunks are then sent with PUT to the returned upload, each carrying a
+        Content-Range header and the chunk's SHA-256 in X-Chunk-SHA256.
+        """
+        video = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = uploads.start_upload(video, **serializer.validated_data)
+        except uploads.UploadError as e:
+            return Response({'detail': str(e)}, status=e.status_code)
+        return Response(MediaUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get', 'put'], url_path=r'uploads/(?P<upload_id>[^/.]+)', url_name='upload')
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        """
+        GET returns the upload progress (the offset to resume from); PUT appends a chunk.
+        """
+        upload = self._get_upload(pk, upload_id)
+        if request.method == 'PUT':
+            try:
+                upload = uploads.write_chunk(
+                    upload,
+                    request.stream,
+                    request.META.get('HTTP_CONTENT_RANGE'),
+                    request.META.get('HTTP_X_CHUNK_SHA256'),
+                )
+            except uploads.UploadError as e:
+                upload.refresh_from_db()
+                return Response(
+                    {'detail': str(e), 'received_size': upload.received_size}, status=e.status_code
+                )
+        return Response(MediaUploadSerializer(upload).data)
+
+    @action(detail=True, methods=['post'], url_path=r'uploads/(?P<upload_id>[^/.]+)/complete',
+            url_name='upload-complete')
+    def complete_upload(self, request, pk=None, upload_id=None):
+        """
+        Finish an upload and create the video's media.
+        """
+        upload = self._get_upload(pk, upload_id)
+        try:
+            media = uploads.complete_upload(upload)
+        except uploads.UploadError as e:
+            return Response({'detail': str(e)}, status=e.status_code)
+        return Response({'id': str(media.id)}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], url_path='media-status', url_name='media-status')
+    def media_status(self, request):
+        """
+        Number of media in each conversion status.
+        """
+        return Response({'data': media_status_counts()})
+
+    @action(detail=False, methods=['get'], url_path='facets', url_name='facets')
+    def facets(self, request):
+        """
+        Number of videos per rating, launch year, category and genre, among the
+        videos matching the list filters.
+        """
+        return self._cached(request, lambda: Response(video_facets(self.filter_queryset(self.get_queryset()))))
+
+    @action(detail=True, methods=['get'], url_path='related', url_name='related')
+    def related(self, request, pk=None):
+        """
+        Up to ?limit= videos sharing the most genres, categories and cast with
+        this one, most similar first, as computed by manage.py buildrelated.
+        """
+        try:
+            limit = int(request.query_params.get('limit', settings.RELATED_VIDEOS_K))
+            if not 1 <= limit <= settings.RELATED_VIDEOS_K:
+                raise ValueError()
+        except ValueError:
+            return Response(
+                {'detail': f'limit must be an integer between 1 and {settings.RELATED_VIDEOS_K}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return self._cached(request, lambda: self._related(limit))
+
+    def _related(self, limit):
+        video = self.get_object()
+        related = list(
+            RelatedVideo.objects.filter(video=video).order_by('rank').values_list('related_id', 'score')[:limit]
+        )
+        queryset = self._optimize_for(Video.objects.all(), self.get_serializer_class())
+        found = queryset.in_bulk([pk for pk, _ in related])
+        related = [(found[pk], score) for pk, score in related if pk in found]
+        serializer = self.get_serializer([video for video, _ in related], many=True)
+        return Response({
+            'data': serializer.data,
+            'meta': {'scores': [round(score, 4) for _, score in related]},
+        })
+
+    def _cache_models(self):
+        models = super()._cache_models()
+        if self.action == 'related':
+            models.append(RelatedVideo)
+        return models
+
+    @action(detail=True, methods=['get'], url_path='stream', url_name='stream',
+            content_negotiation_class=IgnoreClientContentNegotiation)
+    def stream(self, request, pk=None):
+        """
+        Stream the encoded media with support for Range, If-Range and ETag.
+        """
+        video = self.get_object()
+        media = video.video
+        if media is None or media.status != MediaStatus.COMPLETED or not media.encoded_path:
+            raise Http404
+        path = Path(media.encoded_path)
+        if not path.is_file():
+            raise Http404
+        return serve_file(request, path)
+
+    def _get_upload(self, pk, upload_id):
+        try:
+            return MediaUpload.objects.get(id=upload_id, video_id=pk)
+        except (MediaUpload.DoesNotExist, ValidationError):
+            raise Http404
+
+class ProfilingViewSet(viewsets.ViewSet):
+    """
+    Admin-only API endpoint to profile live API workers and consumers.
+
+    Only available when settings.PROFILING_ENABLED is set.
+    """
+    permission_classes = [IsAdminRole]
+    lookup_value_regex = r'[\w.-]+'
+
+    def initial(self, request, *args, **kwargs):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise Http404
+        super().initial(request, *args, **kwargs)
+
+    def list(self, request):
+        """
+        Show the active session and the profiles available for download.
+        """
+        return Response({
+            'session': profiling.active_session(),
+            'data': profiling.list_profiles(),
+        })
+
+    def create(self, request):
+        """
+        Start profiling the next N matching requests or a time window.
+        """
+        serializer = StartProfilingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = profiling.start_session(
+            target=serializer.validated_data['target'],
+            path_pattern=serializer.validated_data['path_pattern'],
+            max_requests=serializer.validated_data.get('requests'),
+            duration=serializer.validated_data.get('seconds'),
+        )
+        return Response(session, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        """
+        Download a pstats file.
+        """
+        path = profiling.profile_path(pk)
+        if path is None:
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+    @action(detail=False, methods=['post'])
+    def stop(self, request):
+        """
+        Stop the active session.
+        """
+        profiling.stop_session()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BatchView(APIView):
+    """
+    Run several API operations in one request.
+
+    Each operation is {"method", "resource", "body", "params"}, with resource the
+    path under /api/. With "atomic": true (the default) they run in one
+    transaction that is rolled back if any of them fails.
+    """
+
+    def post(self, request):
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        runner = BatchRunner(request, atomic=serializer.validated_data['atomic'])
+        results, committed = runner.run(serializer.validated_data['operations'])
+        return Response({'data': results, 'meta': {'committed': committed}})
+
+
+def metrics_view(request):
+    """
+    Expose this worker's metrics in the Prometheus text format.
+    """
+    return HttpResponse(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fullcycle_desafio_codeflix.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up; serves /api/videos/<id>/events/ without going through Django
+from desafio_codeflix.sse import MediaEventsApp  # noqa: E402
+
+application = MediaEventsApp(django_application)
+
+from desafio_codeflix.autocomplete import cast_member_autocomplete  # noqa: E402
+
+# Built in the background; searches query the database until it is ready
+cast_member_autocomplete.start()
+
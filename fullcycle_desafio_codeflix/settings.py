@@ -42,6 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'desafio_codeflix.middleware.MetricsMiddleware',
+    'desafio_codeflix.middleware.ServerTimingMiddleware',
+    'desafio_codeflix.middleware.ProfilingMiddleware',
+    'desafio_codeflix.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -119,7 +123,184 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded and encoded media
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Every chunk of a chunked upload except the last must have exactly this size.
+
+MEDIA_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+MEDIA_UPLOAD_MAX_SIZE = 50 * 1024 * 1024 * 1024
+
+# Encoded media is streamed in-process by default. Set to 'x-accel-redirect' (nginx,
+# serving MEDIA_ROOT as an internal location at MEDIA_ACCEL_REDIRECT_LOCATION) or
+# 'x-sendfile' (Apache mod_xsendfile, lighttpd) to let the front proxy send the file.
+
+MEDIA_SENDFILE_BACKEND = None
+
+MEDIA_ACCEL_REDIRECT_LOCATION = '/protected-media/'
+
+# Local conversion workers (manage.py startconverter). CONVERSION_ENCODER is 'auto'
+# (ffmpeg when installed), 'ffmpeg' or 'stub'.
+
+CONVERSION_WORKERS = 2
+
+CONVERSION_MAX_PENDING = 4
+
+CONVERSION_ENCODER = 'auto'
+
+# Media status events streamed by the ASGI app at /api/videos/<id>/events/.
+# LocalEventBackend only reaches subscribers in the publishing process; use
+# 'desafio_codeflix.events.RabbitMQEventBackend' when the consumer and converters
+# run in other processes than the ASGI workers.
+
+MEDIA_EVENTS_BACKEND = 'desafio_codeflix.events.LocalEventBackend'
+
+MEDIA_EVENTS_HEARTBEAT = 15
+
+# Most ids accepted by GET /api/<resource>/?ids= and POST /api/<resource>/batch-get/.
+
+BATCH_GET_MAX_IDS = 100
+
+# Most ids per POST /api/<resource>/<id>/<relation>/add/ or .../remove/.
+
+RELATION_CHANGE_MAX_IDS = 1000
+
+# POST /api/<resource>/bulk-delete/ and manage.py bulkdelete: most ids per request,
+# and many-to-many links deleted per transaction.
+
+BULK_DELETE_MAX_IDS = 100
+
+BULK_DELETE_CHUNK_SIZE = 5000
+
+# POST /api/batch/: most operations per request, and how many consecutive GET
+# operations of a non-atomic batch run at once when served over ASGI.
+
+BATCH_MAX_OPERATIONS = 50
+
+BATCH_READ_CONCURRENCY = 4
+
+# Category, Genre and CastMember are kept in memory by every worker and served
+# from there (lists, id checks, pk lists). Each worker checks at most every
+# CATALOG_SNAPSHOT_CHECK_INTERVAL seconds whether another process changed a table.
+
+CATALOG_SNAPSHOT_ENABLED = True
+
+CATALOG_SNAPSHOT_CHECK_INTERVAL = 1.0
+
+# /api/cast_members/autocomplete/: in-memory name index of every worker, built at
+# startup and rebuilt every AUTOCOMPLETE_REBUILD_INTERVAL seconds to catch writes
+# from other processes. Prefixes matching more than AUTOCOMPLETE_SCAN_LIMIT words
+# keep their top AUTOCOMPLETE_MAX_LIMIT results cached.
+
+AUTOCOMPLETE_ENABLED = True
+
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+AUTOCOMPLETE_SCAN_LIMIT = 1000
+
+AUTOCOMPLETE_REBUILD_INTERVAL = 300
+
+# Cache of rendered list and detail responses. Entries are fresh for API_CACHE_TTL
+# seconds and served stale for API_CACHE_STALE_TTL more while one request refreshes
+# them. Use a shared backend (Redis, Memcached) in CACHES to coalesce misses across
+# processes; LocMemCache only coalesces within one.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+API_CACHE_ENABLED = True
+
+API_CACHE_ALIAS = 'default'
+
+API_CACHE_TTL = 30
+
+API_CACHE_STALE_TTL = 300
+
+# Seconds a process may hold the cross-process lock of a key while computing it.
+
+API_CACHE_LOCK_TIMEOUT = 10
+
+# XFetch early refresh: higher values refresh hot keys earlier before they expire.
+
+API_CACHE_EARLY_REFRESH_BETA = 1.0
+
+# Response compression. Cached responses are compressed once when stored, in gzip and
+# (when the brotli package is installed) brotli; other responses are compressed by
+# CompressionMiddleware in the coding the client prefers. Bodies shorter than
+# COMPRESSION_MIN_LENGTH bytes are sent as they are.
+
+COMPRESSION_GZIP_LEVEL = 6
+
+COMPRESSION_BROTLI_QUALITY = 5
+
+COMPRESSION_MIN_LENGTH = 512
+
+# Static catalog snapshots (manage.py publishsnapshots): the first
+# PUBLISHED_SNAPSHOTS_PAGES pages of every list and every video detail, written as
+# precompressed JSON files under PUBLISHED_SNAPSHOTS_ROOT for the web server to serve.
+# With PUBLISHED_SNAPSHOTS_INCREMENTAL, model writes republish what they change
+# PUBLISHED_SNAPSHOTS_DELAY seconds after they commit.
+
+PUBLISHED_SNAPSHOTS_ROOT = BASE_DIR / 'published'
+
+PUBLISHED_SNAPSHOTS_PAGES = 5
+
+PUBLISHED_SNAPSHOTS_INCREMENTAL = False
+
+PUBLISHED_SNAPSHOTS_DELAY = 1.0
+
+# Related videos (manage.py buildrelated, /api/videos/<id>/related/): the
+# RELATED_VIDEOS_K most similar videos of each one by cosine similarity of their
+# genres, categories and cast members, weighted per relation. Similarities are
+# computed for blocks of videos holding at most RELATED_VIDEOS_BLOCK_CELLS scores.
+
+RELATED_VIDEOS_K = 20
+
+RELATED_VIDEOS_WEIGHTS = {'genres': 1.0, 'categories': 0.5, 'cast_members': 1.0}
+
+RELATED_VIDEOS_BLOCK_CELLS = 2 ** 24
+
+# Rows fetched per database round trip by the /api/<resource>/export/ endpoints.
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Change feed (/api/<resource>/changes/). Changes younger than CHANGE_FEED_SAFETY_LAG
+# seconds are held back so rows committed late are not skipped by clients.
+
+CHANGE_FEED_PAGE_SIZE = 500
+
+CHANGE_FEED_MAX_PAGE_SIZE = 5000
+
+CHANGE_FEED_SAFETY_LAG = 5
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Request instrumentation
+# Fraction of requests (0.0 - 1.0) that get a Server-Timing header and a timing log line.
+
+SERVER_TIMING_SAMPLE_RATE = 1.0
+
+# Sampled requests issuing more queries than this are counted in the
+# http_query_budget_exceeded metric exposed at /metrics.
+
+API_QUERY_BUDGET = 20
+
+
+# On-demand profiling
+# When enabled, admins can start sessions through /api/profiling/. Workers poll the
+# control file in PROFILING_DIR every PROFILING_CHECK_INTERVAL seconds.
+
+PROFILING_ENABLED = False
+
+PROFILING_DIR = BASE_DIR / 'profiles'
+
+PROFILING_CHECK_INTERVAL = 1.0
@@ -16,9 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from desafio_codeflix.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
     path('api/', include('desafio_codeflix.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fullcycle_desafio_codeflix.settings')
 
 application = get_wsgi_application()
+
+from desafio_codeflix.autocomplete import cast_member_autocomplete  # noqa: E402
+
+# Built in the background; searches query the database until it is ready
+cast_member_autocomplete.start()